@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AnalysisQueue:
+    """Runs image analyses in the background on a bounded thread pool.
+
+    ``workers`` caps how many requests are in flight against the vision model at once and
+    should match what the Ollama host can serve in parallel (``OLLAMA_NUM_PARALLEL``).
+    At most ``max_pending`` jobs are queued or running; beyond that ``submit`` refuses the
+    job so the caller can shed load instead of piling up work it can't finish.
+    """
+
+    def __init__(self, run, workers=1, max_pending=16, max_jobs=1000):
+        self.run = run
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self._jobs = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis")
+        self._lock = threading.Lock()
+
+    def pending(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job["future"].done())
+
+    def submit(self, job_id, *args):
+        """Queue ``run(job_id, *args)``; returns "queued" or "rejected"."""
+        with self._lock:
+            if sum(1 for job in self._jobs.values() if not job["future"].done()) >= self.max_pending:
+                self.rejected += 1
+                return "rejected"
+            job = {"submitted_at": time.time(), "started_at": None, "finished_at": None}
+            job["future"] = self._executor.submit(self._run, job, job_id, args)
+            self._jobs[job_id] = job
+            while len(self._jobs) > self.max_jobs:
+                oldest = next(iter(self._jobs))
+                if not self._jobs[oldest]["future"].done():
+                    break
+                del self._jobs[oldest]
+        return "queued"
+
+    def _run(self, job, job_id, args):
+        job["started_at"] = time.time()
+        try:
+            result = self.run(job_id, *args)
+            with self._lock:
+                self.completed += 1
+            return result
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            job["finished_at"] = time.time()
+
+    def status(self, job_id):
+        """Timing of a job submitted by this process, or None if it isn't known here"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            ahead = sum(1 for j in self._jobs.values()
+                        if j["started_at"] is None and j["submitted_at"] < job["submitted_at"])
+        future = job["future"]
+        status = {"submitted_at": job["submitted_at"], "started_at": job["started_at"], "finished_at": job["finished_at"]}
+        if not future.done():
+            status["status"] = "running" if job["started_at"] else "queued"
+            if not job["started_at"]:
+                status["position"] = ahead
+        elif future.exception() is not None:
+            status["status"] = "failed"
+            status["error"] = str(future.exception())
+        else:
+            status["status"] = "done"
+        return status
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
@@ -1,21 +1,30 @@
 import re
+import atexit
 import json
-import requests
+import hashlib
+import hmac
 import os
-from datetime import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from pathlib import Path
-from flask import Flask, request, jsonify, send_file, send_from_directory, render_template
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory, render_template, stream_with_context
 from flask_cors import CORS
-from pymongo import MongoClient
 from bson import ObjectId
-from werkzeug.utils import secure_filename
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as PDFImage, Table, TableStyle, PageBreak
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.utils import ImageReader
-from PIL import Image as PILImage
-from io import BytesIO
+from cache_utils import TTLCache, normalize_query
+from llm_client import LLMClient, LLMError
+from solution_cache import SolutionCache
+from report_store import ReportStore
+from pdf_report import generate_pdf_report
+from report_queue import ReportQueue
+from analysis_queue import AnalysisQueue
+from image_store import ImageStore
+from image_prep import decode_upload, model_buffer
+from session_repo import IN_PROGRESS, SessionRepository, connect, utcnow
+from session_writer import SessionWriter
+from retention import RetentionSweeper
+from metrics import REGISTRY, instrument, record_upstream, report_error, span, stats_collector, timed
 
 app = Flask(__name__)
 CORS(app)
@@ -26,15 +35,131 @@ IMAGES_DIR.mkdir(exist_ok=True)
 app.config["UPLOAD_FOLDER"] = IMAGES_DIR
 app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max upload size
 
+# === Image Store ===
+IMAGE_STORE_MAX_BYTES = int(os.environ.get("IMAGE_STORE_MAX_BYTES", 2 * 1024 ** 3))
+IMAGE_STORE_MAX_AGE = int(os.environ.get("IMAGE_STORE_MAX_AGE", 30 * 24 * 3600))  # seconds
+# Only byte-identical uploads share a stored file and cached analysis. A distance > 0 (of 64
+# dHash bits) additionally records the most similar stored scan on the session, for review
+# only: a scan with and without a small lesion can be 2 bits apart.
+IMAGE_MATCH_DISTANCE = int(os.environ.get("IMAGE_MATCH_DISTANCE", 0))
+image_store = ImageStore(IMAGES_DIR, IMAGE_STORE_MAX_BYTES, IMAGE_STORE_MAX_AGE, IMAGE_MATCH_DISTANCE)
+
+# === Report Store ===
+REPORTS_DIR = Path(os.environ.get("REPORTS_DIR", "reports"))
+REPORT_CACHE_MAX_BYTES = int(os.environ.get("REPORT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+REPORT_CACHE_MAX_AGE = int(os.environ.get("REPORT_CACHE_MAX_AGE", 7 * 24 * 3600))  # seconds
+REPORT_VERSION = "1"  # bump when the PDF layout changes to retire cached reports
+REPORT_BUILD_ATTEMPTS = 3
+report_store = ReportStore(REPORTS_DIR, REPORT_CACHE_MAX_BYTES, REPORT_CACHE_MAX_AGE, version=REPORT_VERSION)
+
+# === Background Report Rendering ===
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", 2))
+REPORT_QUEUE_DEPTH = int(os.environ.get("REPORT_QUEUE_DEPTH", 32))
+REPORT_WAIT_TIMEOUT = float(os.environ.get("REPORT_WAIT_TIMEOUT", 30))  # seconds
+report_queue = ReportQueue(report_store, generate_pdf_report, workers=REPORT_WORKERS, max_pending=REPORT_QUEUE_DEPTH)
+
 # === MongoDB Setup ===
-mongo_client = MongoClient("mongodb://localhost:27017/")
-db = mongo_client["curebot"]
+MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/")
+mongo_client = connect(
+    MONGO_URI,
+    pool_size=int(os.environ.get("MONGO_POOL_SIZE", 50)),
+    min_pool_size=int(os.environ.get("MONGO_MIN_POOL_SIZE", 0)),
+    connect_timeout_ms=int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", 3000)),
+    socket_timeout_ms=int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", 10000)),
+    server_selection_timeout_ms=int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 3000)),
+    wait_queue_timeout_ms=int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000)),
+)
+db = mongo_client[os.environ.get("MONGO_DB", "curebot")]
 sessions_collection = db["sessions"]
 
+# === Session Writes & Retention ===
+# Inserts are journaled locally and batched into insert_many off the request path
+SESSION_WRITE_BEHIND = os.environ.get("SESSION_WRITE_BEHIND", "1") == "1"
+SESSION_BATCH_SIZE = int(os.environ.get("SESSION_BATCH_SIZE", 100))
+SESSION_FLUSH_INTERVAL = float(os.environ.get("SESSION_FLUSH_INTERVAL", 0.25))  # seconds
+SESSION_JOURNAL_DIR = Path(os.environ.get("SESSION_JOURNAL_DIR", "session_journal"))
+# With several workers a new session may still be buffered by the worker that created it:
+# the status poll and PDF download wait this long (from the id's creation) before a 404
+SESSION_INSERT_GRACE = float(os.environ.get("SESSION_INSERT_GRACE", 3.0))  # seconds
+SESSION_RETENTION_DAYS = float(os.environ.get("SESSION_RETENTION_DAYS", 0))  # 0 keeps sessions forever
+ORPHAN_MAX_AGE = int(os.environ.get("ORPHAN_MAX_AGE", 24 * 3600))  # seconds unused before an unreferenced file goes
+RETENTION_SWEEP_INTERVAL = float(os.environ.get("RETENTION_SWEEP_INTERVAL", 3600))  # seconds, 0 disables
+
+session_writer = None
+if SESSION_WRITE_BEHIND:
+    session_writer = SessionWriter(sessions_collection, SESSION_JOURNAL_DIR, SESSION_BATCH_SIZE, SESSION_FLUSH_INTERVAL)
+sessions = SessionRepository(sessions_collection, writer=session_writer, insert_grace=SESSION_INSERT_GRACE)
+retention_sweeper = RetentionSweeper(sessions, image_store, report_store, ORPHAN_MAX_AGE, RETENTION_SWEEP_INTERVAL)
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", 20))
+HISTORY_MAX_PAGE_SIZE = 100
+
 # === API Key and Model ===
+OPENROUTER_URL = os.environ.get("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY", "OPEN")
 model7B = "mistralai/mistral-7b-instruct:free"
 
+# === Shared LLM Client ===
+llm = LLMClient(
+    OPENROUTER_URL,
+    OPENROUTER_API_KEY,
+    connect_timeout=float(os.environ.get("LLM_CONNECT_TIMEOUT", 5)),
+    read_timeout=float(os.environ.get("LLM_READ_TIMEOUT", 40)),
+    max_retries=int(os.environ.get("LLM_MAX_RETRIES", 2)),
+    max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", 8)),
+    breaker_threshold=int(os.environ.get("LLM_BREAKER_THRESHOLD", 5)),
+    breaker_cooldown=float(os.environ.get("LLM_BREAKER_COOLDOWN", 30)),
+)
+
+# === Concurrent LLM Calls ===
+LLM_FANOUT = os.environ.get("LLM_FANOUT", "1") == "1"
+LLM_WORKERS = int(os.environ.get("LLM_WORKERS", 16))
+RESPONSE_TIMEOUT = float(os.environ.get("RESPONSE_TIMEOUT", 45))  # seconds
+FOLLOWUPS_TIMEOUT = float(os.environ.get("FOLLOWUPS_TIMEOUT", 30))  # seconds
+llm_executor = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+
+# === Query Triage Cache ===
+TRIAGE_CACHE_SIZE = int(os.environ.get("TRIAGE_CACHE_SIZE", 2048))
+TRIAGE_CACHE_TTL = int(os.environ.get("TRIAGE_CACHE_TTL", 6 * 3600))  # seconds
+triage_cache = TTLCache(maxsize=TRIAGE_CACHE_SIZE, ttl=TRIAGE_CACHE_TTL)
+
+# === Final Solution Cache ===
+SOLUTION_CACHE_SIZE = int(os.environ.get("SOLUTION_CACHE_SIZE", 1024))
+SOLUTION_CACHE_TTL = int(os.environ.get("SOLUTION_CACHE_TTL", 7 * 24 * 3600))  # seconds
+SOLUTION_CACHE_MONGO = os.environ.get("SOLUTION_CACHE_MONGO", "0") == "1"
+# Required (as X-Admin-Token) for the admin routes and unscoped /sessions; unset keeps them closed
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# === Image Analysis (LLaVA on Ollama) ===
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+LLAVA_MODEL = os.environ.get("LLAVA_MODEL", "llava:latest")
+OLLAMA_TIMEOUT = float(os.environ.get("OLLAMA_TIMEOUT", 300))  # seconds
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", 1))  # match OLLAMA_NUM_PARALLEL on the Ollama host
+ANALYSIS_QUEUE_DEPTH = int(os.environ.get("ANALYSIS_QUEUE_DEPTH", 16))
+# An analysis whose status hasn't changed for this long was lost to a crash or restart and
+# is queued again (or failed); keep it above the longest expected queue wait
+ANALYSIS_STALE_AFTER = float(os.environ.get("ANALYSIS_STALE_AFTER", 900))  # seconds
+# Uploads are downscaled to the vision encoder's effective input before inference (0 sends
+# the original file); the stored original is what goes into the PDF
+LLAVA_MAX_SIDE = int(os.environ.get("LLAVA_MAX_SIDE", 672))
+LLAVA_JPEG_QUALITY = int(os.environ.get("LLAVA_JPEG_QUALITY", 90))
+DEFAULT_IMAGE_PROMPT = """Analyze this medical image and provide a detailed report with:
+            - Disease/Condition Identification
+            - Symptoms
+            - Diagnosis
+            - Treatment Options
+            - Medications
+            - Precautions
+            Include disclaimers about professional medical advice."""
+
+# === Canned Replies ===
+QUICK_REPLIES = {
+    "greeting": "Hello! I'm CureBot, your medical assistant. How can I help you today?",
+    "introduction": "I am CureBot, an AI-powered health assistant developed by Singularity team!",
+}
+NON_MEDICAL_REPLY = "I am sorry, I can only respond to medical-related queries!"
+
 # === Helper Functions ===
+@timed()
 def checkCondition(query, model):
     try:
         if any(word in query.lower() for word in ["hi", "hello", "hey", "greetings"]):
@@ -42,17 +167,10 @@ def checkCondition(query, model):
         if any(phrase in query.lower() for phrase in ["who are you", "what are you", "your name"]):
             return "introduction"
 
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={"Authorization": f"Bearer {"OPEN"}", "Content-Type": "application/json"},
-            json={
-                "model": model,
-                "messages": [{"role": "user", "content": f"Query: {query}. Is this query related to the medical field or not? Answer in one word."}]
-            },
-        )
-        return response.json()["choices"][0]["message"]["content"].strip().lower()
+        prompt = f"Query: {query}. Is this query related to the medical field or not? Answer in one word."
+        return llm.chat(model, prompt).strip().lower()
     except Exception as e:
-        print(f"Error in checkCondition: {e}")
+        report_error("checkCondition", e)
         return "error"
 
 def checkQuery(condition):
@@ -61,189 +179,259 @@ def checkQuery(condition):
     matches = re.findall(r"\b(yes|no)\b", condition, re.IGNORECASE)
     return matches[0].lower() if matches else "no"
 
-def gen_response(query, model):
+def triage_query(query, model):
+    """Classify a query once (greeting/introduction/yes/no/error), memoized on normalized text"""
+    key = (model, normalize_query(query))
+    condition_type = triage_cache.get(key)
+    if condition_type is not None:
+        return condition_type
+
+    condition = checkCondition(query, model)
+    if condition == "error":
+        return "error"  # never memoize upstream failures
+
+    condition_type = checkQuery(condition)
+    triage_cache.set(key, condition_type)
+    return condition_type
+
+def response_prompt(query):
+    return f"""A patient asked: '{query}'. In 2-3 simple sentences, explain why this might be happening."""
+
+@timed()
+def gen_response(query, model, condition_type=None):
     try:
-        condition_type = checkQuery(checkCondition(query, model))
+        if condition_type is None:
+            condition_type = triage_query(query, model)
         if condition_type == "greeting":
             return "Hello! I'm CureBot, your medical assistant. How can I help you today?"
         if condition_type == "introduction":
             return "I am CureBot, an AI-powered health assistant developed by Singularity team!."
 
-        prompt = f"""A patient asked: '{query}'. In 2-3 simple sentences, explain why this might be happening."""
-
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={"Authorization": f"Bearer {"OPEN"}", "Content-Type": "application/json"},
-            json={"model": model, "messages": [{"role": "user", "content": prompt}]},
-        )
-        return response.json()["choices"][0]["message"]["content"].strip()
+        return llm.chat(model, response_prompt(query)).strip()
     except Exception as e:
-        print(f"Error in gen_response: {e}")
+        report_error("gen_response", e)
         return "I'm sorry, I couldn't generate a response."
 
-def gen_followups(query, model):
+@timed()
+def gen_followups(query, model, condition_type=None):
     try:
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={"Authorization": f"Bearer {"OPEN"}", "Content-Type": "application/json"},
-            json={"model": model, "messages": [{"role": "user", "content": f"Given the medical condition described: '{query}', generate 5 relevant follow-up questions to understand the symptoms better. Format:\n1. <question>\n2. <question>\n3. <question>\n4. <question>\n5. <question>"}]},
-        )
-        return response.json()["choices"][0]["message"]["content"].strip().split('\n')
+        if condition_type is not None and condition_type != "yes":
+            return []
+        prompt = f"Given the medical condition described: '{query}', generate 5 relevant follow-up questions to understand the symptoms better. Format:\n1. <question>\n2. <question>\n3. <question>\n4. <question>\n5. <question>"
+        return llm.chat(model, prompt).strip().split('\n')
     except Exception as e:
-        print(f"Error in gen_followups: {e}")
+        report_error("gen_followups", e)
         return []
 
+def fan_out(calls):
+    """Run independent LLM helpers at the same time.
+
+    ``calls`` maps a name to ``(fn, args, timeout, fallback)``. Each call gets its own
+    deadline measured from submission; a call that raises or misses its deadline yields
+    its fallback so the others can still be returned.
+    """
+    if not LLM_FANOUT:
+        return {name: fn(*args) for name, (fn, args, _, _) in calls.items()}
+
+    started = time.monotonic()
+    futures = {name: llm_executor.submit(fn, *args) for name, (fn, args, _, _) in calls.items()}
+    results = {}
+    for name, (fn, _, timeout, fallback) in calls.items():
+        remaining = max(0.0, started + timeout - time.monotonic())
+        try:
+            results[name] = futures[name].result(timeout=remaining)
+        except Exception as e:
+            futures[name].cancel()
+            report_error(fn.__name__, f"({type(e).__name__}) {e}")
+            results[name] = fallback
+    return results
+
 def mergeFollowupsResponse(followups, responses):
     return '\n'.join([f"Followup {i+1}: {f.split('.')[-1].strip()}, Response {i+1}: {r}" for i, (f, r) in enumerate(zip(followups, responses))])
 
+def final_solution_prompt(context):
+    return f"""The patient gave the following answers to your follow-up questions:\n\n{context}\n\nBased on this, respond like a real doctor:\n1. Give a likely diagnosis (1 sentence)\n2. Suggest appropriate medicine for every age group okay with quanitity (basic and common only)\n3. Add any home remedies or care tips\n4. Mention 2-3 warning signs when to go to hospital\nKeep your answer under 7 sentences. Be simple and professional."""
+
+# Hashing the template means editing the prompt automatically retires stale entries
+solution_cache = SolutionCache(
+    maxsize=SOLUTION_CACHE_SIZE,
+    ttl=SOLUTION_CACHE_TTL,
+    collection=db["solution_cache"] if SOLUTION_CACHE_MONGO else None,
+    prompt_version=hashlib.sha256(final_solution_prompt("{context}").encode()).hexdigest()[:12],
+)
+
+@timed()
 def gen_final_solution(context, model):
+    cached = solution_cache.get(context, model)
+    if cached is not None:
+        return cached
     try:
-        final_prompt = f"""The patient gave the following answers to your follow-up questions:\n\n{context}\n\nBased on this, respond like a real doctor:\n1. Give a likely diagnosis (1 sentence)\n2. Suggest appropriate medicine for every age group okay with quanitity (basic and common only)\n3. Add any home remedies or care tips\n4. Mention 2-3 warning signs when to go to hospital\nKeep your answer under 7 sentences. Be simple and professional."""
-
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={"Authorization": f"Bearer {"OPEN"}", "Content-Type": "application/json"},
-            json={"model": model, "messages": [{"role": "user", "content": final_prompt}]},
-        )
-        return response.json()["choices"][0]["message"]["content"].strip()
+        solution = llm.chat(model, final_solution_prompt(context)).strip()
+        if not solution:
+            raise LLMError("Empty completion")
+        solution_cache.set(context, model, solution)
+        return solution
     except Exception as e:
-        print(f"Error in gen_final_solution: {e}")
+        report_error("gen_final_solution", e)
         return "I'm sorry, I couldn't generate a final medical recommendation."
 
-def analyze_medical_image(image_path, prompt):
+_ollama_client = None
+_ollama_lock = threading.Lock()
+
+def ollama_client():
+    """One Ollama client (and its connection pool) for the whole process"""
+    global _ollama_client
+    with _ollama_lock:
+        if _ollama_client is None:
+            import ollama
+            _ollama_client = ollama.Client(host=OLLAMA_HOST, timeout=OLLAMA_TIMEOUT)
+        return _ollama_client
+
+@timed("analyze_medical_image")  # every analysis path, queued or not, goes through here
+def run_llava(image, prompt):
+    """``image`` is a file path or an encoded buffer from ``model_buffer``"""
+    if not prompt or prompt.strip() == "":
+        prompt = DEFAULT_IMAGE_PROMPT
+
+    image_bytes = len(image) if isinstance(image, bytes) else os.path.getsize(image)
+    response = ollama_client().chat(
+        model=LLAVA_MODEL,
+        messages=[{
+            'role': 'user',
+            'content': prompt,
+            'images': [image if isinstance(image, bytes) else str(image)]
+        }]
+    )
+    content = response['message']['content']
+    record_upstream("ollama", sent=image_bytes + len(prompt.encode("utf-8")), received=len(content.encode("utf-8")),
+                    prompt_tokens=response.get('prompt_eval_count'), completion_tokens=response.get('eval_count'))
+    return content
+
+def analysis_key(prompt):
+    """Cache key for an image analysis: the model plus the (normalized) prompt"""
+    prompt = normalize_query(prompt or DEFAULT_IMAGE_PROMPT)
+    return hashlib.sha256(f"{LLAVA_MODEL}\n{prompt}".encode("utf-8")).hexdigest()[:16]
+
+def complete_image_analysis(session_id, session_data, image=None):
+    """Background job for /upload: run LLaVA, store the result, then queue the PDF"""
     try:
-        import ollama
-
-        if not prompt or prompt.strip() == "":
-            prompt = """Analyze this medical image and provide a detailed report with:
-            - Disease/Condition Identification
-            - Symptoms
-            - Diagnosis
-            - Treatment Options
-            - Medications
-            - Precautions
-            Include disclaimers about professional medical advice."""
-
-        response = ollama.chat(
-            model='llava:latest',
-            messages=[{
-                'role': 'user',
-                'content': prompt,
-                'images': [str(image_path)]
-            }]
-        )
-
-        result = response['message']['content']
-        return result
-    except Exception as e:
-        print(f"Error in analyze_medical_image: {e}")
-        return f"Analysis error: {str(e)}"
-def resize_image(image_path, max_width=500, max_height=500):
+        sessions.update(session_id, {"analysis_status": "running", "analysis_updated_at": utcnow()})
+        result, status = run_llava(image or session_data["image_path"], session_data.get("user_prompt")), "done"
+    except Exception as e:  # counted by run_llava's span, or a failed status update
+        result, status = f"Analysis error: {str(e)}", "failed"
+
+    update = {"image_analysis": result, "final_solution": result, "analysis_status": status,
+              "analysis_updated_at": utcnow()}
+    if status == "done":
+        image_store.save_analysis(session_data["image_sha256"], analysis_key(session_data.get("user_prompt")), result)
+    sessions.update(session_id, update)
+    report_queue.submit(session_id, {**session_data, **update})
+    return status
+
+analysis_queue = AnalysisQueue(complete_image_analysis, workers=ANALYSIS_WORKERS, max_pending=ANALYSIS_QUEUE_DEPTH)
+
+def reconcile_analyses(session_id=None):
+    """Queue again (or fail) analyses a crashed or restarted worker left queued/running.
+    With ``session_id``, only that session; returns its new status, else the count handled."""
+    handled, status = 0, None
+    while True:
+        before = utcnow() - timedelta(seconds=ANALYSIS_STALE_AFTER)
+        session = sessions.claim_stale_analysis(before, session_id)
+        if session is None:
+            break
+        sid = str(session["_id"])
+        status = "queued"
+        if not os.path.exists(session.get("image_path") or "") or analysis_queue.submit(sid, session) == "rejected":
+            message = "Analysis error: interrupted by a restart; please upload the image again"
+            sessions.update(sid, {"image_analysis": message, "final_solution": message,
+                                  "analysis_status": "failed", "analysis_updated_at": utcnow()})
+            status = "failed"
+        print(f"Reconciled stale image analysis {sid}: {status}")
+        handled += 1
+        if session_id is not None:
+            break
+    return status if session_id is not None else handled
+
+def is_stale(session):
+    """Queued or running, and unchanged for longer than ANALYSIS_STALE_AFTER"""
+    updated = session.get("analysis_updated_at") or session.get("created_at")
+    return (session.get("analysis_status") in IN_PROGRESS and updated is not None
+            and (utcnow() - updated).total_seconds() > ANALYSIS_STALE_AFTER)
+
+def reconcile_on_startup():
     try:
-        img = PILImage.open(image_path)
-        img.thumbnail((max_width, max_height), PILImage.Resampling.LANCZOS)
-        
-        img_byte_arr = BytesIO()
-        img.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
-        
-        return img_byte_arr  # Return a file-like object, not ImageReader
+        reconcile_analyses()
     except Exception as e:
-        print(f"Error resizing image: {e}")
-        return None
+        report_error("reconcile_analyses", e)
 
-def generate_pdf_report(session, filename="diagnosis_report.pdf"):
+# === Process Startup ===
+# Importing this module starts no threads and touches neither Mongo nor Ollama, so a
+# serving master can import it once and fork workers (see wsgi.py). Each process starts
+# its own background work on its first request, or from the server's post-fork hook.
+_started_pid = None
+_startup_lock = threading.Lock()
+
+def ensure_session_indexes():
     try:
-        doc = SimpleDocTemplate(filename, pagesize=letter, rightMargin=40, leftMargin=40, topMargin=60, bottomMargin=40)
-        story = []
-        styles = getSampleStyleSheet()
-        cell_style = ParagraphStyle('cell_style', parent=styles["BodyText"], fontSize=10, leading=12)
-
-        # Add logo and header
-        logo_path = "curebot_logo.png"
-        if os.path.exists(logo_path):
-            logo = PDFImage(logo_path, width=60, height=60)
-            story.append(logo)
-        story.append(Spacer(1, 10))
-
-        story.append(Paragraph("<b>CureBot - Medical Report</b>", styles["Title"]))
-        story.append(Paragraph(f"<i>Date:</i> {datetime.now().strftime('%d %B %Y, %I:%M %p')}", styles["Normal"]))
-        story.append(Spacer(1, 12))
-
-        # Add patient query or image description
-        if "query" in session:
-            story.append(Paragraph("<b>🩺 Patient Query</b>", styles["Heading2"]))
-            story.append(Paragraph(session["query"], styles["BodyText"]))
-            story.append(Spacer(1, 10))
-
-        # Add image if available
-        if "image_path" in session and os.path.exists(session["image_path"]):
-            story.append(Paragraph("<b>🖼 Medical Image</b>", styles["Heading2"]))
-            
-            # Resize and add image
-            resized_image = resize_image(session["image_path"])
-            if resized_image:
-                story.append(PDFImage(resized_image, width=300, height=200))
-                story.append(Spacer(1, 10))
-            
-            # Add custom prompt if available
-            if "user_prompt" in session and session["user_prompt"]:
-                story.append(Paragraph("<b>🔍 Analysis Request</b>", styles["Heading3"]))
-                story.append(Paragraph(session["user_prompt"], styles["BodyText"]))
-                story.append(Spacer(1, 10))
-
-        # Add image analysis results
-        if "image_analysis" in session:
-            story.append(Paragraph("<b>📝 Image Analysis Results</b>", styles["Heading2"]))
-            for line in session["image_analysis"].split('\n'):
-                if line.strip():
-                    story.append(Paragraph(line, styles["BodyText"]))
-            story.append(Spacer(1, 15))
-
-        # Add follow-up Q&A if available
-        if "followups" in session and "responses" in session:
-            story.append(PageBreak())
-            story.append(Paragraph("<b>❓ Follow-up Questions & Answers</b>", styles["Heading2"]))
-            data = [[Paragraph("<b>Question</b>", styles["BodyText"]), Paragraph("<b>Answer</b>", styles["BodyText"])]]
-            for f, r in zip(session["followups"], session["responses"]):
-                data.append([Paragraph(f, cell_style), Paragraph(r, cell_style)])
-            table = Table(data, colWidths=[220, 300])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#00BCD4")),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('BOX', (0, 0), (-1, -1), 1, colors.grey),
-                ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ]))
-            story.append(table)
-            story.append(Spacer(1, 12))
-
-        # Add final diagnosis/solution
-        if "final_solution" in session:
-            story.append(Paragraph("<b>✅ Doctor's Assessment</b>", styles["Heading2"]))
-            for line in session["final_solution"].split("\n"):
-                if line.strip():
-                    story.append(Paragraph(line, styles["BodyText"]))
-            story.append(Spacer(1, 12))
-
-        # Add footer with disclaimer
-        story.append(Paragraph("<i>Disclaimer:</i> This report is AI-generated and not a substitute for professional medical advice. Please consult a licensed doctor for confirmation.", styles["Italic"]))
-        story.append(Spacer(1, 8))
-        story.append(Paragraph("<i>Powered by CureBot – Your AI Health Companion</i>", styles["Normal"]))
-
-        doc.build(story)
-        return filename
+        sessions.ensure_indexes(retention_seconds=SESSION_RETENTION_DAYS * 24 * 3600)
     except Exception as e:
-        print(f"Error generating PDF: {e}")
-        return None
+        print(f"Error creating session indexes: {e}")
+
+def start_background_work():
+    """Start this process's session writer, retention sweeper and index build; idempotent"""
+    global _started_pid
+    with _startup_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+    if session_writer is not None:
+        session_writer.start()
+        atexit.register(session_writer.flush)
+    retention_sweeper.start()
+    # in the background: with Mongo down these wait out the server-selection timeout
+    threading.Thread(target=ensure_session_indexes, name="session-indexes", daemon=True).start()
+    threading.Thread(target=reconcile_on_startup, name="reconcile-analyses", daemon=True).start()
+
+def stop_background_work():
+    """Flush buffered sessions and stop the report pool before the process exits"""
+    if _started_pid != os.getpid():
+        return
+    if session_writer is not None:
+        session_writer.flush()
+    report_queue.shutdown()
 
 # === Routes ===
+@app.before_request
+def start_on_first_request():
+    start_background_work()
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/js/<path:filename>')
+def scripts(filename):
+    return send_from_directory('js', filename)
+
+@app.route('/healthz')
+def liveness():
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz')
+def readiness():
+    """Ready when Mongo has a writable server; with write-behind on, an unreachable Mongo
+    only degrades (sessions are journaled locally), so the instance still takes traffic.
+    Reads the client's monitored topology instead of pinging, so a probe never blocks."""
+    checks = {"llm_breaker": llm.breaker.state}
+    checks["mongo"] = "ok" if mongo_client.topology_description.has_writable_server() else "unavailable"
+    if session_writer is not None:
+        checks["session_buffer"] = session_writer.stats()["buffered"]
+    if checks["mongo"] == "ok":
+        return jsonify({"status": "ready", **checks})
+    if session_writer is not None:
+        return jsonify({"status": "degraded", **checks})
+    return jsonify({"status": "unavailable", **checks}), 503
+
 @app.route('/ask', methods=['POST'])
 def ask():
     data = request.json
@@ -252,53 +440,65 @@ def ask():
     if not query:
         return jsonify({"error": "No query provided"}), 400
 
-    quick_type = checkQuery(checkCondition(query, model7B))
-    if quick_type == "greeting":
-        return jsonify({"response": "Hello! I'm CureBot, your medical assistant. How can I help you today?", "followups": []})
-    elif quick_type == "introduction":
-        return jsonify({"response": "I am CureBot, an AI-powered health assistant developed by Singularity team!", "followups": []})
+    condition_type = triage_query(query, model7B)
+    if condition_type in QUICK_REPLIES:
+        return jsonify({"response": QUICK_REPLIES[condition_type], "followups": []})
 
-    condition = checkCondition(query, model7B)
-    if condition == "error":
+    if condition_type == "error":
         return jsonify({"error": "Error processing your query."}), 500
 
-    if checkQuery(condition) == "yes":
-        response_text = gen_response(query, model7B)
-        followups = gen_followups(query, model7B)
-        return jsonify({"response": response_text, "followups": followups})
+    if condition_type == "yes":
+        results = fan_out({
+            "response": (gen_response, (query, model7B, condition_type), RESPONSE_TIMEOUT,
+                         "I'm sorry, I couldn't generate a response."),
+            "followups": (gen_followups, (query, model7B, condition_type), FOLLOWUPS_TIMEOUT, []),
+        })
+        return jsonify({"response": results["response"], "followups": results["followups"]})
     else:
-        return jsonify({"response": "I am sorry, I can only respond to medical-related queries!"})
+        return jsonify({"response": NON_MEDICAL_REPLY})
+
+def save_answer_session(data, final_solution):
+    session_data = {
+        "timestamp": datetime.now().isoformat(),
+        "query": data.get("query", ""),
+        "followups": data.get("followups", []),
+        "responses": data.get("responses", []),
+        "final_solution": final_solution
+    }
+
+    if data.get("image_analysis"):
+        session_data["image_analysis"] = data["image_analysis"]
+    if data.get("image_path"):
+        session_data["image_path"] = data["image_path"]
+    if patient_key(data):
+        session_data["patient_id"] = patient_key(data)
+
+    return store_session(session_data)
+
+def patient_key(data):
+    """Optional patient/user key a client tags sessions with, for the history listing"""
+    value = str(data.get("patient_id") or "").strip()
+    return value[:128] or None
+
+def store_session(session_data):
+    """Insert a session and queue its PDF report so the download is usually instant"""
+    with span("session_insert"):
+        session_id = sessions.insert(session_data)
+    report_queue.submit(session_id, session_data)
+    return session_id
 
 @app.route('/answer', methods=['POST'])
 def answer():
     data = request.json
     followups = data.get("followups", [])
     responses = data.get("responses", [])
-    query = data.get("query", "")
-    image_analysis = data.get("image_analysis", None)
-    image_path = data.get("image_path", None)
 
     if not followups or not responses:
         return jsonify({"error": "Missing follow-up questions or responses."}), 400
 
     context = mergeFollowupsResponse(followups, responses)
     final_solution = gen_final_solution(context, model7B)
-
-    session_data = {
-        "timestamp": datetime.now().isoformat(),
-        "query": query,
-        "followups": followups,
-        "responses": responses,
-        "final_solution": final_solution
-    }
-
-    if image_analysis:
-        session_data["image_analysis"] = image_analysis
-    if image_path:
-        session_data["image_path"] = image_path
-
-    result = sessions_collection.insert_one(session_data)
-    session_id = str(result.inserted_id)
+    session_id = save_answer_session(data, final_solution)
 
     return jsonify({
         "final_solution": final_solution,
@@ -306,6 +506,105 @@ def answer():
         "pdf_download": f"/download/pdf/{session_id}"
     })
 
+# === Streaming Routes (Server-Sent Events) ===
+def sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def event_stream(generate):
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route('/ask/stream', methods=['POST'])
+def ask_stream():
+    data = request.json
+    query = data.get("query", "").strip()
+
+    if not query:
+        return jsonify({"error": "No query provided"}), 400
+
+    condition_type = triage_query(query, model7B)
+    if condition_type == "error":
+        return jsonify({"error": "Error processing your query."}), 500
+
+    def generate():
+        if condition_type != "yes":
+            yield sse("token", {"text": QUICK_REPLIES.get(condition_type, NON_MEDICAL_REPLY)})
+            yield sse("done", {"followups": []})
+            return
+
+        followups_future = llm_executor.submit(gen_followups, query, model7B, condition_type)
+        streamed = False
+        try:
+            with span("gen_response"):
+                for delta in llm.stream_chat(model7B, response_prompt(query)):
+                    streamed = True
+                    yield sse("token", {"text": delta})
+        except Exception as e:
+            report_error("ask_stream", f"({type(e).__name__}) {e}")
+            if not streamed:
+                yield sse("token", {"text": "I'm sorry, I couldn't generate a response."})
+
+        try:
+            followups = followups_future.result(timeout=FOLLOWUPS_TIMEOUT)
+        except Exception as e:
+            report_error("gen_followups", f"({type(e).__name__}) {e}")
+            followups = []
+        yield sse("done", {"followups": followups})
+
+    return event_stream(generate)
+
+@app.route('/answer/stream', methods=['POST'])
+def answer_stream():
+    data = request.json
+    followups = data.get("followups", [])
+    responses = data.get("responses", [])
+
+    if not followups or not responses:
+        return jsonify({"error": "Missing follow-up questions or responses."}), 400
+
+    context = mergeFollowupsResponse(followups, responses)
+
+    def generate():
+        parts = []
+        try:
+            cached = solution_cache.get(context, model7B)
+            if cached is not None:
+                parts.append(cached)
+                yield sse("token", {"text": cached})
+            else:
+                with span("gen_final_solution"):
+                    for delta in llm.stream_chat(model7B, final_solution_prompt(context)):
+                        parts.append(delta)
+                        yield sse("token", {"text": delta})
+                if not "".join(parts).strip():
+                    raise LLMError("Empty completion")
+                solution_cache.set(context, model7B, "".join(parts).strip())
+        except Exception as e:
+            report_error("answer_stream", f"({type(e).__name__}) {e}")
+            if "".join(parts).strip():
+                # a truncated diagnosis must not be saved (or rendered into a PDF) as the answer
+                yield sse("error", {"error": "The answer was interrupted. Please try again."})
+                return
+            parts = ["I'm sorry, I couldn't generate a final medical recommendation."]
+            yield sse("token", {"text": parts[0]})
+
+        try:
+            session_id = save_answer_session(data, "".join(parts).strip())
+        except Exception as e:
+            report_error("save_answer_session", f"({type(e).__name__}) {e}")
+            yield sse("error", {"error": "Could not save this session."})
+            return
+
+        yield sse("done", {
+            "session_id": session_id,
+            "pdf_download": f"/download/pdf/{session_id}"
+        })
+
+    return event_stream(generate)
+
 @app.route('/upload', methods=['POST'])
 def upload_image():
     # Check if image is provided
@@ -320,51 +619,215 @@ def upload_image():
     custom_prompt = request.form.get('prompt', '').strip()
     query = request.form.get('query', 'Image analysis').strip()
 
-    # Save the image
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = secure_filename(f"{timestamp}_{file.filename}")
-    image_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(image_path)
-
-    # Analyze the image
-    analysis_result = analyze_medical_image(image_path, custom_prompt)
+    # Store the image once per scan; byte-identical re-uploads resolve to the stored copy.
+    # The upload is decoded at most once, and only if it isn't already stored.
+    data = file.read()
+    decode = lambda raw: decode_upload(raw, LLAVA_MAX_SIDE)
+    try:
+        image = image_store.put(data, file.filename, decode=decode)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    # Store the session
     session_data = {
         "timestamp": datetime.now().isoformat(),
         "query": query,
         "user_prompt": custom_prompt if custom_prompt else None,
-        "image_path": image_path,
-        "image_analysis": analysis_result,
-        "final_solution": analysis_result
+        "image_path": str(image["path"]),
+        "image_sha256": image["sha256"],
+        "image_analysis": None,
+        "final_solution": None,
+        "analysis_status": "queued",
+        "analysis_updated_at": utcnow(),
     }
-    
-    result = sessions_collection.insert_one(session_data)
-    session_id = str(result.inserted_id)
+    if patient_key(request.form):
+        session_data["patient_id"] = patient_key(request.form)
+    if image["near_sha256"]:
+        session_data["similar_image_sha256"] = image["near_sha256"]
+
+    # Same scan, same prompt: reuse the earlier analysis instead of running LLaVA again
+    cached = image_store.analysis(image["sha256"], analysis_key(custom_prompt))
+    if cached is not None:
+        session_data.update({"image_analysis": cached, "final_solution": cached,
+                             "analysis_status": "done", "analysis_cached": True})
+        session_id = store_session(session_data)
+        return jsonify({
+            "session_id": session_id,
+            "status": "done",
+            "result": cached,
+            "status_url": f"/upload/{session_id}/status",
+            "pdf_download": f"/download/pdf/{session_id}"
+        })
+
+    with span("session_insert"):
+        session_id = sessions.insert(session_data)
+
+    buffer = None
+    if LLAVA_MAX_SIDE:
+        buffer = model_buffer(image["image"] or decode(data), LLAVA_MAX_SIDE, LLAVA_JPEG_QUALITY)
+    if analysis_queue.submit(session_id, session_data, buffer) == "rejected":
+        sessions.delete(session_id)
+        response = jsonify({"error": "Image analysis is busy, please try again shortly."})
+        response.headers["Retry-After"] = "30"
+        return response, 503
 
     return jsonify({
-        "result": analysis_result,
         "session_id": session_id,
+        "status": "queued",
+        "status_url": f"/upload/{session_id}/status",
         "pdf_download": f"/download/pdf/{session_id}"
+    }), 202
+
+@app.route('/upload/<session_id>/status')
+def upload_status(session_id):
+    if not ObjectId.is_valid(session_id):
+        return jsonify({"error": "Invalid session id"}), 400
+    # The session document is the source of truth, so any worker can answer the poll
+    session = sessions.get(session_id, {"analysis_status": 1, "image_analysis": 1, "analysis_updated_at": 1, "created_at": 1},
+                           wait=True)
+    if not session:
+        return jsonify({"error": "Session not found"}), 404
+
+    job = analysis_queue.status(session_id)
+    if job is None and is_stale(session):
+        reconcile_analyses(session_id)
+        session = sessions.get(session_id, {"analysis_status": 1, "image_analysis": 1})
+    status = {"session_id": session_id, "status": session.get("analysis_status", "done")}
+    if job and status["status"] in ("queued", "running"):
+        status.update({key: value for key, value in job.items() if key in ("position", "submitted_at", "started_at")})
+    if status["status"] in ("done", "failed"):
+        status["result"] = session.get("image_analysis")
+        status["pdf_download"] = f"/download/pdf/{session_id}"
+    return jsonify(status)
+
+# === Session History ===
+@app.route('/sessions', methods=['GET'])
+def session_history():
+    """Newest-first session summaries; pass ``next_cursor`` back as ``cursor`` for the next page.
+    Scoped to one ``patient_id``; listing every patient's sessions takes the admin token."""
+    patient_id = patient_key(request.args)
+    if patient_id is None and not admin_authorized():
+        return jsonify({"error": "patient_id is required"}), 403
+    try:
+        limit = min(max(1, int(request.args.get("limit", HISTORY_PAGE_SIZE))), HISTORY_MAX_PAGE_SIZE)
+        docs, next_cursor = sessions.history(patient_id, limit, request.args.get("cursor"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error in session_history: {e}")
+        return jsonify({"error": "Session history is unavailable."}), 503
+
+    items = []
+    for doc in docs:
+        session_id = str(doc.pop("_id"))
+        items.append({"session_id": session_id, **doc, "pdf_download": f"/download/pdf/{session_id}"})
+    return jsonify({"sessions": items, "next_cursor": next_cursor})
+
+# === Admin Routes ===
+def admin_authorized():
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+@app.route('/admin/cache', methods=['GET'])
+def cache_stats():
+    if not admin_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify({
+        "triage": triage_cache.stats(),
+        "solution": solution_cache.stats(),
+        "reports": report_store.stats(),
+        "report_queue": report_queue.stats(),
+        "analysis_queue": analysis_queue.stats(),
+        "images": image_store.stats(),
+        "session_writer": session_writer.stats() if session_writer else None,
+        "retention": retention_sweeper.stats(),
     })
 
+@app.route('/admin/cache/invalidate', methods=['POST'])
+def invalidate_cache():
+    if not admin_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+    target = (request.get_json(silent=True) or {}).get("cache", "all")
+    if target not in ("all", "triage", "solution"):
+        return jsonify({"error": "cache must be one of: all, triage, solution"}), 400
+
+    invalidated = {}
+    if target in ("all", "triage"):
+        invalidated["triage"] = len(triage_cache)
+        triage_cache.clear()
+    if target in ("all", "solution"):
+        invalidated["solution"] = solution_cache.invalidate()
+    return jsonify({"invalidated": invalidated})
+
+@app.route('/admin/retention/sweep', methods=['POST'])
+def run_retention_sweep():
+    if not admin_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(retention_sweeper.sweep())
+
+# === Metrics ===
+# Prometheus text on GET /metrics: per-stage latency histograms, upstream bytes/tokens and
+# the caches' and queues' stats() as gauges. With PROFILE_REQUESTS=1 an admin request sent
+# with "X-Profile: 1" is stack-sampled and its collapsed stacks are written to PROFILE_DIR.
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS", "0") == "1"
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", "profiles"))
+instrument(app, "curebot", authorize=admin_authorized, profile_dir=PROFILE_DIR if PROFILE_REQUESTS else None)
+REGISTRY.add_collector(stats_collector("curebot", {
+    "triage_cache": triage_cache.stats,
+    "solution_cache": solution_cache.stats,
+    "report_cache": report_store.stats,
+    "image_store": image_store.stats,
+    "report_queue": report_queue.stats,
+    "analysis_queue": analysis_queue.stats,
+    "session_writer": session_writer.stats if session_writer else dict,
+    "llm_breaker": lambda: {"open": llm.breaker.state != "closed", "failures": llm.breaker.failures},
+}))
+
+@app.route('/reports/<session_id>/status')
+def report_status(session_id):
+    if not ObjectId.is_valid(session_id):
+        return jsonify({"error": "Invalid session id"}), 400
+    status = report_queue.status(session_id)
+    status["session_id"] = session_id
+    if status["status"] == "ready":
+        status["pdf_download"] = f"/download/pdf/{session_id}"
+    return jsonify(status)
+
 @app.route('/download/pdf/<session_id>')
 def download_pdf(session_id):
     try:
-        session = sessions_collection.find_one({"_id": ObjectId(session_id)})
+        session = sessions.get(session_id, wait=True)
         if not session:
             return jsonify({"error": "Session not found"}), 404
-
-        filename = f"medical_report_{session_id}.pdf"
-        generate_pdf_report(session, filename=filename)
-        
-        # Clean up after sending (optional)
-        if os.path.exists(filename):
-            return send_from_directory(directory=".", path=filename, as_attachment=True)
-        else:
-            return jsonify({"error": "Failed to generate PDF"}), 500
+        if is_stale(session) and analysis_queue.status(session_id) is None:
+            reconcile_analyses(session_id)
+            session = sessions.get(session_id)
+        if session.get("analysis_status") in IN_PROGRESS:
+            return jsonify({"error": "Image analysis still in progress", "status_url": f"/upload/{session_id}/status"}), 409
+
+        report_queue.wait(session_id, REPORT_WAIT_TIMEOUT)
+        # eviction can remove the file between the build and send_file opening it; build again
+        for _ in range(REPORT_BUILD_ATTEMPTS):
+            path, fingerprint = report_store.get_or_build(session_id, session, generate_pdf_report)
+            if path is None:
+                return jsonify({"error": "Failed to generate PDF"}), 500
+            try:
+                return send_file(
+                    path.resolve(),  # send_file reads relative paths from the app's root, not the cwd
+                    mimetype="application/pdf",
+                    as_attachment=True,
+                    download_name=f"medical_report_{session_id}.pdf",
+                    etag=fingerprint,
+                    last_modified=path.stat().st_mtime,
+                    conditional=True,
+                    max_age=0,
+                )
+            except FileNotFoundError:
+                continue
+        return jsonify({"error": "Failed to generate PDF"}), 500
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
+    # development server; see wsgi.py for serving both apps in production
+    start_background_work()
     app.run(debug=True, port=5009)
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""Compare /ask latency with sequential vs concurrent gen_response/gen_followups.
+
+Runs against a local FakeOpenRouter, so no network or API key is needed:
+
+    python benchmarks/bench_ask_fanout.py --requests 30 --latency 0.3
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openrouter import FakeOpenRouter
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run(client, app_module, fanout, n):
+    app_module.LLM_FANOUT = fanout
+    latencies = []
+    for i in range(n):
+        app_module.triage_cache.clear()
+        started = time.perf_counter()
+        resp = client.post("/ask", json={"query": f"I have had a headache for {i} days"})
+        latencies.append(time.perf_counter() - started)
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    args = parser.parse_args()
+
+    fake = FakeOpenRouter(latency=args.latency, jitter=args.jitter).start()
+    os.environ["OPENROUTER_URL"] = fake.url
+    os.chdir(ROOT)
+    import app as app_module
+
+    client = app_module.app.test_client()
+    print(f"{'mode':<12}{'p50 (s)':>10}{'p95 (s)':>10}{'mean (s)':>10}")
+    for label, fanout in (("sequential", False), ("concurrent", True)):
+        samples = run(client, app_module, fanout, args.requests)
+        print(f"{label:<12}{percentile(samples, 50):>10.3f}{percentile(samples, 95):>10.3f}{statistics.mean(samples):>10.3f}")
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Compare NeuroScan classifier modes on one load_dataset() split.
+
+Reports test accuracy, train time, single-image and batch predict latency, peak Python
+heap during fit (numpy allocations are traced; libsvm's C heap is not) and model size:
+
+    python benchmarks/bench_classifier_modes.py                      # uses dataset/
+    python benchmarks/bench_classifier_modes.py --synthetic 2000     # generated scans
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import joblib
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from neuroscan import CLASSIFIER_MODES, CLASS_NAMES, load_dataset, train_model
+
+
+def make_synthetic_dataset(root, n, size=128, seed=0):
+    """Noisy 'scans'; the tumor class carries a bright blob at a random position"""
+    rng = np.random.default_rng(seed)
+    for label, class_name in enumerate(CLASS_NAMES):
+        os.makedirs(os.path.join(root, class_name), exist_ok=True)
+        for i in range(n // 2):
+            img = rng.normal(90, 40, (size, size)).clip(0, 255).astype(np.uint8)
+            cv2.circle(img, (size // 2, size // 2), size // 3, 130, -1)
+            if label:
+                center = tuple(int(c) for c in rng.integers(size // 4, 3 * size // 4, 2))
+                cv2.circle(img, center, int(rng.integers(size // 16, size // 8)), 150, -1)
+            img = cv2.GaussianBlur(img, (5, 5), 0)
+            cv2.imwrite(os.path.join(root, class_name, f"{i}.png"), cv2.cvtColor(img, cv2.COLOR_GRAY2BGR))
+
+
+def timed_ms(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dataset", default=os.path.join(ROOT, "dataset"))
+    parser.add_argument("--synthetic", type=int, default=0, help="generate this many synthetic images instead")
+    parser.add_argument("--modes", nargs="+", default=list(CLASSIFIER_MODES), choices=CLASSIFIER_MODES)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = args.dataset
+        if args.synthetic:
+            dataset = os.path.join(tmp, "dataset")
+            make_synthetic_dataset(dataset, args.synthetic)
+        X_train, X_test, y_train, y_test = load_dataset(dataset, cache_dir=os.path.join(tmp, "features"))
+    if X_train is None or X_test is None:
+        sys.exit("Need at least 5 readable images for a train/test split (try --synthetic 1000).")
+    print(f"train {X_train.shape}, test {X_test.shape}\n")
+
+    print(f"{'mode':<14}{'accuracy':>9}{'train s':>9}{'1 img ms':>10}{'batch ms/img':>14}{'fit peak MB':>13}{'model MB':>10}")
+    for mode in args.modes:
+        tracemalloc.start()
+        started = time.perf_counter()
+        model = train_model(X_train, y_train, mode)
+        train_seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        accuracy = float((model.predict(X_test) == y_test).mean())
+        single = timed_ms(lambda: model.predict_proba(X_test[:1]), args.repeat)
+        batch = timed_ms(lambda: model.predict_proba(X_test), max(1, args.repeat // 10)) / len(X_test)
+        buffer = io.BytesIO()
+        joblib.dump(model, buffer)
+        print(f"{mode:<14}{accuracy:>9.3f}{train_seconds:>9.2f}{single:>10.2f}{batch:>14.3f}"
+              f"{peak / 2**20:>13.1f}{buffer.tell() / 2**20:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Per-request latency and disk writes of /classify: legacy save-and-reread path vs in-memory path.
+
+The legacy handler is reproduced here as it was (save upload, cv2.imread for features,
+cv2.imread again + PIL for the thumbnail, delete) and mounted on the same app, so both
+paths share the model and the test client's own overhead:
+
+    python benchmarks/bench_classify.py --requests 200 --size 1024
+
+Werkzeug's test client spools request bodies over 500 KB to a temp file, so every row
+carries one upload's worth of writes; anything above that is the handler's own I/O.
+"""
+import argparse
+import base64
+import os
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def io_counters():
+    """(bytes passed to write syscalls, bytes that reached the block layer) for this process"""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["wchar"]), int(fields["write_bytes"])
+    except (OSError, KeyError):
+        return 0, 0
+
+
+def legacy_classify(model, upload_dir):
+    from flask import jsonify, request
+
+    file = request.files["file"]
+    filename = os.path.join(upload_dir, file.filename)
+    file.save(filename)
+    img = cv2.imread(filename)
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    vector = (cv2.resize(img, (64, 64)) / 255.0).flatten()
+    prediction = model.predict([vector])[0]
+    confidence = model.predict_proba([vector])[0][prediction] * 100
+    img = cv2.imread(filename)
+    img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    img.thumbnail((300, 300))
+    buffered = BytesIO()
+    img.save(buffered, format="JPEG")
+    img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
+    os.remove(filename)
+    return jsonify({"prediction": int(prediction), "confidence": round(confidence, 2), "image": img_str})
+
+
+def measure(label, fn, n):
+    latencies = []
+    wchar0, disk0 = io_counters()
+    for _ in range(n):
+        started = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+    wchar1, disk1 = io_counters()
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    print(f"{label:<22}{statistics.median(latencies):>10.2f}{p95:>10.2f}"
+          f"{(wchar1 - wchar0) / n / 1024:>17.1f}{(disk1 - disk0) / n / 1024:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--size", type=int, default=1024, help="side of the synthetic test scan in pixels")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    import server
+    server.preload()
+
+    rng = np.random.default_rng(0)
+    _, encoded = cv2.imencode(".jpg", rng.integers(0, 255, (args.size, args.size, 3), dtype=np.uint8))
+    data = encoded.tobytes()
+    client = server.app.test_client()
+    model, _ = server.model_holder.get()
+
+    def endpoint(path, mode=None):
+        def call():
+            fields = {"file": (BytesIO(data), "scan.jpg")}
+            if mode:
+                fields["thumbnail"] = mode
+            resp = client.post(path, data=fields, content_type="multipart/form-data")
+            assert resp.status_code == 200, resp.get_data(as_text=True)
+        return call
+
+    print(f"{'path':<22}{'p50 ms':>10}{'p95 ms':>10}{'written KiB/req':>17}{'disk KiB/req':>14}")
+    with tempfile.TemporaryDirectory(dir=ROOT) as upload_dir:
+        server.app.add_url_rule("/classify/legacy", "classify_legacy", lambda: legacy_classify(model, upload_dir), methods=["POST"])
+        measure("legacy (disk)", endpoint("/classify/legacy"), args.requests)
+    measure("/classify inline", endpoint("/classify"), args.requests)
+    measure("/classify url", endpoint("/classify", "url"), args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Cold start: time from launch until CureBot and NeuroScan are live, ready and classifying.
+
+Modes (each launched fresh ``--runs`` times from a scratch directory holding a synthetic
+dataset and an already published model, so no mode pays for training):
+
+    dev           python app.py + python server.py, the debug servers on :5009/:5010
+    wsgi          python wsgi.py --builtin: both apps in one pre-fork server, workers load
+                  the model in the background
+    wsgi-preload  the same with --preload: libraries and model loaded once in the master,
+                  shared with the workers through fork
+
+    python benchmarks/bench_cold_start.py --runs 5
+    python benchmarks/bench_cold_start.py --modes dev --root /path/to/older/checkout
+
+"live" is the first answer from each app, "ready" the first 200 from the readiness probes
+("/" for dev, which loads the model before listening) and "classify" the first successful
+/classify. Memory is the summed PSS of the whole process tree once ready, so pages shared
+after a fork are counted once. Without a reachable mongod, set --mongo-uri or expect the
+server-selection timeout wherever a mode waits on Mongo.
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_classifier_modes import make_synthetic_dataset
+
+MODES = ("dev", "wsgi", "wsgi-preload")
+
+
+def tree_pss_mb(pid):
+    """Summed PSS of ``pid`` and all its descendants"""
+    pids, frontier = [], [pid]
+    while frontier:
+        current = frontier.pop()
+        pids.append(current)
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                frontier.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    total = 0
+    for current in pids:
+        try:
+            with open(f"/proc/{current}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total / 1024 if total else None
+
+
+def wait_for(check, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.02)
+    return False
+
+
+def launch(mode, root, port, workers, threads, env):
+    """Start a mode's processes; returns (processes, urls)"""
+    python = sys.executable
+    if mode == "dev":
+        procs = [subprocess.Popen([python, os.path.join(root, name)], env=env, start_new_session=True,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                 for name in ("app.py", "server.py")]
+        return procs, {
+            "curebot_live": "http://127.0.0.1:5009/", "neuroscan_live": "http://127.0.0.1:5010/",
+            "curebot_ready": "http://127.0.0.1:5009/", "neuroscan_ready": "http://127.0.0.1:5010/",
+            "classify": "http://127.0.0.1:5010/classify",
+        }
+    args = [python, os.path.join(root, "wsgi.py"), "--builtin", "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--threads", str(threads)]
+    if mode == "wsgi-preload":
+        args.append("--preload")
+    base = f"http://127.0.0.1:{port}"
+    proc = subprocess.Popen(args, env=env, start_new_session=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return [proc], {
+        "curebot_live": f"{base}/healthz", "neuroscan_live": f"{base}/neuroscan/healthz",
+        "curebot_ready": f"{base}/readyz", "neuroscan_ready": f"{base}/neuroscan/readyz",
+        "classify": f"{base}/neuroscan/classify",
+    }
+
+
+def run_once(mode, root, port, workers, threads, env, scan, timeout):
+    started = time.perf_counter()
+    procs, urls = launch(mode, root, port, workers, threads, env)
+    result = {}
+    try:
+        for key in ("curebot_live", "neuroscan_live", "curebot_ready", "neuroscan_ready"):
+            if not wait_for(lambda: requests.get(urls[key], timeout=5).status_code == 200, timeout):
+                raise RuntimeError(f"{mode}: {urls[key]} not answering after {timeout}s")
+            result[key] = time.perf_counter() - started
+        result["pss_mb"] = sum(tree_pss_mb(p.pid) or 0 for p in procs) or None
+        wait_for(lambda: requests.post(urls["classify"], files={"file": ("scan.png", scan)}, timeout=30).status_code == 200,
+                 timeout)
+        result["classify"] = time.perf_counter() - started
+    finally:
+        for proc in procs:
+            try:
+                os.killpg(proc.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for proc in procs:
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
+        time.sleep(0.5)  # let the dev servers' fixed ports free up
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--root", default=ROOT, help="CureDoc directory to launch (e.g. an older checkout)")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dataset-size", type=int, default=200)
+    parser.add_argument("--mongo-uri", help="MONGO_URI for the launched apps")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_cold_start_")
+    os.chdir(workdir)  # dataset, models and the apps' data directories live here
+    make_synthetic_dataset("dataset", args.dataset_size)
+    env = dict(os.environ, PYTHONPATH=args.root, PYTHONUNBUFFERED="1", RETENTION_SWEEP_INTERVAL="0")
+    if args.mongo_uri:
+        env["MONGO_URI"] = args.mongo_uri
+    # publish a model once so every mode loads instead of training
+    subprocess.run([sys.executable, os.path.join(args.root, "train_neuroscan.py")], env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    with open(os.path.join("dataset", "tumor", "0.png"), "rb") as f:
+        scan = f.read()
+    print(f"Working directory: {workdir}")
+
+    print(f"\n{'mode':<14}{'CureBot live':>13}{'NeuroScan live':>15}{'CureBot ready':>14}"
+          f"{'NeuroScan ready':>16}{'1st classify':>13}{'PSS MB':>8}")
+    for mode in args.modes:
+        if mode != "dev" and not os.path.exists(os.path.join(args.root, "wsgi.py")):
+            print(f"{mode:<14}  (no wsgi.py in {args.root})")
+            continue
+        runs = [run_once(mode, args.root, args.port, args.workers, args.threads, env, scan, args.timeout)
+                for _ in range(args.runs)]
+        median = {key: statistics.median(run[key] for run in runs if run.get(key) is not None)
+                  for key in runs[0] if all(run.get(key) is not None for run in runs)}
+        print(f"{mode:<14}{median['curebot_live']:>12.2f}s{median['neuroscan_live']:>14.2f}s"
+              f"{median['curebot_ready']:>13.2f}s{median['neuroscan_ready']:>15.2f}s"
+              f"{median['classify']:>12.2f}s{median.get('pss_mb', float('nan')):>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""End-to-end LLaVA analysis latency and memory vs. upload size: original file vs. preprocessed.
+
+"original" hands the stored file to the Ollama client as before; "preprocessed" decodes the
+upload once, downscales it to LLAVA_MAX_SIDE and sends the compact JPEG (see image_prep.py).
+Runs against a local FakeOllama whose latency grows with the payload (``--per-mb``), or
+against a real server with ``--ollama-host``:
+
+    python benchmarks/bench_image_analysis.py --sizes 512 1024 2048 4096 --runs 5
+    python benchmarks/bench_image_analysis.py --ollama-host http://localhost:11434 --runs 2
+
+Each case runs in a fresh process; peak memory is how far its resident set (VmHWM) grew
+above the warmed-up baseline (with the upload already read), so it includes PIL's and the
+HTTP client's buffers.
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_ollama import FakeOllama
+
+
+def synthetic_scan(side, seed=0):
+    """Smooth grayscale 'scan' with fine noise, saved as an RGB JPEG like a phone photo of a film"""
+    rng = np.random.default_rng(seed)
+    coarse = rng.random((max(2, side // 64), max(2, side // 64)))
+    smooth = np.asarray(Image.fromarray((coarse * 255).astype(np.uint8)).resize((side, side), Image.BICUBIC), dtype=np.float32)
+    pixels = np.clip(smooth + rng.normal(0, 12, (side, side)), 0, 255).astype(np.uint8)
+    out = BytesIO()
+    Image.fromarray(pixels).convert("RGB").save(out, "JPEG", quality=92)
+    return out.getvalue()
+
+
+def _status_kb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")  # resets VmHWM to the current resident set
+    except OSError:
+        pass
+
+
+def run_case(path, mode, runs, max_side, ollama_host, workdir):
+    """Child process: ``runs`` analyses of the upload at ``path``; returns (latencies, peak MB)"""
+    os.environ["OLLAMA_HOST"] = ollama_host
+    os.environ["LLAVA_MAX_SIDE"] = str(max_side)
+    os.chdir(workdir)  # keep app.py's image/report directories out of the repo
+    import app as app_module
+    from image_prep import decode_upload, model_buffer
+
+    app_module.run_llava(model_buffer(decode_upload(synthetic_scan(64)), max_side), "")  # warm up the client
+    with open(path, "rb") as f:
+        data = f.read()
+
+    reset_peak_rss()
+    baseline = _status_kb("VmRSS")
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        if mode == "original":
+            app_module.run_llava(path, "")
+        else:
+            img = decode_upload(data, max_side)
+            app_module.run_llava(model_buffer(img, max_side, app_module.LLAVA_JPEG_QUALITY), "")
+        latencies.append(time.perf_counter() - started)
+    peak = _status_kb("VmHWM")
+    return latencies, (peak - baseline) / 1024 if peak and baseline else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 2048, 4096])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake server base latency (s)")
+    parser.add_argument("--per-mb", type=float, default=0.25, help="fake server seconds per MB of image")
+    parser.add_argument("--ollama-host", help="benchmark a real Ollama server instead of the fake")
+    parser.add_argument("--max-side", type=int, default=672)
+    args = parser.parse_args()
+
+    fake = None
+    if not args.ollama_host:
+        fake = FakeOllama(latency=args.latency, jitter=0.0, per_mb=args.per_mb).start()
+    host = args.ollama_host or fake.url
+    workdir = tempfile.mkdtemp(prefix="bench_image_analysis_")
+    context = multiprocessing.get_context("spawn")
+
+    print(f"{'side':>6}{'upload KB':>11}{'mode':>14}{'sent KB':>9}{'p50 (s)':>9}{'mean (s)':>10}{'peak MB':>9}")
+    for side in args.sizes:
+        data = synthetic_scan(side)
+        path = os.path.join(workdir, f"scan_{side}.jpg")
+        with open(path, "wb") as f:
+            f.write(data)
+        upload_kb = len(data) / 1024
+        for mode in ("original", "preprocessed"):
+            sent_before = len(fake.image_bytes) if fake else 0
+            # a fresh process per case, so one case's heap doesn't hide the next one's peak
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                latencies, peak = pool.submit(run_case, path, mode, args.runs, args.max_side, host, workdir).result()
+            sent = statistics.mean(fake.image_bytes[sent_before + 1:]) / 1024 if fake else float("nan")
+            peak_text = f"{peak:>9.1f}" if peak is not None else f"{'n/a':>9}"
+            print(f"{side:>6}{upload_kb:>11.0f}{mode:>14}{sent:>9.0f}"
+                  f"{statistics.median(latencies):>9.3f}{statistics.mean(latencies):>10.3f}{peak_text}")
+    if fake:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
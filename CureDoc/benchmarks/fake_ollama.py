@@ -0,0 +1,122 @@
+"""Local stand-in for an Ollama server's ``/api/chat`` endpoint (non-streaming).
+
+Each reply takes ``--latency`` seconds plus up to ``--jitter`` seconds from a seeded RNG,
+plus ``--per-mb`` seconds per MB of image payload (a stand-in for the server decoding and
+resizing what it was sent), so the /upload job pool can be exercised without a GPU. The
+server records how many requests it saw, the peak number in flight and the size of the
+images it was sent.
+
+    python benchmarks/fake_ollama.py --port 11499 --latency 5
+    OLLAMA_HOST=http://127.0.0.1:11499 python app.py
+"""
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPORT = ("Disease/Condition Identification: no acute abnormality is visible. "
+          "Please consult a qualified medical professional; this is not medical advice.")
+
+
+class FakeOllama:
+    def __init__(self, host="127.0.0.1", port=0, latency=2.0, jitter=0.5, seed=42, per_mb=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.per_mb = per_mb
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.image_bytes = []
+        self.fail_next = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _enter(self, images):
+        """Return (delay, fail) for a new request and count it as in flight"""
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            sizes = [len(base64.b64decode(image)) for image in images]
+            self.image_bytes.extend(sizes)
+            fail = self.fail_next > 0
+            if fail:
+                self.fail_next -= 1
+            return self.latency + self._rng.random() * self.jitter + self.per_mb * sum(sizes) / 1e6, fail
+
+    def _exit(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                images = [image for message in body.get("messages", []) for image in message.get("images") or []]
+                delay, fail = fake._enter(images)
+                try:
+                    time.sleep(delay)
+                    if fail:
+                        self._reply(500, {"error": "model runner has unexpectedly stopped"})
+                        return
+                    self._reply(200, {
+                        "model": body.get("model"),
+                        "created_at": datetime.now(timezone.utc).isoformat(),
+                        "message": {"role": "assistant", "content": REPORT},
+                        "done": True,
+                        "prompt_eval_count": 576 * len(images) + len(body["messages"][-1].get("content", "").split()),
+                        "eval_count": len(REPORT.split()),
+                    })
+                finally:
+                    fake._exit()
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11499)
+    parser.add_argument("--latency", type=float, default=2.0)
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--per-mb", type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeOllama(args.host, args.port, args.latency, args.jitter, per_mb=args.per_mb)
+    print(f"Fake Ollama listening on {fake.url}")
+    fake.server.serve_forever()
@@ -0,0 +1,153 @@
+"""Local stand-in for the OpenRouter chat-completions endpoint.
+
+Replies are canned from the prompt text so the CureBot helpers parse them as usual.
+Latency is ``--latency`` seconds plus up to ``--jitter`` seconds drawn from a seeded RNG.
+Setting ``fail_next`` makes the next N requests answer ``fail_status`` (with a
+``Retry-After`` header when ``retry_after`` is set) so retries and the LLM client's circuit
+breaker can be exercised. Requests with ``"stream": true`` are
+answered as Server-Sent Events, one word per chunk, ``token_delay`` seconds apart.
+
+    python benchmarks/fake_openrouter.py --port 8099 --latency 0.4
+    OPENROUTER_URL=http://127.0.0.1:8099/api/v1/chat/completions python app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FOLLOWUPS = "\n".join([
+    "1. How long have you had these symptoms?",
+    "2. Do you have a fever?",
+    "3. Are you taking any medication?",
+    "4. Have you had this before?",
+    "5. Does anything make it better or worse?",
+])
+
+
+def canned_reply(prompt):
+    if "related to the medical field" in prompt:
+        return "Yes"
+    if "follow-up questions" in prompt and "generate 5" in prompt:
+        return FOLLOWUPS
+    if "respond like a real doctor" in prompt:
+        return "Likely a mild viral infection. Rest, fluids and paracetamol as directed. See a doctor if fever exceeds 3 days."
+    return "This is commonly caused by stress, dehydration or lack of sleep."
+
+
+def usage(prompt, reply):
+    """Rough OpenAI-style token counts (~1 token per word) so usage accounting has data"""
+    prompt_tokens, completion_tokens = len(prompt.split()), len(reply.split())
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+class FakeOpenRouter:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.3, jitter=0.1, seed=42, token_delay=0.02):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.jitter = jitter
+        self.requests = 0
+        self.fail_next = 0
+        self.fail_status = 503
+        self.retry_after = None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/v1/chat/completions"
+
+    def _next(self):
+        """Return (delay, status) for the next request"""
+        with self._lock:
+            self.requests += 1
+            status = 200
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                status = self.fail_status
+            return self.latency + self._rng.random() * self.jitter, status
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real upstream
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                prompt = body.get("messages", [{}])[-1].get("content", "")
+                delay, status = fake._next()
+                time.sleep(delay)
+                if status != 200:
+                    self.send_response(status)
+                    if fake.retry_after is not None:
+                        self.send_header("Retry-After", str(fake.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if body.get("stream"):
+                    self._stream(body, canned_reply(prompt))
+                    return
+                reply = canned_reply(prompt)
+                payload = json.dumps({
+                    "id": "fake",
+                    "model": body.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}}],
+                    "usage": usage(prompt, reply),
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, body, reply):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, word in enumerate(reply.split(" ")):
+                    chunk = {"model": body.get("model"),
+                             "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}}]}
+                    self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                    time.sleep(fake.token_delay)
+                last = {"model": body.get("model"), "choices": [], "usage": usage(body["messages"][-1]["content"], reply)}
+                self._write_chunk(f"data: {json.dumps(last)}\n\n".encode())
+                self._write_chunk(b"data: [DONE]\n\n")
+                self._write_chunk(b"")
+
+            def _write_chunk(self, data):
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    args = parser.parse_args()
+    fake = FakeOpenRouter(args.host, args.port, args.latency, args.jitter)
+    print(f"Fake OpenRouter listening on {fake.url}")
+    fake.server.serve_forever()
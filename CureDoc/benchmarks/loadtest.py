@@ -0,0 +1,352 @@
+"""Load test CureBot (app.py) and NeuroScan (server.py) end to end against local stand-ins.
+
+Both apps are served over real HTTP (threaded werkzeug servers on ephemeral ports) from a
+scratch directory, with FakeOpenRouter for the LLM, FakeOllama for LLaVA, mongomock (or a
+local mongod via ``--mongo-uri``) for sessions and a generated NeuroScan dataset. Every
+scenario is driven by ``--concurrency`` client threads and reports throughput, p50/p95/p99
+latency and how far the process's resident set grew while it ran.
+
+    python benchmarks/loadtest.py                                  # every scenario
+    python benchmarks/loadtest.py --scenarios ask classify --concurrency 32 --requests 400
+    python benchmarks/loadtest.py --save-baseline main             # writes benchmarks/baselines/main.json
+    python benchmarks/loadtest.py --compare main                   # exit 1 on a regression
+
+Baselines are only comparable on the same machine and settings; the settings are stored
+with them and a comparison warns when they differ.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+
+import numpy as np
+import requests
+from PIL import Image
+from werkzeug.serving import make_server
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_classifier_modes import make_synthetic_dataset
+from fake_ollama import FakeOllama
+from fake_openrouter import FakeOpenRouter
+
+BASELINE_DIR = os.path.join(BENCH_DIR, "baselines")
+SCENARIOS = ("ask", "answer", "upload", "download_pdf", "classify", "classify_batch")
+# settings that change the numbers; a baseline recorded with different ones is not comparable
+COMPARABLE = ("requests", "concurrency", "llm_latency", "ollama_latency", "ollama_parallel", "image_size", "batch_size")
+
+
+def percentile(samples, pct):
+    """Linearly interpolated percentile of ``samples`` (0-100)"""
+    ordered = sorted(samples)
+    if not ordered:
+        return float("nan")
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _status_mb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def scan_bytes(seed, size, fmt="JPEG"):
+    """A distinct synthetic scan per seed, so content-addressed caches don't short-circuit"""
+    rng = np.random.default_rng(seed)
+    pixels = (rng.random((size // 16, size // 16)) * 255).astype(np.uint8)
+    img = Image.fromarray(pixels).resize((size, size), Image.BICUBIC).convert("RGB")
+    out = BytesIO()
+    img.save(out, fmt)
+    return out.getvalue()
+
+
+def drive(call, n, concurrency):
+    """Run ``call(i, session)`` for i in range(n) on ``concurrency`` threads, each with its
+    own keep-alive HTTP session; returns throughput/latency/memory figures"""
+    local = threading.local()
+    latencies, errors = [], []
+
+    def one(i):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            ok = call(i, local.session)
+        except Exception as e:  # anything a call raises is a failed request, never a dead worker
+            ok = False
+            errors.append(f"{type(e).__name__}: {e}")
+        elapsed = time.perf_counter() - started
+        if ok:
+            latencies.append(elapsed)
+
+    _reset_peak_rss()
+    rss_before = _status_mb("VmRSS")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(n)))
+    seconds = time.perf_counter() - started
+    peak = _status_mb("VmHWM")
+
+    ms = [latency * 1000 for latency in latencies]
+    return {
+        "requests": n,
+        "errors": n - len(latencies),
+        "seconds": round(seconds, 3),
+        "throughput_rps": round(len(latencies) / seconds, 2) if seconds else 0.0,
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else float("nan"),
+        "rss_growth_mb": round(peak - rss_before, 1) if peak and rss_before else None,
+        "first_error": errors[0] if errors else None,
+    }
+
+
+def serve(wsgi_app):
+    server = make_server("127.0.0.1", 0, wsgi_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def start_curebot(args):
+    llm = FakeOpenRouter(latency=args.llm_latency, jitter=args.llm_jitter, seed=args.seed, token_delay=0.0).start()
+    ollama = FakeOllama(latency=args.ollama_latency, jitter=args.ollama_jitter, seed=args.seed).start()
+    os.environ.update({
+        "OPENROUTER_URL": llm.url,
+        "OLLAMA_HOST": ollama.url,
+        "ANALYSIS_WORKERS": str(args.ollama_parallel),
+        "ANALYSIS_QUEUE_DEPTH": str(max(args.requests, 16)),
+        "REPORTS_DIR": "reports",
+        "RETENTION_SWEEP_INTERVAL": "0",
+    })
+    if args.mongo_uri:
+        os.environ.update({"MONGO_URI": args.mongo_uri, "MONGO_DB": "curebot_loadtest"})
+    else:
+        os.environ["MONGO_SERVER_SELECTION_TIMEOUT_MS"] = "200"  # nothing to find; fail the index build fast
+
+    import app as curebot
+    if not args.mongo_uri:
+        import mongomock
+        collection = mongomock.MongoClient()["curebot"]["sessions"]
+        curebot.sessions.collection = collection
+        if curebot.session_writer is not None:
+            curebot.session_writer.collection = collection
+        curebot.sessions.ensure_indexes()
+    server, url = serve(curebot.app)
+    return {"module": curebot, "server": server, "url": url, "fakes": (llm, ollama)}
+
+
+def start_neuroscan(args):
+    os.environ.update({"NEUROSCAN_MODELS_DIR": "models", "NEUROSCAN_FEATURE_CACHE": "feature_cache"})
+    make_synthetic_dataset("dataset", args.dataset_size, seed=args.seed)
+    import server as neuroscan
+    neuroscan.preload()  # untimed: the model would otherwise load on the first request
+    server, url = serve(neuroscan.app)
+    return {"module": neuroscan, "server": server, "url": url}
+
+
+def answer_body(i):
+    return {
+        "query": f"I have had a headache for {i} days",
+        "followups": ["1. How long have you had these symptoms?", "2. Do you have a fever?"],
+        "responses": [f"{i} days", "No" if i % 2 else "Yes, mild"],
+    }
+
+
+def scenarios(args, curebot, neuroscan):
+    """name -> (setup, call); setup runs untimed and returns the call's shared state"""
+    images = {}
+
+    def ask(i, session, _):
+        r = session.post(f"{curebot['url']}/ask", json={"query": f"I have had a headache for {i} days"}, timeout=60)
+        return r.status_code == 200
+
+    def answer(i, session, _):
+        return session.post(f"{curebot['url']}/answer", json=answer_body(i), timeout=60).status_code == 200
+
+    def upload_setup():
+        return [scan_bytes(args.seed * 100000 + i, args.image_size) for i in range(args.requests)]
+
+    def upload(i, session, scans):
+        r = session.post(f"{curebot['url']}/upload", files={"image": (f"scan{i}.jpg", scans[i], "image/jpeg")}, timeout=60)
+        if r.status_code not in (200, 202):
+            return False
+        status_url = f"{curebot['url']}{r.json()['status_url']}"
+        deadline = time.monotonic() + args.poll_timeout
+        while time.monotonic() < deadline:  # end to end: until the analysis is stored
+            status = session.get(status_url, timeout=60).json()
+            if status.get("status") in ("done", "failed"):
+                return status["status"] == "done"
+            time.sleep(0.02)
+        raise TimeoutError(f"analysis {status_url} not finished after {args.poll_timeout}s")
+
+    def download_setup():
+        ids = []
+        with requests.Session() as session:
+            for i in range(max(1, args.requests // 4)):
+                r = session.post(f"{curebot['url']}/answer", json=answer_body(10_000 + i), timeout=60)
+                ids.append(r.json()["session_id"])
+        return ids
+
+    def download_pdf(i, session, ids):
+        r = session.get(f"{curebot['url']}/download/pdf/{ids[i % len(ids)]}", timeout=120)
+        if r.status_code != 200 or r.content[:4] != b"%PDF":
+            raise requests.HTTPError(f"{r.status_code}: {r.text[:200]}")
+        return True
+
+    def classify_setup():
+        return [scan_bytes(i, args.image_size, "PNG") for i in range(16)]
+
+    def classify(i, session, scans):
+        r = session.post(f"{neuroscan['url']}/classify", files={"file": ("scan.png", scans[i % len(scans)])},
+                         data={"thumbnail": "url"}, timeout=60)
+        return r.status_code == 200
+
+    def classify_batch(i, session, scans):
+        files = [("files", (f"scan{j}.png", scans[(i + j) % len(scans)])) for j in range(args.batch_size)]
+        r = session.post(f"{neuroscan['url']}/classify/batch", files=files, timeout=120)
+        return r.status_code == 200
+
+    none = lambda: None
+    return {
+        "ask": (none, ask),
+        "answer": (none, answer),
+        "upload": (upload_setup, upload),
+        "download_pdf": (download_setup, download_pdf),
+        "classify": (classify_setup, classify),
+        "classify_batch": (classify_setup, classify_batch),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print deltas against a stored baseline; returns the list of regressions"""
+    regressions = []
+    print(f"\nvs. baseline '{baseline['name']}' ({baseline['created_at']}), tolerance {tolerance:.0%}")
+    print(f"{'scenario':<16}{'p95 ms':>10}{'base':>10}{'Δ':>8}{'rps':>10}{'base':>10}{'Δ':>8}")
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        if not base:
+            continue
+        p95_delta = result["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        rps_delta = result["throughput_rps"] / base["throughput_rps"] - 1 if base["throughput_rps"] else 0.0
+        flag = ""
+        if p95_delta > tolerance or rps_delta < -tolerance or result["errors"] > base["errors"]:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<16}{result['p95_ms']:>10.1f}{base['p95_ms']:>10.1f}{p95_delta:>+8.0%}"
+              f"{result['throughput_rps']:>10.1f}{base['throughput_rps']:>10.1f}{rps_delta:>+8.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-jitter", type=float, default=0.05)
+    parser.add_argument("--ollama-latency", type=float, default=0.5)
+    parser.add_argument("--ollama-jitter", type=float, default=0.1)
+    parser.add_argument("--ollama-parallel", type=int, default=2, help="ANALYSIS_WORKERS for the upload scenario")
+    parser.add_argument("--image-size", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=32, help="images per /classify/batch request")
+    parser.add_argument("--dataset-size", type=int, default=200, help="synthetic NeuroScan training scans")
+    parser.add_argument("--poll-timeout", type=float, default=120.0, help="seconds an upload may wait for its analysis")
+    parser.add_argument("--mongo-uri", help="use a local mongod (database curebot_loadtest) instead of mongomock")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95/throughput change before flagging")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no access log line per request
+    workdir = tempfile.mkdtemp(prefix="curedoc_loadtest_")
+    os.chdir(workdir)  # the apps create their image/report/model directories relative to cwd
+    print(f"Working directory: {workdir}")
+
+    needs_curebot = any(name in args.scenarios for name in ("ask", "answer", "upload", "download_pdf"))
+    needs_neuroscan = any(name.startswith("classify") for name in args.scenarios)
+    curebot = start_curebot(args) if needs_curebot else None
+    neuroscan = start_neuroscan(args) if needs_neuroscan else None
+    table = scenarios(args, curebot, neuroscan)
+
+    results = {}
+    print(f"\n{'scenario':<16}{'req':>6}{'err':>5}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ΔRSS MB':>9}")
+    for name in args.scenarios:
+        setup, call = table[name]
+        state = setup()
+        result = drive(lambda i, session: call(i, session, state), args.requests, args.concurrency)
+        results[name] = result
+        rss = f"{result['rss_growth_mb']:>9.1f}" if result["rss_growth_mb"] is not None else f"{'n/a':>9}"
+        print(f"{name:<16}{result['requests']:>6}{result['errors']:>5}{result['throughput_rps']:>9.1f}"
+              f"{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}{rss}")
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+    config = {key: getattr(args, key) for key in COMPARABLE}
+    status = 0
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json")) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print(f"warning: baseline was recorded with {baseline.get('config')}, this run used {config}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}")
+            status = 1
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save_baseline}.json")
+        with open(path, "w") as f:
+            json.dump({
+                "name": args.save_baseline,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+                "config": config,
+                "results": results,
+            }, f, indent=2)
+        print(f"Saved baseline to {path}")
+
+    for app in (curebot, neuroscan):
+        if app:
+            app["server"].shutdown()
+    if curebot:
+        if curebot["module"].session_writer is not None:
+            curebot["module"].session_writer.flush()
+        for fake in curebot["fakes"]:
+            fake.stop()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, concurrent builders are not serialized
+    fcntl = None
+
+INDEX_FILE = "index.json"
+FEATURES_FILE = "features.npy"
+LABELS_FILE = "labels.npy"
+LOCK_FILE = ".lock"
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def decode_features(path, image_size):
+    """BGR decode -> gray -> resize, kept as uint8 (the /255 scaling happens at training time)"""
+    img = cv2.imread(path)
+    if img is None:
+        return None
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(img, image_size).reshape(-1)
+
+
+def _process(path, image_size, known_sha):
+    """Worker: hash the file and decode it unless its content is already cached.
+    OpenCV releases the GIL while decoding, so a thread pool scales across cores."""
+    sha = file_sha256(path)
+    if sha == known_sha:
+        return sha, None, True
+    try:
+        return sha, decode_features(path, image_size), False
+    except Exception as e:
+        print(f"Error processing {path}: {e}")
+        return sha, None, False
+
+
+class FeatureCache:
+    """Incrementally maintained uint8 feature matrix for a dataset, memory-mapped from
+    ``features.npy``. A file is only decoded again when its size/mtime changed *and*
+    its SHA-256 no longer matches the cached row.
+
+    Several processes may share a cache directory (e.g. pre-fork workers each loading the
+    model): a rebuild holds an exclusive flock on ``.lock`` and writes uniquely named temp
+    files, and ``load`` takes a shared lock so it never sees half-replaced files."""
+
+    def __init__(self, cache_dir, image_size=(64, 64)):
+        self.cache_dir = cache_dir
+        self.image_size = tuple(image_size)
+        self.n_features = self.image_size[0] * self.image_size[1]
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    @contextmanager
+    def _locked(self, exclusive):
+        with open(self._path(LOCK_FILE), "a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield  # closing the handle releases the lock
+
+    def _temp(self, name, temps):
+        """Fresh temp file next to ``name``, unique to this call and recorded in ``temps``"""
+        fd, path = tempfile.mkstemp(dir=self.cache_dir, prefix=f".{name}.", suffix=".tmp")
+        os.close(fd)
+        temps.append(path)
+        return path
+
+    def _read_index(self):
+        try:
+            with open(self._path(INDEX_FILE)) as f:
+                index = json.load(f)
+            features = np.load(self._path(FEATURES_FILE), mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return {}, None
+        if index.get("image_size") != list(self.image_size) or features.shape != (index.get("rows"), self.n_features):
+            return {}, None
+        return index["files"], features
+
+    def load(self):
+        """Cached ``(X, y)`` as read-only memory maps, without touching the dataset"""
+        with self._locked(exclusive=False):
+            return self._load()
+
+    def _load(self):
+        files, features = self._read_index()
+        if features is None:
+            return None, None
+        return features, np.load(self._path(LABELS_FILE), mmap_mode="r")
+
+    def hashes(self, files):
+        """``{key: sha256}`` for ``files`` (``(key, label, path)`` as for ``update``), taking
+        the cached hash of every file whose size/mtime still match and hashing the rest"""
+        with self._locked(exclusive=False):
+            known, _ = self._read_index()
+        result = {}
+        for key, _, path in files:
+            stat = os.stat(path)
+            prev = known.get(key)
+            if prev and prev["size"] == stat.st_size and prev["mtime_ns"] == stat.st_mtime_ns:
+                result[key] = prev["sha256"]
+            else:
+                result[key] = file_sha256(path)
+        return result
+
+    def update(self, files, workers=None):
+        """Bring the cache in line with ``files`` (a list of ``(key, label, path)``) and
+        return ``(X, y, stats)`` with X a uint8 memmap of shape (n, n_features).
+        A process arriving while another rebuilds waits, then finds the cache up to date."""
+        with self._locked(exclusive=True):
+            temps = []
+            try:
+                return self._update(files, workers, temps)
+            finally:
+                for path in temps:
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def _update(self, files, workers, temps):
+        old_files, old_features = self._read_index()
+        stats = {"files": len(files), "unchanged": 0, "rehashed": 0, "decoded": 0, "failed": 0}
+
+        stats_now = {}
+        todo = []
+        for key, label, path in files:
+            stat = os.stat(path)
+            stats_now[key] = (stat.st_size, stat.st_mtime_ns)
+            prev = old_files.get(key)
+            if not (prev and prev["size"] == stat.st_size and prev["mtime_ns"] == stat.st_mtime_ns):
+                todo.append((key, path, prev["sha256"] if prev else None))
+
+        if not todo and old_features is not None and list(old_files) == [key for key, _, _ in files]:
+            stats["unchanged"] = sum(1 for entry in old_files.values() if entry["row"] is not None)
+            stats["failed"] = len(files) - stats["unchanged"]
+            X, y = self._load()
+            return X, y, stats
+
+        results = {}
+        if todo:
+            with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+                futures = {key: pool.submit(_process, path, self.image_size, sha) for key, path, sha in todo}
+                results = {key: future.result() for key, future in futures.items()}
+
+        tmp_features = self._temp(FEATURES_FILE, temps)
+        out = np.lib.format.open_memmap(tmp_features, mode="w+", dtype=np.uint8, shape=(len(files), self.n_features))
+        labels = np.empty(len(files), dtype=np.int8)
+        index = {}
+        row = 0
+        for key, label, path in files:
+            size, mtime_ns = stats_now[key]
+            prev = old_files.get(key)
+            if key in results:
+                sha, vector, reused = results[key]
+                if reused and prev["row"] is None:
+                    stats["failed"] += 1
+                    index[key] = {**prev, "size": size, "mtime_ns": mtime_ns}
+                    continue
+                elif reused:
+                    out[row] = old_features[prev["row"]]
+                    stats["rehashed"] += 1
+                elif vector is None:
+                    print(f"Could not read image: {path}")
+                    stats["failed"] += 1
+                    index[key] = {"row": None, "label": label, "size": size, "mtime_ns": mtime_ns, "sha256": sha}
+                    continue
+                else:
+                    out[row] = vector
+                    stats["decoded"] += 1
+            elif prev["row"] is None:
+                # known-unreadable and untouched since; don't try again
+                stats["failed"] += 1
+                index[key] = prev
+                continue
+            else:
+                sha = prev["sha256"]
+                out[row] = old_features[prev["row"]]
+                stats["unchanged"] += 1
+            labels[row] = label
+            index[key] = {"row": row, "label": label, "size": size, "mtime_ns": mtime_ns, "sha256": sha}
+            row += 1
+
+        out.flush()
+        if row < len(files):
+            # unreadable files leave empty rows at the end; shrink to the valid prefix
+            tmp_compact = self._temp(FEATURES_FILE, temps)
+            compact = np.lib.format.open_memmap(tmp_compact, mode="w+", dtype=np.uint8, shape=(row, self.n_features))
+            compact[:] = out[:row]
+            compact.flush()
+            del compact
+            os.replace(tmp_compact, tmp_features)
+        del out
+
+        tmp_labels = self._temp(LABELS_FILE, temps)
+        with open(tmp_labels, "wb") as f:
+            np.save(f, labels[:row])
+        tmp_index = self._temp(INDEX_FILE, temps)
+        with open(tmp_index, "w") as f:
+            json.dump({"image_size": list(self.image_size), "rows": row, "files": index}, f)
+        os.replace(tmp_features, self._path(FEATURES_FILE))
+        os.replace(tmp_labels, self._path(LABELS_FILE))
+        os.replace(tmp_index, self._path(INDEX_FILE))
+
+        X, y = self._load()
+        return X, y, stats
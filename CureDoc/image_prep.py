@@ -0,0 +1,44 @@
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+
+def decode_upload(data, max_side=0):
+    """Decode an upload exactly once. JPEGs are decoded at the smallest DCT scale that
+    still covers ``max_side``, which skips most of the work for large scans. Raises
+    ValueError for anything PIL can't read (including decompression bombs)."""
+    try:
+        img = Image.open(BytesIO(data))
+        if max_side:
+            img.draft("RGB", (max_side, max_side))
+        img.load()
+        return img
+    except Exception as e:
+        raise ValueError("Unsupported or corrupt image") from e
+
+
+def to_8bit(img):
+    """16-bit scans (common for DICOM exports) keep their top 8 bits instead of clipping"""
+    if img.mode.startswith("I"):
+        return img.convert("I").point(lambda v: v * (1 / 256)).convert("L")
+    return img
+
+
+def model_buffer(img, max_side=672, quality=90):
+    """Compact JPEG for the vision model: EXIF orientation applied, longest side at most
+    ``max_side``, RGB, and no metadata (EXIF, ICC, text chunks) carried over"""
+    img = to_8bit(ImageOps.exif_transpose(img))
+    if img.mode != "RGB":
+        if "A" in img.getbands() or img.mode == "P":
+            # flatten transparency onto white instead of the black convert() would give
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img.convert("RGBA"), mask=img.convert("RGBA").getchannel("A"))
+            img = background
+        else:
+            img = img.convert("RGB")
+    if max(img.size) > max_side:
+        img = img.copy()
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+    out = BytesIO()
+    img.save(out, "JPEG", quality=quality)
+    return out.getvalue()
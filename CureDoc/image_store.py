@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+from image_prep import to_8bit
+
+IMAGE_NAME = re.compile(r"^([0-9a-f]{64})_([0-9a-f]{16})(\.[a-z0-9]+)$")
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "GIF": ".gif", "BMP": ".bmp", "TIFF": ".tif", "WEBP": ".webp"}
+
+
+def perceptual_hash(img):
+    """64-bit difference hash: survives re-encoding, resizing and small contrast changes"""
+    img.draft("L", (64, 64))  # JPEG not decoded yet: decode at reduced scale (no-op once loaded)
+    pixels = list(to_8bit(img).convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class ImageStore:
+    """Content-addressed store for uploaded images.
+
+    Files are named ``<sha256>_<dhash><ext>``, so an exact re-upload maps to the same file
+    and the index can be rebuilt from a directory listing without decoding anything. Only
+    an exact (SHA-256) match ever resolves to a stored copy: scans that differ only by a
+    small lesion can sit a couple of dHash bits apart, so a perceptual match must never
+    stand in for the upload itself. With ``max_distance`` > 0 (opt-in), an upload within
+    that many bits of a stored image is still stored as itself and only reports the
+    similar image as ``near_sha256``.
+    Analyses are cached per image in a ``<sha256>.analysis.json`` sidecar keyed on the
+    prompt/model. Eviction works like the report store: idle age first, then LRU by atime.
+    """
+
+    def __init__(self, directory, max_bytes=2 * 1024 ** 3, max_age=30 * 24 * 3600, max_distance=0):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_distance = max_distance
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.analysis_hits = 0
+        self.analysis_misses = 0
+        self._index = {}  # sha256 -> (path, phash)
+        self._lock = threading.Lock()
+        self._scan()
+
+    def _scan(self):
+        index = {}
+        for path in self.directory.iterdir():
+            match = IMAGE_NAME.match(path.name)
+            if match:
+                index[match.group(1)] = (path, int(match.group(2), 16))
+        with self._lock:
+            self._index = index
+
+    def _touch(self, path):
+        try:
+            os.utime(path, ns=(time.time_ns(), path.stat().st_mtime_ns))
+        except FileNotFoundError:
+            pass
+
+    def _nearest(self, phash):
+        if self.max_distance <= 0:
+            return None
+        best, best_distance = None, self.max_distance + 1
+        for sha, (path, stored) in self._index.items():
+            distance = hamming(phash, stored)
+            if distance < best_distance:
+                best, best_distance = sha, distance
+        return best
+
+    def put(self, data, filename="", decode=None):
+        """Store an upload (or find its byte-identical copy). Returns ``{"path", "sha256",
+        "phash", "duplicate", "near_sha256", "image"}`` with duplicate None, "exact" or "near"
+        ("near": stored as itself, similar to ``near_sha256``); raises ValueError if
+        the data is not a readable image. ``decode(data)`` -> PIL image is only called when
+        the bytes aren't already stored, and the decoded image is handed back as "image"."""
+        sha = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            known = self._index.get(sha)
+        if known and known[0].exists():
+            self.exact_hits += 1
+            self._touch(known[0])
+            return {"path": known[0], "sha256": sha, "phash": known[1], "duplicate": "exact", "near_sha256": None,
+                    "image": None}
+
+        try:
+            img = decode(data) if decode else Image.open(BytesIO(data))
+            extension = EXTENSIONS.get(img.format) or os.path.splitext(filename)[1].lower() or ".img"
+            phash = perceptual_hash(img)
+        except Exception as e:
+            raise ValueError("Unsupported or corrupt image") from e
+
+        with self._lock:
+            near = self._nearest(phash)
+            if near:
+                self.near_hits += 1
+            else:
+                self.misses += 1
+            path = self.directory / f"{sha}_{phash:016x}{extension}"
+            fd, tmp_name = tempfile.mkstemp(dir=self.directory, prefix=f".{sha[:16]}_", suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, path)
+            self._index[sha] = (path, phash)
+
+        self.evict()
+        return {"path": path, "sha256": sha, "phash": phash, "duplicate": "near" if near else None,
+                "near_sha256": near, "image": img}
+
+    def _analysis_path(self, sha):
+        return self.directory / f"{sha}.analysis.json"
+
+    def _read_analyses(self, sha):
+        try:
+            return json.loads(self._analysis_path(sha).read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def analysis(self, sha, key):
+        """Cached analysis of image ``sha`` for ``key`` (prompt + model), or None"""
+        result = self._read_analyses(sha).get(key)
+        if result is None:
+            self.analysis_misses += 1
+        else:
+            self.analysis_hits += 1
+        return result
+
+    def save_analysis(self, sha, key, result):
+        with self._lock:
+            analyses = self._read_analyses(sha)
+            analyses[key] = result
+            path = self._analysis_path(sha)
+            tmp = path.with_name(f".{path.name}.tmp")
+            tmp.write_text(json.dumps(analyses))
+            os.replace(tmp, path)
+
+    def evict(self):
+        """Remove images idle for longer than ``max_age``, then least recently used ones
+        until the store fits in ``max_bytes``. Returns the number of bytes reclaimed."""
+        now = time.time()
+        reclaimed = 0
+        entries = []
+        for path in self.directory.iterdir():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.name.endswith(".tmp"):
+                if now - stat.st_mtime > 3600:
+                    path.unlink(missing_ok=True)
+                    reclaimed += stat.st_size
+                continue
+            match = IMAGE_NAME.match(path.name)
+            if match is None:
+                continue
+            if now - stat.st_atime > self.max_age:
+                reclaimed += self._remove(match.group(1), path)
+            else:
+                entries.append((stat.st_atime, stat.st_size, match.group(1), path))
+
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, sha, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            total -= size
+            reclaimed += self._remove(sha, path)
+        return reclaimed
+
+    def images(self):
+        """``(sha256, path)`` for every stored image, re-read from disk so files written by
+        other worker processes are included"""
+        self._scan()
+        with self._lock:
+            return [(sha, path) for sha, (path, _) in self._index.items()]
+
+    def remove(self, sha):
+        """Delete a stored image and its cached analyses; returns the bytes freed"""
+        with self._lock:
+            entry = self._index.get(sha)
+        return self._remove(sha, entry[0]) if entry else 0
+
+    def _remove(self, sha, path):
+        """Delete an image and its cached analyses; returns the bytes freed"""
+        freed = 0
+        for victim in (path, self._analysis_path(sha)):
+            try:
+                freed += victim.stat().st_size
+                victim.unlink()
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._index.pop(sha, None)
+        return freed
+
+    def stats(self):
+        with self._lock:
+            paths = [path for path, _ in self._index.values()]
+        lookups = self.exact_hits + self.near_hits + self.misses
+        analysis_lookups = self.analysis_hits + self.analysis_misses
+        return {
+            "images": len(paths),
+            "bytes": sum(p.stat().st_size for p in paths if p.exists()),
+            "max_bytes": self.max_bytes,
+            "max_age": self.max_age,
+            "max_distance": self.max_distance,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "dedupe_rate": round(self.exact_hits / lookups, 4) if lookups else 0.0,
+            "analysis_hits": self.analysis_hits,
+            "analysis_misses": self.analysis_misses,
+            "analysis_hit_rate": round(self.analysis_hits / analysis_lookups, 4) if analysis_lookups else 0.0,
+        }
@@ -0,0 +1,318 @@
+import copy
+import hashlib
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so every process trains (run a single worker there)
+    fcntl = None
+
+
+class IncrementalModel:
+    """Random Fourier features approximating an RBF kernel, followed by an SGD logistic
+    regression. Supports ``partial_fit``, so an update costs O(batch), not O(dataset)."""
+
+    def __init__(self, n_features, gamma, n_components=1024, classes=(0, 1), alpha=1e-4, random_state=42):
+        from sklearn.kernel_approximation import RBFSampler
+        from sklearn.linear_model import SGDClassifier
+        # the random projection depends only on the input width, so it is fixed up front
+        self.feature_map = RBFSampler(gamma=gamma, n_components=n_components, random_state=random_state)
+        self.feature_map.fit(np.zeros((1, n_features)))
+        self.classifier = SGDClassifier(loss="log_loss", alpha=alpha, random_state=random_state)
+        self.classes_ = np.asarray(classes)
+        self.samples_seen = 0
+
+    def partial_fit(self, X, y):
+        self.classifier.partial_fit(self.feature_map.transform(X), y, classes=self.classes_)
+        self.samples_seen += len(X)
+        return self
+
+    def fit(self, X, y, batch_size=256, epochs=5, random_state=42):
+        """Stream ``X`` (an array or memmap) through ``partial_fit`` in shuffled mini-batches"""
+        rng = np.random.default_rng(random_state)
+        for _ in range(epochs):
+            order = rng.permutation(len(X))
+            for start in range(0, len(X), batch_size):
+                rows = np.sort(order[start:start + batch_size])
+                self.partial_fit(X[rows], y[rows])
+        return self
+
+    def predict_proba(self, X):
+        return self.classifier.predict_proba(self.feature_map.transform(X))
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def snapshot(self):
+        """Copy that can be trained further while this one keeps serving; shares the
+        read-only feature map"""
+        clone = copy.copy(self)
+        clone.classifier = copy.deepcopy(self.classifier)
+        return clone
+
+
+class FeedbackTrainer:
+    """Background trainer for clinician-confirmed labels.
+
+    ``submit`` stores the scan under ``feedback_dir``; a daemon thread trains a copy of the
+    live model on mini-batches, scores it on the holdout set and only swaps it in if
+    accuracy stays within ``max_accuracy_drop`` of the best seen (starting from the live
+    model's own holdout accuracy). Checkpoints are published through the model store, which
+    other workers follow.
+
+    Every worker process accepts feedback, but only one trains: the one holding an flock on
+    ``feedback_dir/.trainer.lock``. The others' threads wait on that lock and take over if
+    its holder dies. The elected trainer picks up scans that any worker wrote to
+    ``pending/`` (including ones left over from before a restart), moves them to
+    ``trained/`` once checkpointed and to ``rejected/`` when their batch was refused.
+    """
+
+    LOCK_NAME = ".trainer.lock"
+
+    def __init__(self, holder, store, feedback_dir, preprocessing, fingerprint, holdout=None,
+                 batch_size=32, flush_interval=30.0, checkpoint_interval=300.0, holdout_fraction=0.1,
+                 max_accuracy_drop=0.05, max_queue=10000, decode=None, poll_interval=5.0):
+        self.holder = holder
+        self.store = store
+        self.feedback_dir = feedback_dir
+        self.preprocessing = preprocessing
+        self.fingerprint = fingerprint
+        self.holdout = holdout  # (X, y), or a callable returning it once elected
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.holdout_fraction = holdout_fraction
+        self.max_accuracy_drop = max_accuracy_drop
+        self.max_queue = max_queue
+        self.decode = decode
+        self.poll_interval = poll_interval
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.history = deque(maxlen=100)
+        self.elected = False
+        self.best_accuracy = None
+        self._best_for = None  # model version best_accuracy was first measured on
+        self.batches = 0
+        self.rejected_batches = 0
+        self.last_checkpoint = None
+        self._trained_paths = []
+        self._seen = set()  # files already queued or in the holdout set
+        self._holdout_X = []
+        self._holdout_y = []
+        self._lock_handle = None
+        self._checkpointed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="feedback-trainer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _dir(self, split, label):
+        path = os.path.join(self.feedback_dir, split, str(label))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _elect(self):
+        """Block until this process holds the trainer lock (kept open for its lifetime)"""
+        os.makedirs(self.feedback_dir, exist_ok=True)
+        self._lock_handle = open(os.path.join(self.feedback_dir, self.LOCK_NAME), "a")
+        if fcntl is not None:
+            fcntl.flock(self._lock_handle, fcntl.LOCK_EX)
+        X_holdout, y_holdout = (self.holdout() if callable(self.holdout) else self.holdout) or (None, None)
+        with self._lock:
+            self._holdout_X.extend([] if X_holdout is None else X_holdout)
+            self._holdout_y.extend([] if y_holdout is None else y_holdout)
+            self.elected = True
+
+    def _scan(self):
+        """Queue pending scans written by any worker, and add new holdout scans"""
+        if self.decode is None:
+            return
+        for split in ("holdout", "pending"):
+            for label in (0, 1):
+                directory = self._dir(split, label)
+                for name in sorted(os.listdir(directory)):
+                    path = os.path.join(directory, name)
+                    with self._lock:
+                        if path in self._seen:
+                            continue
+                    if split == "pending" and self.queue.full():
+                        return
+                    try:
+                        with open(path, "rb") as f:
+                            features = self.decode(f.read())
+                    except FileNotFoundError:
+                        continue
+                    with self._lock:
+                        if path in self._seen:
+                            continue  # submitted locally meanwhile
+                        self._seen.add(path)
+                        if features is not None and split == "holdout":
+                            self._holdout_X.append(features)
+                            self._holdout_y.append(label)
+                    if features is None:
+                        self._move(path, "rejected")
+                    elif split == "pending":
+                        self.queue.put_nowait((path, features, label))
+
+    def _pending_count(self):
+        return sum(len(os.listdir(self._dir("pending", label))) for label in (0, 1))
+
+    def submit(self, data, extension, label, features):
+        """Persist one labeled scan for the trainer; raises queue.Full when training is backed up"""
+        digest = hashlib.sha256(data).hexdigest()
+        # deterministic split, so re-submitting a scan never moves it between sets
+        holdout = int(digest[:8], 16) / 0xFFFFFFFF < self.holdout_fraction
+        if not holdout and not self.elected and self._pending_count() >= self.max_queue:
+            raise queue.Full
+        path = os.path.join(self._dir("holdout" if holdout else "pending", label), digest + extension)
+        with open(path, "wb") as f:
+            f.write(data)
+        if self.elected:
+            # the trainer's own submissions skip the directory scan
+            with self._lock:
+                if path in self._seen:
+                    return {"holdout": holdout, "queue_depth": self.queue.qsize()}
+                self._seen.add(path)
+                if holdout:
+                    self._holdout_X.append(features)
+                    self._holdout_y.append(label)
+            if not holdout:
+                try:
+                    self.queue.put_nowait((path, features, label))
+                except queue.Full:
+                    with self._lock:
+                        self._seen.discard(path)
+                    os.remove(path)
+                    raise
+        return {"holdout": holdout, "queue_depth": self.queue.qsize() if self.elected else None}
+
+    def holdout_accuracy(self, model):
+        with self._lock:
+            if not self._holdout_y:
+                return None
+            X, y = np.asarray(self._holdout_X), np.asarray(self._holdout_y)
+        return float((model.predict(X) == y).mean())
+
+    def _next_batch(self):
+        """Up to ``batch_size`` samples, waiting at most ``flush_interval`` after the first;
+        empty when nothing arrived within ``poll_interval``"""
+        self._scan()
+        try:
+            batch = [self.queue.get(timeout=self.poll_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        self._elect()
+        print(f"Feedback trainer elected in process {os.getpid()}")
+        while True:
+            try:
+                batch = self._next_batch()
+                if batch:
+                    self.train_batch(batch)
+                if time.monotonic() - self._checkpointed_at >= self.checkpoint_interval:
+                    self.checkpoint()
+            except Exception as e:
+                print(f"Incremental training error: {e}")
+                time.sleep(self.poll_interval)
+
+    def _move(self, path, split):
+        label = os.path.basename(os.path.dirname(path))
+        try:
+            shutil.move(path, os.path.join(self._dir(split, label), os.path.basename(path)))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._seen.discard(path)
+
+    def train_batch(self, batch):
+        model, meta = self.holder.get()
+        if not hasattr(model, "partial_fit"):
+            print("Live model does not support partial_fit; dropping feedback batch.")
+            return
+
+        if self.best_accuracy is None or meta.get("version") != self._best_for:
+            # the bar for a new model (or the first batch) is what it scores before any update
+            self.best_accuracy = self.holdout_accuracy(model)
+            self._best_for = meta.get("version")
+
+        paths, features, labels = zip(*batch)
+        candidate = model.snapshot()
+        candidate.partial_fit(np.asarray(features), np.asarray(labels))
+        accuracy = self.holdout_accuracy(candidate)
+
+        accepted = accuracy is None or self.best_accuracy is None or accuracy >= self.best_accuracy - self.max_accuracy_drop
+        with self._lock:
+            self.batches += 1
+            self.history.append({"at": time.time(), "samples": len(batch), "accuracy": accuracy, "accepted": accepted})
+            if accepted:
+                if accuracy is not None:
+                    self.best_accuracy = max(accuracy, self.best_accuracy or 0.0)
+                self._trained_paths.extend(paths)
+            else:
+                self.rejected_batches += 1
+        if not accepted:
+            for path in paths:
+                self._move(path, "rejected")
+            return
+
+        # same version string until the next checkpoint, so hot-reload doesn't undo the update
+        meta = {**meta, "samples_seen": candidate.samples_seen, "holdout_accuracy": accuracy,
+                "updates_since_checkpoint": meta.get("updates_since_checkpoint", 0) + 1}
+        self.holder.swap(candidate, meta)
+
+    def checkpoint(self):
+        model, meta = self.holder.get()
+        with self._lock:
+            trained, self._trained_paths = self._trained_paths, []
+        self._checkpointed_at = time.monotonic()
+        if not trained:
+            return None
+        if not meta.get("updates_since_checkpoint"):
+            # the live model was replaced (e.g. /model/reload) since these scans were
+            # trained in: leave them in pending/ so the next scan replays them on it
+            with self._lock:
+                self._seen.difference_update(trained)
+            return None
+
+        metrics = {**meta.get("metrics", {}), "samples_seen": model.samples_seen,
+                   "holdout_accuracy": meta.get("holdout_accuracy")}
+        version = self.store.save(model, self.preprocessing, metrics, self.fingerprint())
+        self.holder.swap(model, self.store.read_meta(version))
+        self._best_for = version  # same model, so best_accuracy still applies
+        for path in trained:
+            self._move(path, "trained")
+        self.last_checkpoint = {"version": version, "at": time.time(), "samples": len(trained)}
+        return version
+
+    def stats(self):
+        model, meta = self.holder.get()
+        with self._lock:
+            return {
+                "trainer": self.elected,
+                "queue_depth": self.queue.qsize(),
+                "samples_seen": getattr(model, "samples_seen", None),
+                "holdout_size": len(self._holdout_y),
+                "best_accuracy": self.best_accuracy,
+                "batches": self.batches,
+                "rejected_batches": self.rejected_batches,
+                "recent": list(self.history)[-10:],
+                "last_checkpoint": self.last_checkpoint,
+                "model_version": meta.get("version"),
+            }
@@ -1,3 +1,7 @@
+ // API base: same origin when CureBot serves this page; a page opened from disk talks to
+ // the local dev server. window.CUREBOT_API overrides both (e.g. a separate API host).
+ const API_BASE = window.CUREBOT_API ?? (location.protocol === "file:" ? "http://localhost:5009" : "");
+
  // DOM Elements
  const chatBox = document.getElementById("chat-box");
  const welcomeMessage = document.getElementById("welcome-message");
@@ -63,32 +67,41 @@
    showLoading(true);
 
    try {
-     const response = await fetch("http://localhost:5009/ask", {
-       method: "POST",
-       headers: { "Content-Type": "application/json" },
-       body: JSON.stringify({ query })
+     let responseText = '';
+     let followups = [];
+     let messageText = null;
+
+     await streamEvents(`${API_BASE}/ask/stream`, { query }, (event, data) => {
+       if (event === 'token') {
+         if (!messageText) {
+           showLoading(false);
+           messageText = addMessageToChat('assistant', '', 'bot-message').querySelector('.message-text');
+         }
+         responseText += data.text;
+         messageText.textContent = responseText;
+         chatBox.scrollTop = chatBox.scrollHeight;
+       } else if (event === 'done') {
+         followups = data.followups || [];
+       } else if (event === 'error') {
+         throw new Error(data.error);
+       }
      });
-
-     const data = await response.json();
      
      // Store in chat history
      const chatItem = { 
        type: 'text',
        query, 
-       response: data.response,
+       response: responseText,
        timestamp: new Date().toISOString()
      };
      chatHistory.push(chatItem);
      saveChatHistory();
-     
-     // Add bot response
-     addMessageToChat('assistant', data.response, 'bot-message');
 
      // Handle follow-up questions if any
-     if (data.followups && data.followups.length > 0) {
+     if (followups.length > 0) {
        setTimeout(() => {
          addMessageToChat('assistant', "To better understand your condition, please answer these follow-up questions:", 'bot-message');
-         showFollowupQuestions(data.followups);
+         showFollowupQuestions(followups);
        }, 500);
      }
    } catch (error) {
@@ -99,6 +112,44 @@
    }
  }
 
+ // POST a JSON body and dispatch each Server-Sent Event as it arrives
+ async function streamEvents(url, body, onEvent) {
+   const response = await fetch(url, {
+     method: "POST",
+     headers: { "Content-Type": "application/json" },
+     body: JSON.stringify(body)
+   });
+
+   if (!response.ok || !response.body) {
+     const data = await response.json().catch(() => ({}));
+     throw new Error(data.error || `Request failed with status ${response.status}`);
+   }
+
+   const reader = response.body.getReader();
+   const decoder = new TextDecoder();
+   let buffer = '';
+
+   while (true) {
+     const { value, done } = await reader.read();
+     if (done) break;
+     buffer += decoder.decode(value, { stream: true });
+
+     let boundary;
+     while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+       const block = buffer.slice(0, boundary);
+       buffer = buffer.slice(boundary + 2);
+
+       let event = 'message';
+       let data = '';
+       block.split('\n').forEach(line => {
+         if (line.startsWith('event:')) event = line.slice(6).trim();
+         else if (line.startsWith('data:')) data += line.slice(5).trim();
+       });
+       if (data) onEvent(event, JSON.parse(data));
+     }
+   }
+ }
+
  // Add a message to the chat UI
  function addMessageToChat(sender, content, className) {
    const messageDiv = document.createElement("div");
@@ -117,13 +168,14 @@
    } else {
      messageDiv.innerHTML = `
        <strong>${sender === 'assistant' ? 'CureBot' : 'You'}:</strong> 
-       ${content}
+       <span class="message-text">${content}</span>
        <span class="message-time">${time}</span>
      `;
    }
    
    chatBox.appendChild(messageDiv);
    chatBox.scrollTop = chatBox.scrollHeight;
+   return messageDiv;
  }
 
  // Show loading indicator
@@ -178,44 +230,45 @@
    }
 
    try {
-     const response = await fetch('http://localhost:5009/upload', {
+     const response = await fetch(`${API_BASE}/upload`, {
        method: 'POST',
        body: formData
      });
 
-     const data = await response.json();
+     const queued = await response.json();
+     if (!response.ok) {
+       throw new Error(queued.error || 'Failed to analyze image');
+     }
+
+     // The analysis runs in the background; poll until it finishes
+     const data = await pollImageAnalysis(queued.status_url);
+     currentSessionId = data.session_id;
      
-     if (response.ok) {
-       currentSessionId = data.session_id;
-       
-       // Add to chat history
-       const chatItem = {
-         type: 'image',
-         query: customPrompt || 'Medical image analysis',
-         response: data.result,
-         imageUrl: URL.createObjectURL(file),
-         timestamp: new Date().toISOString(),
-         sessionId: data.session_id
-       };
-       chatHistory.push(chatItem);
-       saveChatHistory();
-       
-       // Display in chat
-       addMessageToChat('user', 'Uploaded medical image', 'user-message');
-       if (customPrompt) {
-         addMessageToChat('user', `Analysis request: ${customPrompt}`, 'user-message');
-       }
-       
-       addMessageToChat('assistant', data.result, 'bot-message');
-       
-       // Show download button
-       showDownloadButton(data.pdf_download);
-       
-       // Reset upload UI
-       cancelImageUpload();
-     } else {
-       throw new Error(data.error || 'Failed to analyze image');
+     // Add to chat history
+     const chatItem = {
+       type: 'image',
+       query: customPrompt || 'Medical image analysis',
+       response: data.result,
+       imageUrl: URL.createObjectURL(file),
+       timestamp: new Date().toISOString(),
+       sessionId: data.session_id
+     };
+     chatHistory.push(chatItem);
+     saveChatHistory();
+     
+     // Display in chat
+     addMessageToChat('user', 'Uploaded medical image', 'user-message');
+     if (customPrompt) {
+       addMessageToChat('user', `Analysis request: ${customPrompt}`, 'user-message');
      }
+     
+     addMessageToChat('assistant', data.result, 'bot-message');
+     
+     // Show download button
+     showDownloadButton(data.pdf_download);
+     
+     // Reset upload UI
+     cancelImageUpload();
    } catch (error) {
      console.error("Error:", error);
      addMessageToChat('assistant', `Error: ${error.message}`, 'bot-message');
@@ -224,6 +277,23 @@
    }
  }
 
+ // Poll an image analysis job until it is done or failed
+ async function pollImageAnalysis(statusUrl, intervalMs = 2000, timeoutMs = 10 * 60 * 1000) {
+   const deadline = Date.now() + timeoutMs;
+   while (Date.now() < deadline) {
+     const response = await fetch(`${API_BASE}${statusUrl}`);
+     const data = await response.json();
+     if (!response.ok) {
+       throw new Error(data.error || 'Failed to check analysis status');
+     }
+     if (data.status === 'done' || data.status === 'failed') {
+       return data;
+     }
+     await new Promise(resolve => setTimeout(resolve, intervalMs));
+   }
+   throw new Error('Image analysis timed out');
+ }
+
  // Show follow-up questions
  function showFollowupQuestions(questions) {
    followupQuestions = questions;
@@ -314,35 +384,45 @@
    try {
      const lastQuery = chatHistory[chatHistory.length - 1]?.query || '';
      
-     const response = await fetch("http://localhost:5009/answer", {
-       method: "POST",
-       headers: { "Content-Type": "application/json" },
-       body: JSON.stringify({
-         query: lastQuery,
-         followups,
-         responses
-       })
-     });
+     let finalSolution = '';
+     let result = {};
+     let messageText = null;
 
-     const data = await response.json();
-     currentSessionId = data.session_id;
-     
      // Remove follow-up UI
      const container = document.querySelector('.followup-container');
      if (container) container.remove();
-     
-     // Add final solution to chat
-     addMessageToChat('assistant', data.final_solution, 'bot-message');
+
+     await streamEvents(`${API_BASE}/answer/stream`, {
+       query: lastQuery,
+       followups,
+       responses
+     }, (event, data) => {
+       if (event === 'token') {
+         if (!messageText) {
+           showLoading(false);
+           messageText = addMessageToChat('assistant', '', 'bot-message').querySelector('.message-text');
+         }
+         finalSolution += data.text;
+         messageText.textContent = finalSolution;
+         chatBox.scrollTop = chatBox.scrollHeight;
+       } else if (event === 'done') {
+         result = data;
+       } else if (event === 'error') {
+         throw new Error(data.error);
+       }
+     });
+
+     currentSessionId = result.session_id;
      
      // Update chat history
      if (chatHistory.length > 0) {
-       chatHistory[chatHistory.length - 1].finalSolution = data.final_solution;
-       chatHistory[chatHistory.length - 1].sessionId = data.session_id;
+       chatHistory[chatHistory.length - 1].finalSolution = finalSolution;
+       chatHistory[chatHistory.length - 1].sessionId = result.session_id;
        saveChatHistory();
      }
      
      // Show download button
-     showDownloadButton(data.pdf_download);
+     showDownloadButton(result.pdf_download);
    } catch (error) {
      console.error("Error:", error);
      addMessageToChat('assistant', "Sorry, there was an error processing your answers.", 'bot-message');
@@ -356,7 +436,7 @@
    if (pdfUrl) {
      downloadBtn.onclick = () => window.open(pdfUrl, '_blank');
    } else if (currentSessionId) {
-     downloadBtn.onclick = () => window.open(`http://localhost:5009/download/pdf/${currentSessionId}`, '_blank');
+     downloadBtn.onclick = () => window.open(`${API_BASE}/download/pdf/${currentSessionId}`, '_blank');
    } else {
      downloadBtn.onclick = downloadTextReport;
    }
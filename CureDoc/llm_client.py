@@ -0,0 +1,204 @@
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import record_upstream
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when the chat-completions upstream cannot produce an answer"""
+
+
+class CircuitOpenError(LLMError):
+    """Raised without touching the network while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures and lets one trial call through after ``cooldown`` seconds"""
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def cancel_trial(self):
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class LLMClient:
+    """Shared OpenRouter client: pooled keep-alive session, timeouts, jittered retries,
+    a circuit breaker and a cap on in-flight upstream calls"""
+
+    def __init__(self, url, api_key, connect_timeout=5.0, read_timeout=60.0, max_retries=2,
+                 backoff=0.5, max_backoff=8.0, max_concurrency=8, acquire_timeout=30.0,
+                 breaker_threshold=5, breaker_cooldown=30.0, pool_size=16, max_retry_after=30.0):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.acquire_timeout = acquire_timeout
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, max_concurrency), max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+
+    def _retry_delay(self, attempt, response=None):
+        """Seconds to wait before the next attempt, or None when the upstream asks for a
+        longer pause (Retry-After) than ``max_retry_after`` and retrying now would be rude"""
+        # full jitter keeps many workers from retrying in lockstep
+        delay = random.uniform(0, min(self.backoff * (2 ** attempt), self.max_backoff))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            if float(retry_after) > self.max_retry_after:
+                return None
+            delay = max(delay, float(retry_after))  # never sooner than the upstream asked
+        return delay
+
+    @contextmanager
+    def _slot(self):
+        """Fail fast on an open circuit, then hold one of the concurrency slots"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("LLM upstream circuit is open")
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            self.breaker.cancel_trial()
+            raise LLMError("Too many concurrent LLM requests")
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def _send(self, payload, stream=False):
+        body = json.dumps(payload).encode("utf-8")
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                record_upstream("openrouter", sent=len(body))
+                response = self.session.post(self.url, data=body, timeout=self.timeout, stream=stream)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    self.breaker.record_success()
+                    return response
+                last_error = LLMError(f"Upstream returned HTTP {response.status_code}")
+                response.close()
+            except requests.HTTPError as e:
+                # 4xx other than 429 will not get better on retry
+                self.breaker.record_success()
+                raise LLMError(str(e)) from e
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = LLMError(f"Upstream unreachable: {e}")
+            except requests.RequestException as e:
+                # ChunkedEncodingError, TooManyRedirects, ...: still a failed call, so it has
+                # to reach record_failure below or a half-open trial would never be released
+                last_error = LLMError(f"Upstream request failed: {e}")
+            if attempt == self.max_retries:
+                break
+            delay = self._retry_delay(attempt, response)
+            if delay is None:
+                break
+            time.sleep(delay)
+        self.breaker.record_failure()
+        raise last_error
+
+    def post(self, payload):
+        """POST a chat-completions payload and return the successful ``requests.Response``"""
+        with self._slot():
+            return self._send(payload)
+
+    def chat(self, model, prompt):
+        """Send a single user message and return the assistant's text"""
+        response = self.post({"model": model, "messages": [{"role": "user", "content": prompt}]})
+        try:
+            completion = response.json()
+            usage = completion.get("usage") or {}
+            record_upstream("openrouter", received=len(response.content), prompt_tokens=usage.get("prompt_tokens"),
+                            completion_tokens=usage.get("completion_tokens"))
+            return completion["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError) as e:
+            raise LLMError(f"Malformed completion payload: {e}") from e
+
+    def stream_chat(self, model, prompt):
+        """Yield the assistant's text deltas as the upstream streams them.
+
+        Retries only happen before the first byte; the concurrency slot is held until
+        the stream is exhausted or the generator is closed.
+        """
+        payload = {"model": model, "messages": [{"role": "user", "content": prompt}], "stream": True}
+        with self._slot():
+            response = self._send(payload, stream=True)
+            with response:
+                response.encoding = response.encoding or "utf-8"
+                received, usage = 0, {}
+                try:
+                    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                        received += len(line) + 1
+                        if not line or not line.startswith("data:"):
+                            continue  # blank separators and ": keep-alive" comments
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        chunk = json.loads(data)
+                        usage = chunk.get("usage") or usage  # sent with the last chunk, when at all
+                        if not chunk.get("choices"):
+                            continue
+                        delta = chunk["choices"][0].get("delta", {}).get("content")
+                        if delta:
+                            yield delta
+                except (requests.RequestException, ValueError, KeyError, IndexError) as e:
+                    self.breaker.record_failure()
+                    raise LLMError(f"Stream interrupted: {e}") from e
+                finally:
+                    record_upstream("openrouter", received=received, prompt_tokens=usage.get("prompt_tokens"),
+                                    completion_tokens=usage.get("completion_tokens"))
@@ -0,0 +1,304 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+from flask import Response, g, request
+
+# Seconds; spans from a cache lookup (~ms) up to a cold LLaVA analysis (minutes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic total per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label combination"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values = {}  # labels -> [per-bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    out.append((f"{self.name}_bucket", key, (("le", _number(bound)),), cumulative))
+                out.append((f"{self.name}_sum", key, (), total))
+                out.append((f"{self.name}_count", key, (), count))
+        return out
+
+
+class Registry:
+    """Metrics of one process, rendered in the Prometheus text exposition format.
+
+    Besides its own counters and histograms it polls ``collectors`` at scrape time: each is
+    a callable returning ``(name, help, labelnames, {label values: value})`` gauges, which is how the
+    existing ``stats()`` dicts of caches and queues are exported without double bookkeeping.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collect):
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, extra, value in metric.samples():
+                lines.append(f"{name}{_labels(metric.labelnames, key, extra)} {_number(value)}")
+        for collect in collectors:
+            try:
+                gauges = collect()
+            except Exception as e:
+                print(f"Error in metrics collector: {e}")
+                continue
+            for name, help, labelnames, values in gauges:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in values.items():
+                    lines.append(f"{name}{_labels(labelnames, key)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram("stage_duration_seconds", "Time spent in an instrumented stage", ("stage",))
+STAGE_ERRORS = REGISTRY.counter("stage_errors_total", "Failures inside an instrumented stage", ("stage",))
+UPSTREAM_BYTES = REGISTRY.counter("upstream_bytes_total", "Bytes exchanged with model upstreams", ("upstream", "direction"))
+UPSTREAM_TOKENS = REGISTRY.counter("upstream_tokens_total", "Tokens reported by model upstreams", ("upstream", "kind"))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time to produce a response (to the first byte for streams)",
+    ("app", "endpoint", "method", "status"))
+
+
+@contextmanager
+def span(stage):
+    """Time a block into ``stage_duration_seconds``; an exception also counts as a stage error"""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+def timed(stage=None):
+    """Decorator form of ``span``, named after the function unless ``stage`` is given"""
+    def decorate(fn):
+        name = stage or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def report_error(stage, e):
+    """For helpers that swallow their exceptions: log as before and count the failure"""
+    print(f"Error in {stage}: {e}")
+    STAGE_ERRORS.inc(stage=stage)
+
+
+def record_upstream(upstream, sent=0, received=0, prompt_tokens=None, completion_tokens=None):
+    if sent:
+        UPSTREAM_BYTES.inc(sent, upstream=upstream, direction="sent")
+    if received:
+        UPSTREAM_BYTES.inc(received, upstream=upstream, direction="received")
+    if prompt_tokens:
+        UPSTREAM_TOKENS.inc(prompt_tokens, upstream=upstream, kind="prompt")
+    if completion_tokens:
+        UPSTREAM_TOKENS.inc(completion_tokens, upstream=upstream, kind="completion")
+
+
+def _metric_name(text):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", text).lower()
+
+
+def stats_collector(prefix, sources):
+    """Collector exporting every numeric leaf of ``{name: stats_fn}`` as ``<prefix>_<name>_<key>``
+    (nested dicts join their keys), e.g. ``curebot_triage_cache_hit_rate``"""
+    def flatten(stats, path):
+        for key, value in stats.items():
+            if isinstance(value, dict):
+                yield from flatten(value, path + (key,))
+            elif isinstance(value, (int, float)):  # bools included, as 0/1
+                yield path + (key,), int(value) if isinstance(value, bool) else value
+
+    def collect():
+        gauges = []
+        for name, stats_fn in sources.items():
+            stats = stats_fn()
+            if not stats:
+                continue
+            for path, value in flatten(stats, (prefix, name)):
+                gauges.append((_metric_name("_".join(path)), f"{name} stats: {'.'.join(path[2:])}", (), {(): value}))
+        return gauges
+    return collect
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack every ``interval`` seconds from a side thread.
+
+    Costs one ``sys._current_frames()`` walk per sample and nothing in the profiled thread;
+    the result is in collapsed-stack form (``a;b;c count``) for flamegraph.pl or speedscope.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = _Tally()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def instrument(app, name, registry=REGISTRY, authorize=None, profile_dir=None, profile_interval=0.005):
+    """Add request timing and ``GET /metrics`` to a Flask app.
+
+    With ``profile_dir`` set, a request carrying ``X-Profile: 1`` (and passing ``authorize``,
+    if given) is sampled while it runs; the collapsed stacks are written to ``profile_dir``
+    and the file name is returned in the ``X-Profile-File`` response header.
+    """
+    profile_dir = Path(profile_dir) if profile_dir else None
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        if profile_dir and request.headers.get("X-Profile") == "1" and (authorize is None or authorize()):
+            g.profiler = SamplingProfiler(threading.get_ident(), profile_interval).start()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule else "unmatched"  # bounded label values
+            REQUEST_SECONDS.observe(time.perf_counter() - started, app=name, endpoint=endpoint,
+                                    method=request.method, status=response.status_code)
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.stop()
+            profile_dir.mkdir(parents=True, exist_ok=True)
+            filename = f"{name}_{time.strftime('%Y%m%d-%H%M%S')}_{(request.endpoint or 'unmatched')}_{time.time_ns() % 10**6}.folded"
+            (profile_dir / filename).write_text(profiler.collapsed(), encoding="utf-8")
+            response.headers["X-Profile-File"] = filename
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+    return app
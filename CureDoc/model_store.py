@@ -0,0 +1,147 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+
+
+class ArtifactMismatch(Exception):
+    """Raised when a model artifact was not trained on the dataset the server sees"""
+
+
+class ModelStore:
+    """Versioned NeuroScan model artifacts on disk.
+
+    Each version is a directory holding ``model.joblib`` and ``meta.json`` (preprocessing
+    parameters, metrics, dataset fingerprint). ``CURRENT`` names the version servers load.
+    """
+
+    POINTER = "CURRENT"
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def pointer(self):
+        return self.directory / self.POINTER
+
+    def versions(self):
+        return sorted(p.name for p in self.directory.iterdir() if (p / "meta.json").exists())
+
+    def _version_dir(self, version):
+        """Directory of a known version; anything else (typos, "../x") is rejected before
+        it gets near a path join"""
+        if version not in self.versions():
+            raise FileNotFoundError(f"No model artifact '{version}' in {self.directory}")
+        return self.directory / version
+
+    def current_version(self):
+        try:
+            return self.pointer.read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def save(self, model, preprocessing, metrics, dataset_fingerprint, activate=True):
+        """Write a new version atomically and (by default) point CURRENT at it"""
+        created = datetime.now(timezone.utc)
+        # the random tail keeps two saves within the same second (e.g. two trainers) apart
+        version = f"{created.strftime('%Y%m%d-%H%M%S')}-{(dataset_fingerprint or 'nodata')[:8]}-{uuid.uuid4().hex[:6]}"
+        meta = {
+            "version": version,
+            "created_at": created.isoformat(),
+            "model_class": type(model).__name__,
+            "preprocessing": preprocessing,
+            "metrics": metrics,
+            "dataset_fingerprint": dataset_fingerprint,
+        }
+
+        staging = Path(tempfile.mkdtemp(dir=self.directory, prefix=".staging-"))
+        try:
+            # uncompressed so the arrays can be memory-mapped on load
+            joblib.dump(model, staging / "model.joblib")
+            (staging / "meta.json").write_text(json.dumps(meta, indent=2))
+            os.rename(staging, self.directory / version)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        self._version_dir(version)
+        tmp = self.directory / f".{self.POINTER}.tmp"
+        tmp.write_text(version)
+        os.replace(tmp, self.pointer)
+
+    def read_meta(self, version):
+        return json.loads((self._version_dir(version) / "meta.json").read_text())
+
+    def load(self, version=None, mmap=True):
+        """Return ``(model, meta)`` for ``version`` or the CURRENT one"""
+        version = version or self.current_version()
+        if version is None:
+            raise FileNotFoundError(f"No current model artifact in {self.directory}")
+        path = self._version_dir(version)
+        meta = self.read_meta(version)
+        # copy-on-write: pages stay shared between workers, yet libsvm gets the writable buffers it insists on
+        model = joblib.load(path / "model.joblib", mmap_mode="c" if mmap else None)
+        return model, meta
+
+
+class ModelHolder:
+    """The model a server is answering with, swappable at runtime without a restart.
+
+    ``maybe_reload`` is cheap enough to call on every request: at most once per
+    ``check_interval`` seconds it compares the store's CURRENT pointer with the loaded
+    version, so every worker process follows a newly activated artifact.
+    """
+
+    def __init__(self, store, check_interval=30.0, validate=None):
+        self.store = store
+        self.check_interval = check_interval
+        self.validate = validate
+        self.model = None
+        self.meta = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self.meta.get("version")
+
+    def get(self):
+        with self._lock:
+            return self.model, self.meta
+
+    def swap(self, model, meta):
+        with self._lock:
+            self.model, self.meta = model, meta
+        print(f"NeuroScan model version {meta.get('version')} is live")
+
+    def load(self, version=None, force=False):
+        model, meta = self.store.load(version)
+        if self.validate and not force:
+            self.validate(meta)
+        self.swap(model, meta)
+        return meta
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        current = self.store.current_version()
+        if current and current != self.version:
+            try:
+                self.load(current)
+            except Exception as e:
+                print(f"Could not hot-swap to model {current}: {e}")
@@ -0,0 +1,257 @@
+import hashlib
+import os
+import time
+import numpy as np
+import cv2
+# scikit-learn (~1 s to import) is imported inside the training helpers: serving only
+# needs it once a pickled model is loaded, so a server can answer health checks before that
+from feature_cache import FeatureCache
+from incremental import IncrementalModel
+from metrics import span
+
+DATASET_PATH = 'dataset'
+CLASS_NAMES = ['no_tumor', 'tumor']
+IMAGE_SIZE = (64, 64)
+FEATURE_CACHE_DIR = os.environ.get("NEUROSCAN_FEATURE_CACHE", "feature_cache")
+
+LABEL_NAMES = {0: "No Tumor", 1: "Tumor"}
+
+# Classifier modes: the exact RBF SVC, or a PCA projection followed by a calibrated linear
+# SVM (optionally on Nystroem / random Fourier features approximating the RBF kernel).
+# "sgd-rff" is random Fourier features + SGD logistic regression, updatable with partial_fit.
+CLASSIFIER_MODES = ("svc", "pca-linear", "pca-nystroem", "pca-rff", "sgd-rff")
+MODEL_MODE = os.environ.get("NEUROSCAN_MODEL_MODE", "svc")
+PCA_COMPONENTS = int(os.environ.get("NEUROSCAN_PCA_COMPONENTS", 128))
+KERNEL_COMPONENTS = int(os.environ.get("NEUROSCAN_KERNEL_COMPONENTS", 1024))
+IPCA_THRESHOLD = int(os.environ.get("NEUROSCAN_IPCA_THRESHOLD", 20000))
+
+# Everything a caller needs to turn an image into the model's input vector
+PREPROCESSING = {
+    "grayscale": True,
+    "size": list(IMAGE_SIZE),
+    "scale": 1 / 255.0,
+    "dtype": "float64",
+}
+
+def dataset_files(dataset_path=DATASET_PATH):
+    """Sorted (class_name, path) pairs for every file in the class directories"""
+    files = []
+    for class_name in CLASS_NAMES:
+        class_path = os.path.join(dataset_path, class_name)
+        if not os.path.exists(class_path):
+            continue
+        for img_file in sorted(os.listdir(class_path)):
+            files.append((class_name, os.path.join(class_path, img_file)))
+    return files
+
+def dataset_fingerprint(dataset_path=DATASET_PATH, cache_dir=FEATURE_CACHE_DIR):
+    """Identity of the training set: relative path and SHA-256 of every file. Content-based,
+    so a fresh checkout or copy of the same dataset matches; the feature cache's hashes are
+    reused for files whose size/mtime it has already seen."""
+    if not os.path.exists(dataset_path):
+        return None
+    files = dataset_entries(dataset_path)
+    hashes = FeatureCache(cache_dir, IMAGE_SIZE).hashes(files)
+    digest = hashlib.sha256()
+    for key, _, _ in files:
+        digest.update(f"{key}:{hashes[key]}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def dataset_entries(dataset_path=DATASET_PATH):
+    """``(key, label, path)`` for every readable file, as the feature cache takes them"""
+    return [(f"{class_name}/{os.path.basename(path)}", 0 if class_name == 'no_tumor' else 1, path)
+            for class_name, path in dataset_files(dataset_path) if os.path.isfile(path)]
+
+def load_dataset(dataset_path=DATASET_PATH, cache_dir=FEATURE_CACHE_DIR, workers=None):
+    """Load and preprocess dataset with better error handling.
+
+    Features come from an incremental uint8 cache (see feature_cache.py), so only new or
+    changed images are decoded. They are scaled to float64 once, after the split, straight
+    into the arrays the SVM consumes.
+    """
+    # Check if dataset directory exists
+    if not os.path.exists(dataset_path):
+        print(f"Dataset directory '{dataset_path}' not found!")
+        return None, None, None, None
+
+    # Check for tumor and no_tumor subdirectories
+    for class_name in CLASS_NAMES:
+        class_path = os.path.join(dataset_path, class_name)
+        if not os.path.exists(class_path):
+            print(f"Class directory '{class_path}' not found!")
+
+    files = dataset_entries(dataset_path)
+    cache = FeatureCache(cache_dir, IMAGE_SIZE)
+    X, y, stats = cache.update(files, workers=workers)
+    print(f"Feature cache: {stats}")
+
+    if len(X) == 0:
+        print("No valid images found in dataset!")
+        return None, None, None, None
+
+    y = np.asarray(y, dtype=np.int64)
+
+    # Ensure we have enough samples for splitting
+    if len(X) < 5:  # Minimum 5 samples needed
+        print(f"Not enough samples ({len(X)}). Using all for training.")
+        return scale_features(X), None, y, None
+
+    # Split into train/test
+    from sklearn.model_selection import train_test_split
+    train_idx, test_idx = train_test_split(np.arange(len(X)), test_size=0.2, random_state=42)
+    train_idx, test_idx = np.sort(train_idx), np.sort(test_idx)  # sequential reads from the memmap
+    return scale_features(X, train_idx), scale_features(X, test_idx), y[train_idx], y[test_idx]
+
+def scale_features(X, rows=None):
+    """uint8 pixels -> float64 in [0, 1], written into one preallocated array"""
+    n = len(X) if rows is None else len(rows)
+    out = np.empty((n, X.shape[1]), dtype=np.float64)
+    for start in range(0, n, 1024):
+        block = X[start:start + 1024] if rows is None else X[rows[start:start + 1024]]
+        np.divide(block, 255.0, out=out[start:start + len(block)])
+    return out
+
+def train_model(X_train, y_train, mode=None, n_components=None):
+    """Train the classifier for ``mode`` (see CLASSIFIER_MODES); "svc" is the exact RBF SVM"""
+    mode = effective_mode(mode, y_train)
+    if mode == "sgd-rff":
+        # streamed through partial_fit, so X_train may be a memmap larger than RAM
+        return IncrementalModel(X_train.shape[1], rbf_gamma(X_train), KERNEL_COMPONENTS).fit(X_train, y_train)
+    if mode == "svc":
+        from sklearn import svm
+        model = svm.SVC(
+            kernel='rbf',
+            C=10,  # Higher regularization
+            gamma='scale',
+            probability=True,
+            random_state=42
+        )
+    else:
+        min_class = int(np.bincount(y_train).min())
+        model = approximate_pipeline(mode, X_train, n_components or PCA_COMPONENTS, min_class)
+    model.fit(X_train, y_train)
+    return model
+
+def effective_mode(mode, y_train):
+    """The requested mode, or "svc" when there is too little data to calibrate an approximate one"""
+    mode = mode or MODEL_MODE
+    if mode not in CLASSIFIER_MODES:
+        raise ValueError(f"Unknown classifier mode '{mode}', expected one of {CLASSIFIER_MODES}")
+    counts = np.bincount(y_train)
+    if mode not in ("svc", "sgd-rff") and (len(counts) < 2 or counts.min() < 2):
+        print(f"Mode '{mode}' needs 2+ samples per class to calibrate; training the exact SVC instead.")
+        return "svc"
+    return mode
+
+def approximate_pipeline(mode, X_train, n_components, min_class):
+    """PCA projection + linear SVM (optionally on an RBF feature map), sigmoid-calibrated"""
+    from sklearn.calibration import CalibratedClassifierCV
+    from sklearn.decomposition import PCA, IncrementalPCA
+    from sklearn.kernel_approximation import Nystroem, RBFSampler
+    from sklearn.pipeline import Pipeline
+    from sklearn.svm import LinearSVC
+    n_samples, n_features = X_train.shape
+    n_components = max(1, min(n_components, n_samples - 1, n_features))
+    # The linear SVM wants whitened components; the kernel maps want distances preserved
+    whiten = mode == "pca-linear"
+    if n_samples > IPCA_THRESHOLD:
+        # fits in batches, so the projection never needs the full covariance in memory
+        projection = IncrementalPCA(n_components=n_components, whiten=whiten, batch_size=max(n_components, 2048))
+    else:
+        projection = PCA(n_components=n_components, whiten=whiten, svd_solver="randomized", random_state=42)
+
+    steps = [("pca", projection)]
+    gamma = rbf_gamma(X_train)
+    if mode == "pca-nystroem":
+        steps.append(("kernel", Nystroem(kernel="rbf", gamma=gamma, n_components=min(KERNEL_COMPONENTS, n_samples), random_state=42)))
+    elif mode == "pca-rff":
+        steps.append(("kernel", RBFSampler(gamma=gamma, n_components=KERNEL_COMPONENTS, random_state=42)))
+
+    linear = LinearSVC(C=1.0, dual="auto", max_iter=5000, random_state=42)
+    steps.append(("svm", CalibratedClassifierCV(linear, method="sigmoid", cv=min(3, min_class), ensemble=False)))
+    return Pipeline(steps)
+
+def rbf_gamma(X, sample_size=2048, seed=42):
+    """Same as the exact SVC's gamma='scale', estimated on a random row sample to avoid a
+    full-size temporary (training rows arrive grouped by class, so a prefix would not do)"""
+    rows = np.sort(np.random.default_rng(seed).choice(len(X), size=min(len(X), sample_size), replace=False))
+    return 1.0 / (X.shape[1] * X[rows].var())
+
+def holdout_split(cache_dir=FEATURE_CACHE_DIR):
+    """The test rows ``load_dataset`` would hold out, read from the feature cache without decoding"""
+    X, y = FeatureCache(cache_dir, IMAGE_SIZE).load()
+    if X is None or len(X) < 5:
+        return None, None
+    from sklearn.model_selection import train_test_split
+    _, test_idx = train_test_split(np.arange(len(X)), test_size=0.2, random_state=42)
+    test_idx = np.sort(test_idx)
+    return scale_features(X, test_idx), np.asarray(y[test_idx], dtype=np.int64)
+
+def train_and_evaluate(dataset_path=DATASET_PATH, mode=None):
+    """Load the dataset, fit the model and score it; returns (model, metrics)"""
+    from sklearn.metrics import accuracy_score
+    X_train, X_test, y_train, y_test = load_dataset(dataset_path)
+
+    mock = X_train is None
+    if mock:
+        print("Failed to load dataset. Using mock data...")
+        # Create mock data
+        X_train = np.random.rand(10, 4096)  # 64x64 = 4096 features
+        y_train = np.random.randint(0, 2, 10)
+        X_test = np.random.rand(3, 4096)
+        y_test = np.random.randint(0, 2, 3)
+
+    mode = effective_mode(mode, y_train)
+    started = time.perf_counter()
+    model = train_model(X_train, y_train, mode)
+    train_seconds = time.perf_counter() - started
+
+    metrics = {
+        "mode": mode,
+        "train_samples": len(X_train),
+        "test_samples": len(X_test) if X_test is not None else 0,
+        "train_seconds": round(train_seconds, 3),
+        "mock_data": mock,
+    }
+
+    # Evaluate model
+    if X_test is not None:
+        metrics["test_accuracy"] = float(accuracy_score(y_test, model.predict(X_test)))
+        print(f"Test Accuracy: {metrics['test_accuracy']:.2f}")
+    else:
+        metrics["train_accuracy"] = float(accuracy_score(y_train, model.predict(X_train)))
+        print(f"Train Accuracy: {metrics['train_accuracy']:.2f} (no test set)")
+    return model, metrics
+
+def decode_image_bytes(data):
+    """Decode an encoded image held in memory; BGR like cv2.imread, None if undecodable"""
+    buf = np.frombuffer(data, dtype=np.uint8)
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR) if buf.size else None
+
+def image_features(img, out=None):
+    """BGR image -> gray 64x64 -> [0, 1] float64 vector, optionally written into ``out``"""
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    img = cv2.resize(img, IMAGE_SIZE).reshape(-1)
+    if out is None:
+        return img / 255.0
+    return np.divide(img, 255.0, out=out)
+
+def bytes_to_features(data):
+    """Encoded image bytes -> model input vector, or None if undecodable"""
+    img = decode_image_bytes(data)
+    return None if img is None else image_features(img)
+
+def predict_with_confidence(model, X, chunk_size=256):
+    """Labels and confidences (in %) from one predict_proba pass per chunk of rows.
+
+    The label is the most probable class, so it always agrees with its confidence.
+    """
+    labels = np.empty(len(X), dtype=model.classes_.dtype)
+    confidences = np.empty(len(X), dtype=np.float64)
+    for start in range(0, len(X), chunk_size):
+        with span("predict_proba"):
+            proba = model.predict_proba(X[start:start + chunk_size])
+        best = proba.argmax(axis=1)
+        labels[start:start + len(best)] = model.classes_[best]
+        confidences[start:start + len(best)] = proba[np.arange(len(best)), best] * 100
+    return labels, confidences
@@ -0,0 +1,117 @@
+import os
+from datetime import datetime
+from io import BytesIO
+from PIL import Image as PILImage
+from metrics import report_error, timed
+
+def resize_image(image_path, max_width=500, max_height=500):
+    try:
+        img = PILImage.open(image_path)
+        img.thumbnail((max_width, max_height), PILImage.Resampling.LANCZOS)
+        
+        img_byte_arr = BytesIO()
+        img.save(img_byte_arr, format='PNG')
+        img_byte_arr.seek(0)
+        
+        return img_byte_arr  # Return a file-like object, not ImageReader
+    except Exception as e:
+        print(f"Error resizing image: {e}")
+        return None
+
+@timed()
+def generate_pdf_report(session, filename="diagnosis_report.pdf"):
+    # ReportLab loads on the first render (normally in a report pool process), not on import
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as PDFImage, Table, TableStyle, PageBreak
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    try:
+        doc = SimpleDocTemplate(filename, pagesize=letter, rightMargin=40, leftMargin=40, topMargin=60, bottomMargin=40)
+        story = []
+        styles = getSampleStyleSheet()
+        cell_style = ParagraphStyle('cell_style', parent=styles["BodyText"], fontSize=10, leading=12)
+
+        # Add logo and header
+        logo_path = "curebot_logo.png"
+        if os.path.exists(logo_path):
+            logo = PDFImage(logo_path, width=60, height=60)
+            story.append(logo)
+        story.append(Spacer(1, 10))
+
+        story.append(Paragraph("<b>CureBot - Medical Report</b>", styles["Title"]))
+        # Date the report by its session so a cached copy reads the same as a fresh one
+        try:
+            report_date = datetime.fromisoformat(session["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            report_date = datetime.now()
+        story.append(Paragraph(f"<i>Date:</i> {report_date.strftime('%d %B %Y, %I:%M %p')}", styles["Normal"]))
+        story.append(Spacer(1, 12))
+
+        # Add patient query or image description
+        if "query" in session:
+            story.append(Paragraph("<b>🩺 Patient Query</b>", styles["Heading2"]))
+            story.append(Paragraph(session["query"], styles["BodyText"]))
+            story.append(Spacer(1, 10))
+
+        # Add image if available
+        if "image_path" in session and os.path.exists(session["image_path"]):
+            story.append(Paragraph("<b>🖼 Medical Image</b>", styles["Heading2"]))
+            
+            # Resize and add image
+            resized_image = resize_image(session["image_path"])
+            if resized_image:
+                story.append(PDFImage(resized_image, width=300, height=200))
+                story.append(Spacer(1, 10))
+            
+            # Add custom prompt if available
+            if "user_prompt" in session and session["user_prompt"]:
+                story.append(Paragraph("<b>🔍 Analysis Request</b>", styles["Heading3"]))
+                story.append(Paragraph(session["user_prompt"], styles["BodyText"]))
+                story.append(Spacer(1, 10))
+
+        # Add image analysis results
+        if "image_analysis" in session:
+            story.append(Paragraph("<b>📝 Image Analysis Results</b>", styles["Heading2"]))
+            for line in session["image_analysis"].split('\n'):
+                if line.strip():
+                    story.append(Paragraph(line, styles["BodyText"]))
+            story.append(Spacer(1, 15))
+
+        # Add follow-up Q&A if available
+        if "followups" in session and "responses" in session:
+            story.append(PageBreak())
+            story.append(Paragraph("<b>❓ Follow-up Questions & Answers</b>", styles["Heading2"]))
+            data = [[Paragraph("<b>Question</b>", styles["BodyText"]), Paragraph("<b>Answer</b>", styles["BodyText"])]]
+            for f, r in zip(session["followups"], session["responses"]):
+                data.append([Paragraph(f, cell_style), Paragraph(r, cell_style)])
+            table = Table(data, colWidths=[220, 300])
+            table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#00BCD4")),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+                ('FONTSIZE', (0, 0), (-1, -1), 10),
+                ('BOX', (0, 0), (-1, -1), 1, colors.grey),
+                ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.grey),
+                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ]))
+            story.append(table)
+            story.append(Spacer(1, 12))
+
+        # Add final diagnosis/solution
+        if "final_solution" in session:
+            story.append(Paragraph("<b>✅ Doctor's Assessment</b>", styles["Heading2"]))
+            for line in session["final_solution"].split("\n"):
+                if line.strip():
+                    story.append(Paragraph(line, styles["BodyText"]))
+            story.append(Spacer(1, 12))
+
+        # Add footer with disclaimer
+        story.append(Paragraph("<i>Disclaimer:</i> This report is AI-generated and not a substitute for professional medical advice. Please consult a licensed doctor for confirmation.", styles["Italic"]))
+        story.append(Spacer(1, 8))
+        story.append(Paragraph("<i>Powered by CureBot – Your AI Health Companion</i>", styles["Normal"]))
+
+        doc.build(story)
+        return filename
+    except Exception as e:
+        report_error("generate_pdf_report", e)
+        return None
@@ -0,0 +1,142 @@
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from metrics import STAGE_ERRORS, STAGE_SECONDS
+from report_store import render_atomically, session_fingerprint
+
+
+class ReportQueue:
+    """Pre-renders PDF reports on a local process pool as soon as a session is stored.
+
+    At most ``max_pending`` renders are queued or running; beyond that ``submit`` refuses
+    the job and the report is rendered on demand by the download route instead.
+    """
+
+    def __init__(self, store, build, workers=2, max_pending=32, max_jobs=1000, mp_context="spawn"):
+        self.store = store
+        self.build = build
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.mp_context = mp_context
+        self.rejected = 0
+        self._jobs = OrderedDict()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.mp_context),
+            )
+        return self._executor
+
+    def shutdown(self):
+        """Finish running renders and stop the pool's processes (a worker leaving through
+        os._exit skips the interpreter's own cleanup, which would orphan them)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def pending(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job["future"].done())
+
+    def submit(self, session_id, session):
+        """Queue a render and return its initial status: queued, ready, rejected or failed"""
+        fingerprint = session_fingerprint(session, self.store.version)
+        path = self.store.path_for(session_id, fingerprint)
+
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job and job["fingerprint"] == fingerprint and not job["future"].done():
+                return "queued"
+            if path.exists():
+                return "ready"
+            if sum(1 for j in self._jobs.values() if not j["future"].done()) >= self.max_pending:
+                self.rejected += 1
+                return "rejected"
+
+            try:
+                future = self._pool().submit(render_atomically, self.build, session, str(path))
+            except Exception as e:  # e.g. BrokenProcessPool after a worker crash
+                print(f"Error queueing report for {session_id}: {e}")
+                self._executor = None
+                return "failed"
+
+            self._jobs[session_id] = {
+                "future": future,
+                "fingerprint": fingerprint,
+                "path": path,
+                "submitted_at": time.time(),
+                "finished_at": None,
+            }
+            self._jobs.move_to_end(session_id)
+            while len(self._jobs) > self.max_jobs:
+                oldest = next(iter(self._jobs))
+                if not self._jobs[oldest]["future"].done():
+                    break
+                del self._jobs[oldest]
+
+        future.add_done_callback(lambda f: self._finished(session_id, path, f))
+        return "queued"
+
+    def _finished(self, session_id, path, future):
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job and job["future"] is future:
+                job["finished_at"] = time.time()
+                # the render itself runs (and is timed) in a pool process; this is what the
+                # serving process sees: queue wait plus render
+                STAGE_SECONDS.observe(job["finished_at"] - job["submitted_at"], stage="report_queue")
+        if not future.cancelled() and future.exception() is None and future.result():
+            self.store.drop_stale(session_id, path)
+            self.store.evict()
+        else:
+            STAGE_ERRORS.inc(stage="report_queue")
+
+    def wait(self, session_id, timeout):
+        """Block until an in-flight render for the session finishes, up to ``timeout`` seconds"""
+        with self._lock:
+            job = self._jobs.get(session_id)
+        if job is None:
+            return
+        try:
+            job["future"].result(timeout=timeout)
+        except TimeoutError:
+            pass
+        except Exception as e:
+            print(f"Error rendering report for {session_id}: {e}")
+
+    def status(self, session_id):
+        with self._lock:
+            job = self._jobs.get(session_id)
+        if job is None:
+            return {"status": "ready" if self.store.find(session_id) else "not_queued"}
+
+        future = job["future"]
+        status = {"submitted_at": job["submitted_at"], "finished_at": job["finished_at"]}
+        if not future.done():
+            status["status"] = "rendering" if future.running() else "queued"
+        elif future.cancelled() or future.exception() is not None:
+            status["status"] = "failed"
+            status["error"] = "cancelled" if future.cancelled() else str(future.exception())
+        elif future.result():
+            status["status"] = "ready" if job["path"].exists() else "expired"
+        else:
+            status["status"] = "failed"
+            status["error"] = "Failed to generate PDF"
+        return status
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending(),
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+
+def session_fingerprint(session, version=""):
+    """Hash of everything that ends up in a report: the session document and its image file"""
+    digest = hashlib.sha256(version.encode("utf-8"))
+    digest.update(json.dumps(session, sort_keys=True, default=str).encode("utf-8"))
+    image_path = session.get("image_path")
+    if image_path and os.path.exists(image_path):
+        stat = os.stat(image_path)
+        digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def render_atomically(build, session, path):
+    """Render with ``build(session, filename=...)`` into a temp file next to ``path`` and
+    rename it into place. Top-level so it can run in a worker process."""
+    path = Path(path)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}_", suffix=".pdf.tmp")
+    os.close(fd)
+    try:
+        if not build(session, filename=tmp_name):
+            return False
+        os.replace(tmp_name, path)
+        return True
+    finally:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+
+
+class ReportStore:
+    """On-disk cache of rendered PDF reports keyed on session id + session fingerprint.
+
+    Reports are written to a temp file and atomically renamed into place, so readers never
+    see a half-written PDF. A file's mtime is its build time (served as Last-Modified) and
+    its atime is bumped on every hit, which drives the age and size based eviction.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, max_age=7 * 24 * 3600, version="", lock_stripes=64):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        # a fixed set of locks shared by hash, so memory stays flat however many sessions come by
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+
+    def _lock_for(self, session_id):
+        return self._locks[hash(session_id) % len(self._locks)]
+
+    def path_for(self, session_id, fingerprint):
+        return self.directory / f"medical_report_{session_id}_{fingerprint[:16]}.pdf"
+
+    def _touch(self, path):
+        stat = path.stat()
+        os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+
+    def get_or_build(self, session_id, session, build):
+        """Return ``(path, fingerprint)`` for the session's report, rendering it with
+        ``build(session, filename)`` only when no up-to-date copy exists"""
+        fingerprint = session_fingerprint(session, self.version)
+        path = self.path_for(session_id, fingerprint)
+
+        with self._lock_for(session_id):
+            if path.exists():
+                try:
+                    self._touch(path)
+                except FileNotFoundError:
+                    pass  # evicted since the check; render it again
+                else:
+                    self.hits += 1
+                    return path, fingerprint
+
+            self.misses += 1
+            if not render_atomically(build, session, path):
+                return None, fingerprint
+            self.drop_stale(session_id, path)
+
+        self.evict()
+        return path, fingerprint
+
+    def drop_stale(self, session_id, current):
+        """An edited session leaves its previous report behind; remove it"""
+        for stale in self.directory.glob(f"medical_report_{session_id}_*.pdf"):
+            if stale != current:
+                stale.unlink(missing_ok=True)
+
+    def find(self, session_id):
+        """Most recently built report for a session, whatever its fingerprint"""
+        reports = []
+        for path in self.directory.glob(f"medical_report_{session_id}_*.pdf"):
+            try:
+                reports.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        return max(reports)[1] if reports else None
+
+    def evict(self):
+        """Remove reports idle for longer than ``max_age``, then least recently used ones
+        until the store fits in ``max_bytes``. Returns the number of bytes reclaimed."""
+        now = time.time()
+        reclaimed = 0
+        entries = []
+        for path in self.directory.iterdir():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            is_tmp = path.name.endswith(".tmp")
+            if (is_tmp and now - stat.st_mtime > 3600) or (not is_tmp and now - stat.st_atime > self.max_age):
+                path.unlink(missing_ok=True)
+                reclaimed += stat.st_size
+            elif not is_tmp:
+                entries.append((stat.st_atime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            reclaimed += size
+        return reclaimed
+
+    def stats(self):
+        files = list(self.directory.glob("*.pdf"))
+        lookups = self.hits + self.misses
+        return {
+            "files": len(files),
+            "bytes": sum(f.stat().st_size for f in files if f.exists()),
+            "max_bytes": self.max_bytes,
+            "max_age": self.max_age,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
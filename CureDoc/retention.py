@@ -0,0 +1,109 @@
+import re
+import threading
+import time
+
+REPORT_NAME = re.compile(r"^medical_report_([0-9a-f]{24})_[0-9a-f]+\.pdf$")
+
+
+class RetentionSweeper:
+    """Periodically deletes files no session needs any more.
+
+    Sessions themselves expire through the TTL index on ``created_at`` (see
+    SessionRepository.ensure_ttl); this removes what they leave behind: stored images and
+    rendered reports that have not been used for ``orphan_age`` seconds and whose session is
+    gone. It also runs both stores' own age/size eviction. ``interval`` 0 disables the
+    background thread; ``sweep()`` can still be called directly.
+    """
+
+    def __init__(self, sessions, image_store, report_store, orphan_age=24 * 3600, interval=3600.0):
+        self.sessions = sessions
+        self.image_store = image_store
+        self.report_store = report_store
+        self.orphan_age = orphan_age
+        self.interval = interval
+        self.runs = 0
+        self.bytes_reclaimed = {"images": 0, "reports": 0}
+        self.files_removed = {"images": 0, "reports": 0}
+        self.last_run = None
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="retention-sweeper", daemon=True)
+
+    def start(self):
+        if self.interval > 0:
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error in retention sweep: {e}")
+
+    def _orphaned_images(self, cutoff):
+        for sha, path in self.image_store.images():
+            try:
+                # atime: a deduplicated re-upload touches the file, so it counts as use
+                if path.stat().st_atime > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            if not self.sessions.references(sha256=sha, path=str(path)):
+                yield sha
+
+    def _orphaned_reports(self, cutoff):
+        for path in self.report_store.directory.iterdir():
+            match = REPORT_NAME.match(path.name)
+            if not match:
+                continue
+            try:
+                if path.stat().st_atime > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            if not self.sessions.exists(match.group(1)):
+                yield path
+
+    def sweep(self):
+        """One pass; returns what it removed: ``{"images": {...}, "reports": {...}, "seconds"}``"""
+        started = time.monotonic()
+        cutoff = time.time() - self.orphan_age
+        result = {"images": {"files": 0, "bytes": 0}, "reports": {"files": 0, "bytes": 0}}
+
+        for sha in list(self._orphaned_images(cutoff)):
+            freed = self.image_store.remove(sha)
+            if freed:
+                result["images"]["files"] += 1
+                result["images"]["bytes"] += freed
+        result["images"]["bytes"] += self.image_store.evict()
+
+        for path in list(self._orphaned_reports(cutoff)):
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            result["reports"]["files"] += 1
+            result["reports"]["bytes"] += size
+        result["reports"]["bytes"] += self.report_store.evict()
+
+        result["seconds"] = round(time.monotonic() - started, 3)
+        with self._lock:
+            self.runs += 1
+            for kind in ("images", "reports"):
+                self.files_removed[kind] += result[kind]["files"]
+                self.bytes_reclaimed[kind] += result[kind]["bytes"]
+            self.last_run = {"at": time.time(), **result}
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "orphan_age": self.orphan_age,
+                "interval": self.interval,
+                "runs": self.runs,
+                "files_removed": dict(self.files_removed),
+                "bytes_reclaimed": dict(self.bytes_reclaimed),
+                "last_run": self.last_run,
+            }
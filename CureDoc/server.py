@@ -1,125 +1,208 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Request, render_template, request, jsonify, send_file, url_for
 import os
+import hashlib
+import hmac
+import threading
 import numpy as np
 import cv2
-from sklearn import svm
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
 import base64
+import queue
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from PIL import Image  # Added this import
+from incremental import FeedbackTrainer
+from metrics import REGISTRY, instrument, stats_collector
+from model_store import ArtifactMismatch, ModelHolder, ModelStore
+from neuroscan import (IMAGE_SIZE, LABEL_NAMES, PREPROCESSING, bytes_to_features, dataset_fingerprint, decode_image_bytes,
+                       holdout_split, image_features, predict_with_confidence, train_and_evaluate)
+from thumbnail_store import ThumbnailStore
+
+class InMemoryRequest(Request):
+    """Keep multipart uploads in memory; werkzeug spools anything over 500 KB to a temp file"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return BytesIO()
 
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 
 # Configuration
-UPLOAD_FOLDER = 'static/uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-
-def load_dataset():
-    """Load and preprocess dataset with better error handling"""
-    dataset_path = 'dataset'
-    images = []
-    labels = []
-    
-    # Check if dataset directory exists
-    if not os.path.exists(dataset_path):
-        print(f"Dataset directory '{dataset_path}' not found!")
-        return None, None, None, None
-
-    # Check for tumor and no_tumor subdirectories
-    for class_name in ['no_tumor', 'tumor']:
-        class_path = os.path.join(dataset_path, class_name)
-        if not os.path.exists(class_path):
-            print(f"Class directory '{class_path}' not found!")
-            continue
-            
-        for img_file in os.listdir(class_path):
-            img_path = os.path.join(class_path, img_file)
-            try:
-                # Read and preprocess image
-                img = cv2.imread(img_path)
-                if img is None:
-                    print(f"Could not read image: {img_path}")
-                    continue
-                    
-                img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                img = cv2.resize(img, (64, 64))  # Resize to 64x64
-                img = img / 255.0  # Normalize
-                
-                images.append(img.flatten())
-                labels.append(0 if class_name == 'no_tumor' else 1)
-            except Exception as e:
-                print(f"Error processing {img_path}: {e}")
-
-    if len(images) == 0:
-        print("No valid images found in dataset!")
-        return None, None, None, None
-
-    X = np.array(images)
-    y = np.array(labels)
-    
-    # Ensure we have enough samples for splitting
-    if len(X) < 5:  # Minimum 5 samples needed
-        print(f"Not enough samples ({len(X)}). Using all for training.")
-        return X, None, y, None
-    
-    # Split into train/test
-    return train_test_split(X, y, test_size=0.2, random_state=42)
-
-def train_model(X_train, y_train):
-    """Train SVM model with better parameters"""
-    model = svm.SVC(
-        kernel='rbf',
-        C=10,  # Higher regularization
-        gamma='scale',
-        probability=True,
-        random_state=42
-    )
-    model.fit(X_train, y_train)
-    return model
-
-# Load dataset and train model
-X_train, X_test, y_train, y_test = load_dataset()
-
-if X_train is None:
-    print("Failed to load dataset. Using mock data...")
-    # Create mock data
-    X_train = np.random.rand(10, 4096)  # 64x64 = 4096 features
-    y_train = np.random.randint(0, 2, 10)
-    X_test = np.random.rand(3, 4096)
-    y_test = np.random.randint(0, 2, 3)
-
-model = train_model(X_train, y_train)
-
-# Evaluate model
-if X_test is not None:
-    test_acc = accuracy_score(y_test, model.predict(X_test))
-    print(f"Test Accuracy: {test_acc:.2f}")
-else:
-    train_acc = accuracy_score(y_train, model.predict(X_train))
-    print(f"Train Accuracy: {train_acc:.2f} (no test set)")
-
-def preprocess_image(filepath):
-    """Improved image preprocessing with error handling"""
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get("NEUROSCAN_MAX_UPLOAD_MB", 64)) * 1024 * 1024
+# Uploads are classified in memory; thumbnails served by URL live on disk, shared by all workers
+THUMBNAIL_DIR = os.environ.get("NEUROSCAN_THUMBNAIL_DIR", "thumbnails")
+THUMBNAIL_MAX_BYTES = int(os.environ.get("NEUROSCAN_THUMBNAIL_MAX_MB", 64)) * 1024 * 1024
+thumbnail_store = ThumbnailStore(THUMBNAIL_DIR, max_bytes=THUMBNAIL_MAX_BYTES, max_age=3600)
+
+# Batch classification
+BATCH_MAX_IMAGES = int(os.environ.get("NEUROSCAN_BATCH_MAX_IMAGES", 1000))
+BATCH_CHUNK_SIZE = int(os.environ.get("NEUROSCAN_BATCH_CHUNK_SIZE", 256))
+# MAX_CONTENT_LENGTH only bounds the compressed upload; these bound what a .zip expands to
+BATCH_MAX_ZIP_ENTRIES = int(os.environ.get("NEUROSCAN_BATCH_MAX_ZIP_ENTRIES", 5000))
+BATCH_MAX_IMAGE_BYTES = int(os.environ.get("NEUROSCAN_BATCH_MAX_IMAGE_MB", 32)) * 1024 * 1024
+BATCH_MAX_TOTAL_BYTES = int(os.environ.get("NEUROSCAN_BATCH_MAX_TOTAL_MB", 512)) * 1024 * 1024
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp'}
+decode_pool = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="decode")
+
+# === Model Artifact ===
+MODELS_DIR = os.environ.get("NEUROSCAN_MODELS_DIR", "models")
+# What to do when no artifact matches the dataset: "train" in-process (and publish the result) or "refuse" to start
+MODEL_FALLBACK = os.environ.get("NEUROSCAN_MODEL_FALLBACK", "train")
+MODEL_RELOAD_INTERVAL = float(os.environ.get("NEUROSCAN_MODEL_RELOAD_INTERVAL", 30))  # seconds
+# Required for /model/reload and request profiling; with none configured both stay closed
+ADMIN_TOKEN = os.environ.get("NEUROSCAN_ADMIN_TOKEN", os.environ.get("ADMIN_TOKEN", ""))
+
+def admin_authorized():
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+def check_dataset(meta):
+    """Reject artifacts whose preprocessing or training data differ from this server's"""
+    if meta.get("preprocessing") != PREPROCESSING:
+        raise ArtifactMismatch(f"Model {meta.get('version')} expects different preprocessing: {meta.get('preprocessing')}")
+    fingerprint = dataset_fingerprint()
+    if fingerprint is None:
+        print("Dataset directory not found; serving the artifact without verifying it.")
+        return
+    if meta.get("dataset_fingerprint") != fingerprint:
+        raise ArtifactMismatch(f"Model {meta.get('version')} was trained on a different dataset")
+
+model_store = ModelStore(MODELS_DIR)
+model_holder = ModelHolder(model_store, check_interval=MODEL_RELOAD_INTERVAL, validate=check_dataset)
+
+def load_model():
     try:
-        img = cv2.imread(filepath)
-        if img is None:
-            raise ValueError("Could not read image file")
-            
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        img = cv2.resize(img, (64, 64))
-        img = img / 255.0
-        return img.flatten()
-    except Exception as e:
-        print(f"Image processing error: {e}")
+        model_holder.load()
+        return
+    except (FileNotFoundError, ArtifactMismatch) as e:
+        if MODEL_FALLBACK == "refuse":
+            raise SystemExit(f"{e}. Run `python train_neuroscan.py` to publish a model.")
+        print(f"{e}. Falling back to training in-process...")
+
+    model, metrics = train_and_evaluate()
+    meta = {"version": None, "preprocessing": PREPROCESSING, "metrics": metrics}
+    if not metrics["mock_data"]:
+        version = model_store.save(model, PREPROCESSING, metrics, dataset_fingerprint())
+        meta = model_store.load(version)[1]
+    model_holder.swap(model, meta)
+
+# === Incremental Training ===
+# Needs a partial_fit-capable model: train with `--mode sgd-rff` (or NEUROSCAN_MODEL_MODE=sgd-rff)
+INCREMENTAL = os.environ.get("NEUROSCAN_INCREMENTAL", "0") == "1"
+FEEDBACK_DIR = os.environ.get("NEUROSCAN_FEEDBACK_DIR", "feedback")
+FEEDBACK_BATCH_SIZE = int(os.environ.get("NEUROSCAN_FEEDBACK_BATCH_SIZE", 32))
+FEEDBACK_FLUSH_INTERVAL = float(os.environ.get("NEUROSCAN_FEEDBACK_FLUSH_INTERVAL", 30))  # seconds
+CHECKPOINT_INTERVAL = float(os.environ.get("NEUROSCAN_CHECKPOINT_INTERVAL", 300))  # seconds
+HOLDOUT_FRACTION = float(os.environ.get("NEUROSCAN_HOLDOUT_FRACTION", 0.1))
+MAX_ACCURACY_DROP = float(os.environ.get("NEUROSCAN_MAX_ACCURACY_DROP", 0.05))
+FEEDBACK_LABELS = {"0": 0, "1": 1, "no_tumor": 0, "tumor": 1, "no tumor": 0}
+
+feedback_trainer = None
+if INCREMENTAL:
+    feedback_trainer = FeedbackTrainer(
+        model_holder, model_store, FEEDBACK_DIR, PREPROCESSING, dataset_fingerprint,
+        holdout=holdout_split,  # read once this process is elected trainer, not at import
+        batch_size=FEEDBACK_BATCH_SIZE,
+        flush_interval=FEEDBACK_FLUSH_INTERVAL,
+        checkpoint_interval=CHECKPOINT_INTERVAL,
+        holdout_fraction=HOLDOUT_FRACTION,
+        max_accuracy_drop=MAX_ACCURACY_DROP,
+        decode=bytes_to_features,
+    )
+
+# === Process Startup ===
+# Importing this module loads no model and starts no threads. A serving master can call
+# preload() before forking so workers share the model's pages (see wsgi.py); otherwise
+# each process loads it in the background and /readyz answers 503 until it is live.
+_started_pid = None
+_startup_lock = threading.Lock()
+_model_loading = threading.Lock()
+
+def preload():
+    with _model_loading:
+        if model_holder.model is None:
+            load_model()
+
+# Exit status of a worker that refuses to serve. Gunicorn halts the whole server when a
+# worker exits with its WORKER_BOOT_ERROR (3) instead of respawning it, and so does wsgi.py.
+BOOT_ERROR_EXIT = 3
+
+def _load_in_background(backoff=1.0, max_backoff=60.0):
+    """Load the model, retrying transient errors with backoff: a worker that gave up would
+    answer 503 from /readyz for good while its siblings answer 200. With
+    MODEL_FALLBACK=refuse and no matching artifact the process exits instead."""
+    while True:
+        try:
+            preload()
+            return
+        except SystemExit as e:
+            print(f"Refusing to serve NeuroScan: {e}", flush=True)
+            os._exit(BOOT_ERROR_EXIT)
+        except Exception as e:
+            print(f"Error loading NeuroScan model (retrying in {backoff:.0f}s): {e}")
+        time.sleep(backoff)
+        backoff = min(max_backoff, backoff * 2)
+
+def start_background_work():
+    """Load the model if no preloading master did, and start the feedback trainer; idempotent"""
+    global _started_pid
+    with _startup_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+    if model_holder.model is None:
+        threading.Thread(target=_load_in_background, name="model-loader", daemon=True).start()
+    if feedback_trainer is not None:
+        feedback_trainer.start()
+
+def model_unavailable():
+    """503 response while no model is live, else None"""
+    if model_holder.model is not None:
         return None
+    return jsonify({'error': 'Model is loading, try again shortly'}), 503, {'Retry-After': '5'}
+
+@app.before_request
+def follow_model_updates():
+    start_background_work()
+    if model_holder.model is not None:
+        model_holder.maybe_reload()
+
+@app.route('/healthz')
+def liveness():
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readiness():
+    if model_holder.model is None:
+        return jsonify({'status': 'loading'}), 503
+    return jsonify({'status': 'ready', 'model_version': model_holder.version})
+
+# === Metrics ===
+# GET /metrics in Prometheus text; NEUROSCAN_PROFILE_REQUESTS=1 lets a request sent with
+# "X-Profile: 1" and the admin token be stack-sampled into NEUROSCAN_PROFILE_DIR
+PROFILE_REQUESTS = os.environ.get("NEUROSCAN_PROFILE_REQUESTS", "0") == "1"
+PROFILE_DIR = os.environ.get("NEUROSCAN_PROFILE_DIR", "profiles")
+instrument(app, "neuroscan", authorize=admin_authorized, profile_dir=PROFILE_DIR if PROFILE_REQUESTS else None)
+REGISTRY.add_collector(stats_collector("neuroscan", {
+    "thumbnail_store": thumbnail_store.stats,
+    "feedback": feedback_trainer.stats if feedback_trainer else dict,
+}))
 
 @app.route('/')
 def home():
+    metrics = model_holder.meta.get("metrics", {})
     return render_template('NeuroScan.html', 
-                         train_samples=len(X_train),
-                         test_samples=len(X_test) if X_test is not None else 0)
+                         train_samples=metrics.get("train_samples", 0),
+                         test_samples=metrics.get("test_samples", 0))
+
+def encode_thumbnail(img, max_side=300, quality=75):
+    """JPEG thumbnail of an already-decoded BGR image, no re-decode or PIL round trip"""
+    height, width = img.shape[:2]
+    scale = min(1.0, max_side / max(height, width))
+    if scale < 1.0:
+        img = cv2.resize(img, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes() if ok else None
 
 @app.route('/classify', methods=['POST'])
 def classify():
@@ -130,44 +213,210 @@ def classify():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
+    unavailable = model_unavailable()
+    if unavailable:
+        return unavailable
+
     if file:
         try:
-            # Save file temporarily
-            filename = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-            file.save(filename)
-            
-            # Preprocess image
-            img_vector = preprocess_image(filename)
-            if img_vector is None:
+            # Decode once, straight from the request buffer
+            data = file.read()
+            img = decode_image_bytes(data)
+            if img is None:
                 return jsonify({'error': 'Invalid image format'}), 400
-            
+
             # Make prediction
-            prediction = model.predict([img_vector])[0]
-            confidence = model.predict_proba([img_vector])[0][prediction] * 100
-            label = "Tumor" if prediction == 1 else "No Tumor"
-            
-            # Prepare image for display
-            img = cv2.imread(filename)
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(img)  # Now using the imported Image class
-            img.thumbnail((300, 300))
-            buffered = BytesIO()
-            img.save(buffered, format="JPEG")
-            img_str = base64.b64encode(buffered.getvalue()).decode('utf-8')
+            img_vector = image_features(img)
+            model, _ = model_holder.get()
+            predictions, confidences = predict_with_confidence(model, img_vector[np.newaxis, :])
+            label = LABEL_NAMES[int(predictions[0])]
+            confidence = float(confidences[0])
             
-            # Clean up
-            os.remove(filename)
-            
-            return jsonify({
+            # Prepare image for display from the same decoded array
+            response = {
                 'prediction': label,
                 'confidence': round(confidence, 2),
-                'image': img_str
-            })
+            }
+            if request.values.get('thumbnail') == 'url':
+                key = hashlib.sha256(data).hexdigest()
+                thumbnail_store.put(key, lambda: encode_thumbnail(img))
+                response['image_url'] = url_for('thumbnail', key=key)
+            else:
+                response['image'] = base64.b64encode(encode_thumbnail(img)).decode('utf-8')
+            return jsonify(response)
         except Exception as e:
             print(f"Classification error: {e}")
             return jsonify({'error': str(e)}), 500
     
     return jsonify({'error': 'Invalid file'}), 400
 
+@app.route('/thumbnails/<key>.jpg')
+def thumbnail(key):
+    path = thumbnail_store.get(key)
+    if path is None:
+        return jsonify({'error': 'Thumbnail not found'}), 404
+    try:
+        return send_file(path.resolve(), mimetype='image/jpeg', etag=key, max_age=3600, conditional=True)
+    except FileNotFoundError:  # evicted since the lookup
+        return jsonify({'error': 'Thumbnail not found'}), 404
+
+class BatchTooLarge(Exception):
+    """A batch (or an archive inside it) expands beyond the configured limits"""
+
+def read_zip_entry(archive, info, limit):
+    """Entry contents, reading at most ``limit`` bytes whatever the header claims"""
+    if info.file_size > limit:
+        raise BatchTooLarge(f'{info.filename} expands to {info.file_size} bytes (limit {limit})')
+    with archive.open(info) as f:
+        data = f.read(limit + 1)
+    if len(data) > limit:
+        raise BatchTooLarge(f'{info.filename} expands beyond {limit} bytes')
+    return data
+
+def batch_uploads():
+    """(filename, bytes) for every uploaded image, expanding any .zip archives within the
+    entry-count and uncompressed-size limits (checked before anything is inflated)"""
+    total = 0
+    for file in request.files.getlist('files') + request.files.getlist('file'):
+        if not file.filename:
+            continue
+        data = file.read()
+        if file.filename.lower().endswith('.zip'):
+            with zipfile.ZipFile(BytesIO(data)) as archive:
+                if len(archive.infolist()) > BATCH_MAX_ZIP_ENTRIES:
+                    raise BatchTooLarge(f'{file.filename} has more than {BATCH_MAX_ZIP_ENTRIES} entries')
+                entries = [info for info in archive.infolist()
+                           if not info.is_dir() and not os.path.basename(info.filename).startswith('.')
+                           and os.path.splitext(info.filename)[1].lower() in IMAGE_EXTENSIONS]
+                if total + sum(info.file_size for info in entries) > BATCH_MAX_TOTAL_BYTES:
+                    raise BatchTooLarge(f'Batch expands beyond {BATCH_MAX_TOTAL_BYTES} bytes')
+                for info in entries:
+                    entry = read_zip_entry(archive, info, min(BATCH_MAX_IMAGE_BYTES, BATCH_MAX_TOTAL_BYTES - total))
+                    total += len(entry)
+                    yield info.filename, entry
+        else:
+            total += len(data)
+            yield file.filename, data
+
+@app.route('/classify/batch', methods=['POST'])
+def classify_batch():
+    unavailable = model_unavailable()
+    if unavailable:
+        return unavailable
+    started = time.perf_counter()
+    try:
+        chunk_size = max(1, int(request.form.get('chunk_size', BATCH_CHUNK_SIZE)))
+        uploads = []
+        for upload in batch_uploads():
+            uploads.append(upload)
+            if len(uploads) > BATCH_MAX_IMAGES:
+                return jsonify({'error': f'At most {BATCH_MAX_IMAGES} images per batch'}), 413
+    except BatchTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({'error': f'Invalid batch: {e}'}), 400
+    if not uploads:
+        return jsonify({'error': 'No images uploaded'}), 400
+
+    # Decode in parallel straight into one contiguous feature matrix
+    X = np.empty((len(uploads), IMAGE_SIZE[0] * IMAGE_SIZE[1]), dtype=np.float64)
+
+    def decode_into(row):
+        img = decode_image_bytes(uploads[row][1])
+        if img is None:
+            return False
+        image_features(img, out=X[row])
+        return True
+
+    decoded = list(decode_pool.map(decode_into, range(len(uploads))))
+    valid = np.flatnonzero(decoded)
+    decoded_at = time.perf_counter()
+
+    model, meta = model_holder.get()
+    predictions, confidences = predict_with_confidence(model, X[valid], chunk_size=chunk_size)
+    predicted_at = time.perf_counter()
+
+    results = [{'filename': name, 'error': 'Invalid image format'} for name, _ in uploads]
+    for row, prediction, confidence in zip(valid, predictions, confidences):
+        results[row] = {
+            'filename': uploads[row][0],
+            'prediction': LABEL_NAMES[int(prediction)],
+            'confidence': round(float(confidence), 2),
+        }
+
+    return jsonify({
+        'results': results,
+        'model_version': meta.get('version'),
+        'timing': {
+            'images': len(uploads),
+            'classified': int(len(valid)),
+            'chunk_size': chunk_size,
+            'decode_ms': round((decoded_at - started) * 1000, 2),
+            'predict_ms': round((predicted_at - decoded_at) * 1000, 2),
+            'total_ms': round((time.perf_counter() - started) * 1000, 2),
+        }
+    })
+
+@app.route('/feedback', methods=['POST'])
+def feedback():
+    """Queue a clinician-confirmed scan for the next incremental training batch"""
+    if feedback_trainer is None:
+        return jsonify({'error': 'Incremental training is disabled (set NEUROSCAN_INCREMENTAL=1)'}), 404
+    unavailable = model_unavailable()
+    if unavailable:
+        return unavailable
+    model, meta = model_holder.get()
+    if not hasattr(model, 'partial_fit'):
+        return jsonify({'error': f"Model {meta.get('version')} cannot be updated incrementally; "
+                                 "publish one with `train_neuroscan.py --mode sgd-rff`"}), 409
+
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        return jsonify({'error': 'No file uploaded'}), 400
+    label = FEEDBACK_LABELS.get(request.form.get('label', '').strip().lower())
+    if label is None:
+        return jsonify({'error': "label must be 'tumor' or 'no_tumor'"}), 400
+
+    data = file.read()
+    features = bytes_to_features(data)
+    if features is None:
+        return jsonify({'error': 'Invalid image format'}), 400
+    extension = os.path.splitext(file.filename)[1].lower()
+    try:
+        result = feedback_trainer.submit(data, extension if extension in IMAGE_EXTENSIONS else '.png', label, features)
+    except queue.Full:
+        return jsonify({'error': 'Training queue is full, try again later'}), 503
+    return jsonify({'status': 'queued', 'label': LABEL_NAMES[label], **result}), 202
+
+@app.route('/feedback/status', methods=['GET'])
+def feedback_status():
+    if feedback_trainer is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **feedback_trainer.stats()})
+
+@app.route('/model', methods=['GET'])
+def model_info():
+    return jsonify(model_holder.meta)
+
+@app.route('/model/reload', methods=['POST'])
+def reload_model():
+    """Swap to ``version`` (default: CURRENT); ``force`` skips the dataset check. Admin only."""
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    body = request.get_json(silent=True) or {}
+    version = body.get("version")
+    if version is not None and version not in model_store.versions():
+        return jsonify({'error': f"Unknown model version {version!r}", 'versions': model_store.versions()}), 404
+    try:
+        meta = model_holder.load(version, force=bool(body.get("force")))
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except ArtifactMismatch as e:
+        return jsonify({'error': f"{e}; pass force=true to swap anyway"}), 409
+    return jsonify(meta)
+
 if __name__ == '__main__':
+    # development server; see wsgi.py for serving both apps in production
+    preload()
+    start_background_work()
     app.run(debug=True, port=5010)
\ No newline at end of file
@@ -0,0 +1,178 @@
+import base64
+import binascii
+import time
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReturnDocument
+from pymongo.errors import OperationFailure
+
+# What a history listing returns: enough to render a row, none of the long LLM text
+SUMMARY_FIELDS = {"timestamp": 1, "query": 1, "patient_id": 1, "analysis_status": 1, "image_sha256": 1}
+IN_PROGRESS = ("queued", "running")
+
+
+def utcnow():
+    """Naive UTC at BSON's millisecond precision, so a buffered copy equals the stored one"""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def connect(uri, pool_size=50, min_pool_size=0, connect_timeout_ms=3000, socket_timeout_ms=10000,
+            server_selection_timeout_ms=3000, wait_queue_timeout_ms=2000):
+    """MongoClient with explicit pool bounds and timeouts, so a slow or missing mongod fails a
+    request in seconds instead of hanging a worker. Connects lazily on first use, so no
+    monitor threads exist yet when a pre-fork server forks its workers."""
+    return MongoClient(
+        uri,
+        connect=False,
+        maxPoolSize=pool_size,
+        minPoolSize=min_pool_size,
+        connectTimeoutMS=connect_timeout_ms,
+        socketTimeoutMS=socket_timeout_ms,
+        serverSelectionTimeoutMS=server_selection_timeout_ms,
+        waitQueueTimeoutMS=wait_queue_timeout_ms,
+    )
+
+
+def encode_cursor(doc):
+    raw = f"{doc['timestamp']}|{doc['_id']}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """(timestamp, ObjectId) from an opaque page cursor; ValueError if it was tampered with"""
+    try:
+        timestamp, _, oid = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").rpartition("|")
+        return timestamp, ObjectId(oid)
+    except (binascii.Error, UnicodeError, InvalidId) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+class SessionRepository:
+    """All CureBot session reads and writes go through here.
+
+    Sessions are listed newest first with keyset pagination on ``(timestamp, _id)``, which
+    the compound indexes below serve directly, so a page costs the same however deep it is.
+    With a ``writer`` (see session_writer.py) inserts are batched in the background; reads
+    of a still-buffered session are answered from the buffer, and its updates/deletes are
+    journaled behind its insert instead of racing it.
+    """
+
+    def __init__(self, collection, writer=None, insert_grace=0.0, poll_interval=0.05):
+        self.collection = collection
+        self.writer = writer
+        # how long a just-minted id may still sit in another worker's write-behind buffer
+        self.insert_grace = insert_grace if writer is not None else 0.0
+        self.poll_interval = poll_interval
+
+    def ensure_indexes(self, retention_seconds=0):
+        self.collection.create_index([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_id")
+        self.collection.create_index(
+            [("patient_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+            name="patient_timestamp_id",
+            partialFilterExpression={"patient_id": {"$exists": True}},
+        )
+        # lets the retention sweeper ask "is this file still referenced?" cheaply
+        for field in ("image_sha256", "image_path"):
+            self.collection.create_index(field, name=field, partialFilterExpression={field: {"$exists": True}})
+        if retention_seconds:
+            self.ensure_ttl(retention_seconds)
+
+    def ensure_ttl(self, seconds):
+        """Expire sessions ``seconds`` after ``created_at``, adjusting an existing TTL in place"""
+        try:
+            self.collection.create_index("created_at", name="created_at_ttl", expireAfterSeconds=int(seconds))
+        except OperationFailure:
+            self.collection.database.command({
+                "collMod": self.collection.name,
+                "index": {"name": "created_at_ttl", "expireAfterSeconds": int(seconds)},
+            })
+
+    def insert(self, session):
+        # a real date for the TTL index ("timestamp" stays the ISO string clients already use)
+        session.setdefault("created_at", utcnow())
+        if self.writer is not None:
+            return self.writer.add(session)
+        return str(self.collection.insert_one(session).inserted_id)
+
+    def get(self, session_id, projection=None, wait=False):
+        """Session document or None; invalid ids are treated as missing.
+
+        With ``wait``, a session whose id was minted less than ``insert_grace`` seconds ago
+        is polled for until then: under a pre-fork server the insert may still be buffered
+        by the worker that created it, and a client polling right away can land elsewhere.
+        """
+        doc = self._get(session_id, projection)
+        if doc is not None or not wait or not self.insert_grace or not ObjectId.is_valid(session_id):
+            return doc
+        # the id's own timestamp bounds the wait; ids from the future (forged) get none
+        deadline = ObjectId(session_id).generation_time.timestamp() + self.insert_grace
+        while doc is None and 0 < deadline - time.time() <= self.insert_grace + 1:
+            time.sleep(min(self.poll_interval, max(0.0, deadline - time.time())))
+            doc = self._get(session_id, projection)
+        return doc
+
+    def _get(self, session_id, projection=None):
+        if not ObjectId.is_valid(session_id):
+            return None
+        if self.writer is not None:
+            buffered, doc = self.writer.get(session_id)
+            if buffered:
+                if doc is None or not projection:
+                    return doc
+                return {k: v for k, v in doc.items() if k == "_id" or projection.get(k)}
+        return self.collection.find_one({"_id": ObjectId(session_id)}, projection)
+
+    def update(self, session_id, fields):
+        if self.writer is not None and self.writer.update(session_id, fields):
+            return
+        self.collection.update_one({"_id": ObjectId(session_id)}, {"$set": fields})
+
+    def delete(self, session_id):
+        if self.writer is not None and self.writer.delete(session_id):
+            return
+        self.collection.delete_one({"_id": ObjectId(session_id)})
+
+    def claim_stale_analysis(self, before, session_id=None):
+        """Atomically take over one analysis left queued or running since before ``before``
+        (by a crash or restart), or None. Claiming bumps ``analysis_updated_at``, so two
+        workers reconciling at once never pick up the same session."""
+        query = {
+            "analysis_status": {"$in": list(IN_PROGRESS)},
+            "$or": [{"analysis_updated_at": {"$lt": before}},
+                    {"analysis_updated_at": {"$exists": False}, "created_at": {"$lt": before}}],
+        }
+        if session_id is not None:
+            if not ObjectId.is_valid(session_id):
+                return None
+            query["_id"] = ObjectId(session_id)
+        return self.collection.find_one_and_update(
+            query, {"$set": {"analysis_status": "queued", "analysis_updated_at": utcnow()}},
+            return_document=ReturnDocument.AFTER)
+
+    def exists(self, session_id):
+        return self.get(session_id, {"_id": 1}) is not None
+
+    def references(self, sha256=None, path=None):
+        """Whether any session still points at an image (by content hash or stored path)"""
+        clauses = [{field: value} for field, value in (("image_sha256", sha256), ("image_path", path)) if value]
+        if not clauses:
+            return False
+        return self.collection.find_one({"$or": clauses}, {"_id": 1}) is not None
+
+    def history(self, patient_id=None, limit=20, cursor=None, projection=None):
+        """One page of sessions, newest first: ``(docs, next_cursor)``, next_cursor None on
+        the last page. Raises ValueError for a malformed cursor."""
+        query = {} if patient_id is None else {"patient_id": patient_id}
+        if cursor:
+            timestamp, oid = decode_cursor(cursor)
+            query["$or"] = [{"timestamp": {"$lt": timestamp}}, {"timestamp": timestamp, "_id": {"$lt": oid}}]
+
+        # one extra row tells us whether there is another page without a count()
+        docs = list(self.collection.find(query, projection or SUMMARY_FIELDS)
+                    .sort([("timestamp", DESCENDING), ("_id", DESCENDING)])
+                    .limit(limit + 1))
+        next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+        return docs[:limit], next_cursor
@@ -0,0 +1,303 @@
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+
+from metrics import span
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so every other journal directory is taken to be stale
+    fcntl = None
+
+DUPLICATE_KEY = 11000
+LOCK_NAME = ".lock"
+
+
+def _try_lock(directory):
+    """Exclusive lock on a journal directory, or None if a live process holds it"""
+    handle = open(directory / LOCK_NAME, "a")
+    if fcntl is None:
+        return handle
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+def _fold(entries):
+    """Split journal entries into ``(docs, ops)``: updates and deletes of a document
+    inserted earlier in the same segment are applied to it, the rest stay operations
+    on documents from earlier segments"""
+    docs, ops = OrderedDict(), []
+    for entry in entries:
+        key = str(entry["_id"])
+        if "_op" not in entry:
+            docs[key] = entry
+        elif key not in docs:
+            ops.append(entry)
+        elif entry["_op"] == "delete":
+            del docs[key]
+        else:
+            docs[key] = {**docs[key], **entry["fields"]}
+    return list(docs.values()), ops
+
+
+class SessionWriter:
+    """Write-behind buffer for session inserts.
+
+    ``add`` gives the document its ``_id``, appends it to a local journal segment and
+    returns at once; a background thread writes buffered documents with one ``insert_many``
+    when ``batch_size`` of them are waiting or ``flush_interval`` seconds have passed. A
+    segment file is deleted only after its batch is in Mongo, so if Mongo is slow or down the
+    journal holds the sessions (and is replayed at startup after a crash). Replays are
+    idempotent: duplicate-key errors from an already inserted ``_id`` count as success.
+
+    ``update`` and ``delete`` of a still-buffered session go through the journal as well:
+    folded into the document while it sits in the open segment, otherwise journaled as an
+    operation applied right after the batch it arrived with, so a change never races the
+    insert it depends on. A session stays readable from the buffer until every change to it
+    is in Mongo.
+
+    Every process journals into its own locked subdirectory of ``journal_dir``, claimed on
+    first use (so after a fork, not before), and ``start`` only replays the directories of
+    processes that are gone; several workers can share one ``journal_dir``.
+    """
+
+    def __init__(self, collection, journal_dir, batch_size=100, flush_interval=0.25, max_backoff=30.0):
+        self.collection = collection
+        self.root = Path(journal_dir)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.journal_dir = None
+        self._owner = None
+        self._lock_handle = None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.inserted = 0
+        self.applied = 0
+        self.batches = 0
+        self.errors = 0
+        self.recovered = 0
+        self.last_error = None
+        self._backoff = 0.0
+        self._pending = OrderedDict()  # id -> doc, still in the open segment
+        self._pending_ops = []  # updates/deletes of earlier segments' docs, in the open segment
+        self._unflushed = {}  # id -> doc (None once deleted), cut into a batch but not yet in Mongo
+        self._batches = deque()  # (segment path, docs, ops) in journal order
+        self._segment = None
+        self._segment_path = None
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+
+    def start(self):
+        self._recover()
+        self._thread.start()
+        return self
+
+    def _own_dir(self):
+        """This process's journal directory (lock held by the caller)"""
+        if self._owner != os.getpid():
+            self._owner = os.getpid()
+            self.journal_dir = self.root / f"{os.getpid()}-{time.time_ns()}"
+            self.journal_dir.mkdir()
+            self._lock_handle = _try_lock(self.journal_dir)
+        return self.journal_dir
+
+    def _orphaned_dirs(self):
+        """(directory, lock) for journals whose process has exited; loose segments in the
+        root (the layout before per-process directories) count as one more"""
+        yield self.root, None
+        for directory in sorted(p for p in self.root.iterdir() if p.is_dir() and p != self.journal_dir):
+            lock = _try_lock(directory)
+            if lock is not None:
+                yield directory, lock
+
+    def _recover(self):
+        """Queue segments left behind by exited processes; they were never confirmed"""
+        with self._lock:
+            own = self._own_dir()
+            for directory, lock in self._orphaned_dirs():
+                for path in sorted(directory.glob("*.jsonl")):
+                    entries = []
+                    for line in path.read_text(encoding="utf-8").splitlines():
+                        try:
+                            entries.append(json_util.loads(line))
+                        except ValueError:
+                            continue  # torn final line from a crash mid-write
+                    docs, ops = _fold(entries)
+                    claimed = own / f"recovered-{directory.name}-{path.name}"
+                    os.replace(path, claimed)
+                    self._batches.append((claimed, docs, ops))
+                    self._unflushed.update((str(doc["_id"]), doc) for doc in docs)
+                    self.recovered += len(docs)
+                if lock is not None:
+                    lock.close()
+                    shutil.rmtree(directory, ignore_errors=True)
+        if self.recovered:
+            print(f"Recovered {self.recovered} unflushed sessions from {self.root}")
+
+    def _append(self, entry):
+        """Journal one entry in the open segment (lock held)"""
+        if self._segment is None:
+            self._segment_path = self._own_dir() / f"{time.time_ns()}.jsonl"
+            self._segment = open(self._segment_path, "a", encoding="utf-8")
+        self._segment.write(json_util.dumps(entry) + "\n")
+        self._segment.flush()
+
+    def add(self, doc):
+        doc.setdefault("_id", ObjectId())
+        with self._lock:
+            self._append(doc)
+            self._pending[str(doc["_id"])] = doc
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+        return str(doc["_id"])
+
+    def _change(self, session_id, op, fields=None):
+        """Journal an update/delete of a buffered session; False if it isn't buffered"""
+        with self._lock:
+            if session_id in self._pending:
+                target = self._pending
+            elif session_id in self._unflushed and self._unflushed[session_id] is not None:
+                target = self._unflushed
+            else:
+                return False
+            entry = {"_op": op, "_id": ObjectId(session_id)}
+            if op == "set":
+                entry["fields"] = fields
+            self._append(entry)
+            if target is self._pending:
+                if op == "delete":
+                    del self._pending[session_id]
+                else:
+                    # a new dict, never mutated in place: a flush may be serializing the old one
+                    self._pending[session_id] = {**self._pending[session_id], **fields}
+            else:
+                self._pending_ops.append(entry)
+                self._unflushed[session_id] = None if op == "delete" else {**self._unflushed[session_id], **fields}
+                self._wake.set()
+            return True
+
+    def update(self, session_id, fields):
+        return self._change(session_id, "set", fields)
+
+    def delete(self, session_id):
+        return self._change(session_id, "delete")
+
+    def _cut(self):
+        """Close the open segment and turn its entries into a batch (lock held)"""
+        if self._segment is None:
+            return
+        self._segment.close()
+        self._batches.append((self._segment_path, list(self._pending.values()), self._pending_ops))
+        self._unflushed.update(self._pending)
+        self._pending.clear()
+        self._pending_ops = []
+        self._segment = self._segment_path = None
+
+    def _insert(self, docs):
+        try:
+            with span("mongo_insert_many"):
+                self.collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            details = e.details or {}
+            if details.get("writeConcernErrors") or any(err.get("code") != DUPLICATE_KEY for err in details.get("writeErrors", [])):
+                raise
+
+    def _apply(self, op):
+        if op["_op"] == "delete":
+            self.collection.delete_one({"_id": op["_id"]})
+        else:
+            self.collection.update_one({"_id": op["_id"]}, {"$set": op["fields"]})
+
+    def _settled(self, ids):
+        """Of ``ids``, those with no change still waiting in a later batch (lock held)"""
+        waiting = {str(op["_id"]) for _, _, ops in self._batches for op in ops}
+        waiting.update(str(op["_id"]) for op in self._pending_ops)
+        return [key for key in ids if key not in waiting and key not in self._pending]
+
+    def flush(self):
+        """Write every buffered session and change now; returns False if Mongo refused a batch"""
+        with self._flush_lock:
+            with self._lock:
+                self._cut()
+                batches = list(self._batches)
+            for path, docs, ops in batches:
+                try:
+                    if docs:
+                        self._insert(docs)
+                    for op in ops:  # idempotent, so a retried batch may apply them again
+                        self._apply(op)
+                except Exception as e:
+                    with self._lock:
+                        self.errors += 1
+                        self.last_error = str(e)
+                    self._backoff = min(self.max_backoff, max(self.flush_interval, self._backoff * 2))
+                    print(f"Error flushing {len(docs)} sessions and {len(ops)} changes (kept in {path.name}): {e}")
+                    return False
+                path.unlink(missing_ok=True)
+                with self._lock:
+                    self._batches.popleft()
+                    for key in self._settled({str(entry["_id"]) for entry in docs + ops}):
+                        self._unflushed.pop(key, None)
+                    self.inserted += len(docs)
+                    self.applied += len(ops)
+                    self.batches += 1
+                    self._flushed.notify_all()
+            self._backoff = 0.0
+            return True
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=self._backoff or self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _buffered(self, session_id):
+        return session_id in self._pending or session_id in self._unflushed
+
+    def get(self, session_id):
+        """``(True, doc)`` for a session that is still buffered (doc None if it was deleted),
+        ``(False, None)`` otherwise, so a writer can read its own writes"""
+        with self._lock:
+            if session_id in self._pending:
+                return True, dict(self._pending[session_id])
+            if session_id in self._unflushed:
+                doc = self._unflushed[session_id]
+                return True, dict(doc) if doc is not None else None
+            return False, None
+
+    def wait_flushed(self, session_id, timeout=10.0):
+        """Block until a buffered session and its changes are in Mongo; True if they are
+        (or it never was buffered)"""
+        with self._lock:
+            if not self._buffered(session_id):
+                return True
+            self._wake.set()
+            return self._flushed.wait_for(lambda: not self._buffered(session_id), timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "buffered": len(self._pending) + len(self._unflushed),
+                "pending_changes": len(self._pending_ops) + sum(len(ops) for _, _, ops in self._batches),
+                "journal_segments": len(self._batches) + (1 if self._segment else 0),
+                "inserted": self.inserted,
+                "changes_applied": self.applied,
+                "batches": self.batches,
+                "avg_batch": round(self.inserted / self.batches, 2) if self.batches else 0.0,
+                "errors": self.errors,
+                "recovered": self.recovered,
+                "last_error": self.last_error,
+            }
@@ -0,0 +1,118 @@
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+from pymongo.errors import OperationFailure
+
+from cache_utils import TTLCache, normalize_query
+
+
+def solution_key(context, model, prompt_version=""):
+    """Content address for a final solution: normalized follow-up context + model + prompt template"""
+    digest = hashlib.sha256()
+    for part in (prompt_version, model, normalize_query(context)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SolutionCache:
+    """Two-tier cache of final diagnoses: an in-process LRU in front of an optional
+    MongoDB collection whose documents expire through a TTL index"""
+
+    def __init__(self, maxsize=1024, ttl=7 * 24 * 3600, collection=None, prompt_version=""):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.collection = collection
+        self.ttl = ttl
+        self.prompt_version = prompt_version
+        self.mongo_hits = 0
+        self.mongo_misses = 0
+        self.mongo_errors = 0
+        self._indexed = False
+        self._lock = threading.Lock()
+
+    def key(self, context, model):
+        return solution_key(context, model, self.prompt_version)
+
+    def _ensure_index(self):
+        """TTL index on created_at; a changed SOLUTION_CACHE_TTL is applied to the existing index in place"""
+        if self._indexed:
+            return
+        try:
+            self.collection.create_index("created_at", name="created_at_1", expireAfterSeconds=int(self.ttl))
+        except OperationFailure:
+            self.collection.database.command({
+                "collMod": self.collection.name,
+                "index": {"name": "created_at_1", "expireAfterSeconds": int(self.ttl)},
+            })
+        self._indexed = True
+
+    def get(self, context, model):
+        key = self.key(context, model)
+        solution = self.memory.get(key)
+        if solution is not None or self.collection is None:
+            return solution
+
+        try:
+            self._ensure_index()
+            doc = self.collection.find_one({"_id": key}, {"solution": 1})
+        except Exception as e:
+            print(f"Solution cache lookup failed: {e}")
+            with self._lock:
+                self.mongo_errors += 1
+            return None
+
+        with self._lock:
+            if doc is None or not (doc.get("solution") or "").strip():
+                self.mongo_misses += 1
+                return None
+            self.mongo_hits += 1
+        self.memory.set(key, doc["solution"])
+        return doc["solution"]
+
+    def set(self, context, model, solution):
+        if not solution or not solution.strip():
+            return  # an empty completion is a failed answer, not one worth serving again
+        key = self.key(context, model)
+        self.memory.set(key, solution)
+        if self.collection is None:
+            return
+        try:
+            self._ensure_index()
+            self.collection.replace_one(
+                {"_id": key},
+                {"_id": key, "model": model, "solution": solution, "created_at": datetime.now(timezone.utc)},
+                upsert=True,
+            )
+        except Exception as e:
+            print(f"Solution cache write failed: {e}")
+            with self._lock:
+                self.mongo_errors += 1
+
+    def invalidate(self):
+        """Drop every cached solution, e.g. after the prompt template changes"""
+        self.memory.clear()
+        removed = 0
+        if self.collection is not None:
+            try:
+                removed = self.collection.delete_many({}).deleted_count
+            except Exception as e:
+                print(f"Solution cache invalidation failed: {e}")
+                with self._lock:
+                    self.mongo_errors += 1
+        return removed
+
+    def stats(self):
+        stats = {"memory": self.memory.stats(), "prompt_version": self.prompt_version}
+        with self._lock:
+            if self.collection is not None:
+                total = self.mongo_hits + self.mongo_misses
+                stats["mongo"] = {
+                    "hits": self.mongo_hits,
+                    "misses": self.mongo_misses,
+                    "errors": self.mongo_errors,
+                    "hit_rate": round(self.mongo_hits / total, 4) if total else 0.0,
+                }
+            lookups = self.memory.hits + self.memory.misses
+            stats["hit_rate"] = round((self.memory.hits + self.mongo_hits) / lookups, 4) if lookups else 0.0
+        return stats
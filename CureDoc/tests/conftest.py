@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+ADMIN_TOKEN = "test-admin-token"
+
+
+@pytest.fixture(scope="session")
+def fake_ollama():
+    from fake_ollama import FakeOllama
+    fake = FakeOllama(latency=0.05, jitter=0).start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture(scope="session")
+def curebot(tmp_path_factory, fake_ollama):
+    """app.py imported once, from a scratch directory, with sessions in mongomock and
+    LLaVA served by the fake Ollama"""
+    import mongomock
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp("curebot"))  # the app keeps its files under the cwd
+        for key, value in {
+            "OLLAMA_HOST": fake_ollama.url,
+            "ADMIN_TOKEN": ADMIN_TOKEN,
+            "RETENTION_SWEEP_INTERVAL": "0",
+            "MONGO_SERVER_SELECTION_TIMEOUT_MS": "200",
+        }.items():
+            patch.setenv(key, value)
+        import app
+        collection = mongomock.MongoClient()["curebot"]["sessions"]
+        app.sessions.collection = collection
+        if app.session_writer is not None:
+            app.session_writer.collection = collection
+        app.sessions.ensure_indexes()
+        yield app
+        app.stop_background_work()
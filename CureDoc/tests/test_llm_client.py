@@ -0,0 +1,123 @@
+"""LLMClient retries and circuit breaker against the local fake OpenRouter."""
+import time
+
+import pytest
+import requests
+
+from fake_openrouter import FakeOpenRouter
+from llm_client import CircuitOpenError, LLMClient, LLMError
+
+MODEL = "test-model"
+
+
+@pytest.fixture
+def fake():
+    fake = FakeOpenRouter(latency=0, jitter=0, token_delay=0).start()
+    yield fake
+    fake.stop()
+
+
+def make_client(fake, **kwargs):
+    options = dict(max_retries=2, backoff=0.01, max_backoff=0.05, breaker_threshold=2, breaker_cooldown=0.2)
+    options.update(kwargs)
+    return LLMClient(fake.url, "test-key", **options)
+
+
+def test_retries_transient_failures(fake):
+    client = make_client(fake)
+    fake.fail_next = 2
+    assert client.chat(MODEL, "hello") == "This is commonly caused by stress, dehydration or lack of sleep."
+    assert fake.requests == 3
+    assert client.breaker.state == "closed"
+
+
+def test_honours_retry_after_as_minimum_delay(fake):
+    client = make_client(fake, max_retries=1)
+    fake.fail_next, fake.fail_status, fake.retry_after = 1, 429, 1
+    started = time.monotonic()
+    client.chat(MODEL, "hello")
+    assert time.monotonic() - started >= 1.0
+
+
+def test_gives_up_when_retry_after_exceeds_limit(fake):
+    client = make_client(fake, max_retries=2, max_retry_after=5)
+    fake.fail_next, fake.fail_status, fake.retry_after = 1, 429, 60
+    with pytest.raises(LLMError):
+        client.chat(MODEL, "hello")
+    assert fake.requests == 1
+
+
+def test_client_errors_are_not_retried(fake):
+    client = make_client(fake)
+    fake.fail_next, fake.fail_status = 1, 400
+    with pytest.raises(LLMError):
+        client.chat(MODEL, "hello")
+    assert fake.requests == 1
+    assert client.breaker.state == "closed"
+
+
+def test_breaker_opens_after_threshold_and_fails_fast(fake):
+    client = make_client(fake, max_retries=0)
+    fake.fail_next = 2
+    for _ in range(2):
+        with pytest.raises(LLMError):
+            client.chat(MODEL, "hello")
+    assert client.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        client.chat(MODEL, "hello")
+    assert fake.requests == 2
+
+
+def test_half_open_trial_failure_reopens(fake):
+    client = make_client(fake, max_retries=0)
+    fake.fail_next = 3
+    for _ in range(2):
+        with pytest.raises(LLMError):
+            client.chat(MODEL, "hello")
+    time.sleep(0.25)
+    assert client.breaker.state == "half-open"
+    with pytest.raises(LLMError):
+        client.chat(MODEL, "hello")
+    assert client.breaker.state == "open"
+
+
+def test_half_open_trial_success_closes(fake):
+    client = make_client(fake, max_retries=0)
+    fake.fail_next = 2
+    for _ in range(2):
+        with pytest.raises(LLMError):
+            client.chat(MODEL, "hello")
+    time.sleep(0.25)
+    assert client.breaker.state == "half-open"
+    assert client.chat(MODEL, "hello")
+    assert client.breaker.state == "closed"
+    assert client.chat(MODEL, "hello")
+
+
+@pytest.mark.parametrize("error", [requests.exceptions.ChunkedEncodingError, requests.TooManyRedirects])
+def test_other_request_errors_release_half_open_trial(fake, monkeypatch, error):
+    client = make_client(fake, max_retries=0)
+    fake.fail_next = 2
+    for _ in range(2):
+        with pytest.raises(LLMError):
+            client.chat(MODEL, "hello")
+    time.sleep(0.25)
+
+    def broken_post(*args, **kwargs):
+        raise error("boom")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(client.session, "post", broken_post)
+        with pytest.raises(LLMError):
+            client.chat(MODEL, "hello")
+    assert client.breaker.state == "open"
+    time.sleep(0.25)
+    assert client.chat(MODEL, "hello")
+    assert client.breaker.state == "closed"
+
+
+def test_stream_chat_after_retry(fake):
+    client = make_client(fake)
+    fake.fail_next = 1
+    text = "".join(client.stream_chat(MODEL, "hello"))
+    assert text == "This is commonly caused by stress, dehydration or lack of sleep."
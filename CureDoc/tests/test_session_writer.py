@@ -0,0 +1,159 @@
+"""SessionWriter journaling, buffered updates/deletes, flush retries and crash replay, on mongomock."""
+import mongomock
+import pytest
+from bson import ObjectId
+from pymongo.errors import ServerSelectionTimeoutError
+
+from session_repo import SessionRepository
+from session_writer import SessionWriter
+
+
+class FlakyCollection:
+    """A mongomock collection whose writes fail while ``down`` is set"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.down = False
+
+    def __getattr__(self, name):
+        attr = getattr(self.collection, name)
+        if name in ("insert_many", "update_one", "delete_one"):
+            def write(*args, **kwargs):
+                if self.down:
+                    raise ServerSelectionTimeoutError("mongod is down")
+                return attr(*args, **kwargs)
+            return write
+        return attr
+
+
+@pytest.fixture
+def collection():
+    return FlakyCollection(mongomock.MongoClient()["curebot"]["sessions"])
+
+
+@pytest.fixture
+def writer(collection, tmp_path):
+    # not started: tests flush explicitly, so nothing races them
+    return SessionWriter(collection, tmp_path / "journal", batch_size=100, flush_interval=3600)
+
+
+def find(collection, session_id):
+    return collection.find_one({"_id": ObjectId(session_id)})
+
+
+def test_insert_is_buffered_until_flush(writer, collection):
+    session_id = writer.add({"query": "headache"})
+    assert find(collection, session_id) is None
+    assert writer.get(session_id) == (True, {"_id": ObjectId(session_id), "query": "headache"})
+
+    assert writer.flush()
+    assert find(collection, session_id)["query"] == "headache"
+    assert writer.get(session_id) == (False, None)
+    assert not list(writer.journal_dir.glob("*.jsonl"))
+
+
+def test_update_and_delete_of_buffered_session(writer, collection):
+    kept = writer.add({"query": "kept", "analysis_status": "queued"})
+    dropped = writer.add({"query": "dropped"})
+    assert writer.update(kept, {"analysis_status": "done"})
+    assert writer.delete(dropped)
+    assert writer.get(kept)[1]["analysis_status"] == "done"
+    assert writer.get(dropped) == (False, None)
+
+    assert writer.flush()
+    assert find(collection, kept)["analysis_status"] == "done"
+    assert find(collection, dropped) is None
+    assert writer.stats()["inserted"] == 1
+
+
+def test_change_of_unbuffered_session_is_not_taken(writer):
+    assert not writer.update(str(ObjectId()), {"analysis_status": "done"})
+    assert not writer.delete(str(ObjectId()))
+
+
+def test_flush_failure_keeps_journal_and_retries(writer, collection):
+    session_id = writer.add({"query": "headache", "analysis_status": "queued"})
+    collection.down = True
+    assert not writer.flush()
+    assert writer.stats()["errors"] == 1
+    assert len(list(writer.journal_dir.glob("*.jsonl"))) == 1
+
+    # changes to a session already cut into the failed batch are journaled behind it
+    assert writer.update(session_id, {"analysis_status": "running"})
+    assert writer.update(session_id, {"analysis_status": "done"})
+    assert writer.get(session_id)[1]["analysis_status"] == "done"
+    assert not writer.flush()
+
+    collection.down = False
+    assert writer.flush()
+    assert find(collection, session_id)["analysis_status"] == "done"
+    assert writer.get(session_id) == (False, None)
+    assert not list(writer.journal_dir.glob("*.jsonl"))
+    stats = writer.stats()
+    assert (stats["inserted"], stats["changes_applied"], stats["buffered"]) == (1, 2, 0)
+
+
+def test_delete_behind_failed_batch(writer, collection):
+    session_id = writer.add({"query": "rejected upload"})
+    collection.down = True
+    writer.flush()
+    assert writer.delete(session_id)
+    assert writer.get(session_id) == (True, None)
+
+    collection.down = False
+    assert writer.flush()
+    assert find(collection, session_id) is None
+    assert writer.get(session_id) == (False, None)
+
+
+def test_replays_journal_of_exited_process(collection, tmp_path):
+    journal = tmp_path / "journal"
+    crashed = SessionWriter(collection, journal, flush_interval=3600)
+    inserted = crashed.add({"query": "already in mongo"})
+    updated = crashed.add({"query": "updated", "analysis_status": "queued"})
+    crashed.update(updated, {"analysis_status": "done"})
+    deleted = crashed.add({"query": "deleted"})
+    crashed.delete(deleted)
+    # the crash happened after this one's insert reached Mongo, before its segment was removed
+    collection.insert_one({"_id": ObjectId(inserted), "query": "already in mongo"})
+    crashed._segment.close()
+    crashed._lock_handle.close()  # the process is gone, so is its lock
+    crashed_dir = crashed.journal_dir
+
+    successor = SessionWriter(collection, journal, flush_interval=3600)
+    successor.start()
+    assert successor.stats()["recovered"] == 2
+    assert successor.flush()  # the duplicate key of the already inserted session is fine
+    assert find(collection, updated)["analysis_status"] == "done"
+    assert find(collection, deleted) is None
+    assert collection.count_documents({"_id": ObjectId(inserted)}) == 1
+    assert not crashed_dir.exists()
+    assert successor.stats()["errors"] == 0
+
+
+def test_live_process_journal_is_left_alone(collection, tmp_path):
+    journal = tmp_path / "journal"
+    sibling = SessionWriter(collection, journal, flush_interval=3600)
+    session_id = sibling.add({"query": "still buffered by a live worker"})
+
+    other = SessionWriter(collection, journal, flush_interval=3600)
+    other.start()
+    assert other.stats()["recovered"] == 0
+    assert sibling.journal_dir.exists()
+    assert find(collection, session_id) is None
+    assert sibling.flush()
+    assert find(collection, session_id) is not None
+
+
+def test_repository_routes_changes_through_writer(writer, collection):
+    repo = SessionRepository(collection, writer=writer)
+    session_id = repo.insert({"query": "headache", "timestamp": "2026-10-17T10:00:00", "analysis_status": "queued"})
+    repo.update(session_id, {"analysis_status": "done"})
+    assert repo.get(session_id, {"analysis_status": 1}) == {"_id": ObjectId(session_id), "analysis_status": "done"}
+    assert writer.flush()
+
+    # no longer buffered: changes and reads go to Mongo
+    repo.update(session_id, {"image_analysis": "normal"})
+    assert repo.get(session_id)["image_analysis"] == "normal"
+    repo.delete(session_id)
+    assert repo.get(session_id) is None
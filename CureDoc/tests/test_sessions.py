@@ -0,0 +1,99 @@
+"""/sessions history: patient scoping, the admin token and keyset pagination, on mongomock."""
+import uuid
+
+import pytest
+
+from conftest import ADMIN_TOKEN
+
+
+@pytest.fixture
+def client(curebot):
+    return curebot.app.test_client()
+
+
+@pytest.fixture
+def patient(curebot):
+    """A fresh patient id with five sessions (newest last) plus one for another patient"""
+    patient_id = f"patient-{uuid.uuid4().hex[:8]}"
+    ids = [curebot.sessions.insert({"timestamp": f"2026-10-17T10:00:0{i}", "query": f"visit {i}",
+                                    "patient_id": patient_id, "final_solution": "long LLM text"})
+           for i in range(5)]
+    curebot.sessions.insert({"timestamp": "2026-10-17T10:00:09", "query": "someone else", "patient_id": f"{patient_id}-other"})
+    if curebot.session_writer is not None:
+        curebot.session_writer.flush()  # history reads Mongo, not the write-behind buffer
+    return patient_id, ids
+
+
+def pages(client, patient_id, limit):
+    cursor, seen = None, []
+    while True:
+        params = {"patient_id": patient_id, "limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/sessions", query_string=params)
+        assert response.status_code == 200
+        body = response.get_json()
+        seen.append(body["sessions"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return seen
+
+
+def test_pages_are_newest_first_and_complete(client, patient):
+    patient_id, ids = patient
+    seen = pages(client, patient_id, limit=2)
+    assert [len(page) for page in seen] == [2, 2, 1]
+    assert [item["session_id"] for page in seen for item in page] == ids[::-1]
+
+
+def test_exact_page_has_no_next_cursor(client, patient):
+    patient_id, ids = patient
+    body = client.get("/sessions", query_string={"patient_id": patient_id, "limit": 5}).get_json()
+    assert len(body["sessions"]) == 5
+    assert body["next_cursor"] is None
+
+
+def test_items_are_summaries(client, patient):
+    patient_id, ids = patient
+    item = client.get("/sessions", query_string={"patient_id": patient_id, "limit": 1}).get_json()["sessions"][0]
+    assert item["session_id"] == ids[-1]
+    assert item["patient_id"] == patient_id
+    assert item["pdf_download"] == f"/download/pdf/{ids[-1]}"
+    assert "final_solution" not in item
+
+
+def test_scoped_to_patient(client, patient):
+    patient_id, _ = patient
+    items = [item for page in pages(client, patient_id, limit=10) for item in page]
+    assert {item["patient_id"] for item in items} == {patient_id}
+
+
+def test_unscoped_listing_needs_admin_token(client, patient):
+    assert client.get("/sessions").status_code == 403
+    assert client.get("/sessions", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+    response = client.get("/sessions", query_string={"limit": 100}, headers={"X-Admin-Token": ADMIN_TOKEN})
+    assert response.status_code == 200
+    patients = {item.get("patient_id") for item in response.get_json()["sessions"]}
+    assert {patient[0], f"{patient[0]}-other"} <= patients
+
+
+def test_invalid_cursor_is_rejected(client, patient):
+    response = client.get("/sessions", query_string={"patient_id": patient[0], "cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_limit_is_clamped(client, curebot, patient):
+    patient_id, ids = patient
+    body = client.get("/sessions", query_string={"patient_id": patient_id, "limit": 0}).get_json()
+    assert len(body["sessions"]) == 1
+    body = client.get("/sessions", query_string={"patient_id": patient_id, "limit": 10 ** 6}).get_json()
+    assert len(body["sessions"]) == min(5, curebot.HISTORY_MAX_PAGE_SIZE)
+
+
+def test_equal_timestamps_are_paged_by_id(client, curebot):
+    patient_id = f"patient-{uuid.uuid4().hex[:8]}"
+    ids = [curebot.sessions.insert({"timestamp": "2026-10-17T11:00:00", "query": "same second", "patient_id": patient_id})
+           for _ in range(3)]
+    if curebot.session_writer is not None:
+        curebot.session_writer.flush()
+    seen = pages(client, patient_id, limit=1)
+    assert [item["session_id"] for page in seen for item in page] == sorted(ids, reverse=True)
@@ -0,0 +1,113 @@
+"""/upload as a background LLaVA job against the fake Ollama, and reconciling jobs lost to a restart."""
+import time
+from datetime import datetime, timedelta
+from io import BytesIO
+
+import numpy as np
+import pytest
+from bson import ObjectId
+from PIL import Image
+
+from fake_ollama import REPORT
+
+
+def scan(seed, size=128):
+    """A distinct PNG per seed, so the content-addressed analysis cache doesn't answer"""
+    pixels = (np.random.default_rng(seed).random((size, size, 3)) * 255).astype(np.uint8)
+    out = BytesIO()
+    Image.fromarray(pixels).save(out, "PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def client(curebot):
+    return curebot.app.test_client()
+
+
+def upload(client, seed, **form):
+    return client.post("/upload", data={"image": (BytesIO(scan(seed)), f"scan{seed}.png"), **form},
+                       content_type="multipart/form-data")
+
+
+def poll(client, status_url, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.get(status_url)
+        assert response.status_code == 200, response.get_json()
+        status = response.get_json()
+        if status["status"] in ("done", "failed"):
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"{status_url} still {status['status']} after {timeout}s")
+
+
+def test_upload_is_analysed_in_background(client, curebot):
+    response = upload(client, 1, query="Chest X-ray")
+    assert response.status_code == 202
+    queued = response.get_json()
+    assert queued["status"] == "queued"
+    assert queued["status_url"] == f"/upload/{queued['session_id']}/status"
+
+    status = poll(client, queued["status_url"])
+    assert status["status"] == "done"
+    assert status["result"] == REPORT
+    assert status["pdf_download"] == f"/download/pdf/{queued['session_id']}"
+
+    session = curebot.sessions.get(queued["session_id"])
+    assert (session["analysis_status"], session["image_analysis"], session["query"]) == ("done", REPORT, "Chest X-ray")
+
+
+def test_identical_upload_reuses_analysis(client, fake_ollama):
+    poll(client, upload(client, 2).get_json()["status_url"])
+    requests = fake_ollama.requests
+
+    response = upload(client, 2)
+    assert response.status_code == 200
+    assert (response.get_json()["status"], response.get_json()["result"]) == ("done", REPORT)
+    assert fake_ollama.requests == requests
+
+
+def test_ollama_failure_marks_analysis_failed(client, fake_ollama):
+    fake_ollama.fail_next = 1
+    status = poll(client, upload(client, 3).get_json()["status_url"])
+    assert status["status"] == "failed"
+    assert status["result"].startswith("Analysis error")
+
+
+def test_unknown_and_invalid_sessions(client):
+    assert client.get("/upload/not-an-id/status").status_code == 400
+    old = ObjectId.from_datetime(datetime(2020, 1, 1))  # minted long ago: no insert grace
+    assert client.get(f"/upload/{old}/status").status_code == 404
+
+
+def test_stale_analysis_is_queued_again(client, curebot):
+    """A job left "running" by a crashed worker is picked up by the next status poll"""
+    image = curebot.image_store.put(scan(4), "scan4.png")
+    stale = curebot.utcnow() - timedelta(seconds=curebot.ANALYSIS_STALE_AFTER + 60)
+    session_id = curebot.sessions.collection.insert_one({
+        "timestamp": stale.isoformat(),
+        "query": "Image analysis",
+        "image_path": str(image["path"]),
+        "image_sha256": image["sha256"],
+        "analysis_status": "running",
+        "analysis_updated_at": stale,
+        "created_at": stale,
+    }).inserted_id
+
+    status = poll(client, f"/upload/{session_id}/status")
+    assert (status["status"], status["result"]) == ("done", REPORT)
+
+
+def test_stale_analysis_without_image_fails(client, curebot):
+    stale = curebot.utcnow() - timedelta(seconds=curebot.ANALYSIS_STALE_AFTER + 60)
+    session_id = curebot.sessions.collection.insert_one({
+        "timestamp": stale.isoformat(),
+        "image_path": "medical_images/gone.png",
+        "analysis_status": "queued",
+        "analysis_updated_at": stale,
+        "created_at": stale,
+    }).inserted_id
+
+    status = poll(client, f"/upload/{session_id}/status")
+    assert status["status"] == "failed"
+    assert "upload the image again" in status["result"]
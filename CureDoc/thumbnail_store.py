@@ -0,0 +1,107 @@
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+class ThumbnailStore:
+    """On-disk JPEG thumbnails keyed on the SHA-256 of the upload they were made from.
+
+    Kept on disk rather than in memory so every worker of a pre-fork server can answer
+    ``/thumbnails/<key>.jpg``, whichever one classified the upload. Files are written to a
+    temp file and renamed into place; a hit bumps the atime, which drives the age and size
+    based eviction (run at most every ``evict_interval`` seconds).
+    """
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024, max_age=3600, evict_interval=60.0):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.evict_interval = evict_interval
+        self.hits = 0
+        self.misses = 0
+        self._last_evict = 0.0
+
+    def path_for(self, key):
+        """File for ``key``, or None if it isn't a SHA-256 hex digest (keys come from URLs)"""
+        if not KEY_PATTERN.fullmatch(key):
+            return None
+        return self.directory / f"{key}.jpg"
+
+    def get(self, key):
+        """Path of a stored thumbnail, or None"""
+        path = self.path_for(key)
+        try:
+            stat = path.stat() if path else None
+            if stat is None or time.time() - stat.st_mtime > self.max_age:
+                self.misses += 1
+                return None
+            os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def put(self, key, encode):
+        """Store ``encode()`` under ``key`` unless it is already there"""
+        if self.get(key) is not None:
+            return
+        data = encode()
+        if data is None:
+            return
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, prefix=f".{key[:16]}_", suffix=".jpg.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, self.path_for(key))
+        finally:
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+        if time.monotonic() - self._last_evict > self.evict_interval:
+            self._last_evict = time.monotonic()
+            self.evict()
+
+    def evict(self):
+        """Remove thumbnails older than ``max_age``, then least recently used ones until the
+        store fits in ``max_bytes``. Returns the number of bytes reclaimed."""
+        now = time.time()
+        reclaimed = 0
+        entries = []
+        for path in self.directory.iterdir():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            is_tmp = path.name.endswith(".tmp")
+            if (is_tmp and now - stat.st_mtime > 3600) or (not is_tmp and now - stat.st_mtime > self.max_age):
+                path.unlink(missing_ok=True)
+                reclaimed += stat.st_size
+            elif not is_tmp:
+                entries.append((stat.st_atime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            reclaimed += size
+        return reclaimed
+
+    def stats(self):
+        files = list(self.directory.glob("*.jpg"))
+        lookups = self.hits + self.misses
+        return {
+            "files": len(files),
+            "bytes": sum(f.stat().st_size for f in files if f.exists()),
+            "max_bytes": self.max_bytes,
+            "max_age": self.max_age,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,44 @@
+"""Train the NeuroScan SVM and publish it as a versioned model artifact.
+
+    python train_neuroscan.py                  # train on dataset/, activate the result
+    python train_neuroscan.py --mode pca-nystroem  # faster approximate classifier
+    python train_neuroscan.py --mode sgd-rff   # updatable from /feedback (NEUROSCAN_INCREMENTAL=1)
+    python train_neuroscan.py --no-activate    # write the artifact but keep serving the old one
+    python train_neuroscan.py --activate 20261017-101500-1a2b3c4d
+
+Running servers pick up a newly activated artifact without restarting.
+"""
+import argparse
+import json
+import sys
+
+from model_store import ModelStore
+from neuroscan import CLASSIFIER_MODES, DATASET_PATH, MODEL_MODE, PREPROCESSING, dataset_fingerprint, train_and_evaluate
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train and publish the NeuroScan model")
+    parser.add_argument("--dataset", default=DATASET_PATH, help="dataset root with no_tumor/ and tumor/")
+    parser.add_argument("--models-dir", default="models", help="model artifact directory")
+    parser.add_argument("--mode", choices=CLASSIFIER_MODES, default=MODEL_MODE, help="classifier to train")
+    parser.add_argument("--no-activate", action="store_true", help="do not point CURRENT at the new artifact")
+    parser.add_argument("--activate", metavar="VERSION", help="activate an existing artifact and exit")
+    args = parser.parse_args(argv)
+
+    store = ModelStore(args.models_dir)
+    if args.activate:
+        store.activate(args.activate)
+        print(f"Activated {args.activate}")
+        return 0
+
+    fingerprint = dataset_fingerprint(args.dataset)
+    model, metrics = train_and_evaluate(args.dataset, args.mode)
+    if metrics["mock_data"]:
+        print("Refusing to publish a model trained on mock data.", file=sys.stderr)
+        return 1
+
+    version = store.save(model, PREPROCESSING, metrics, fingerprint, activate=not args.no_activate)
+    print(json.dumps({"version": version, "metrics": metrics}, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
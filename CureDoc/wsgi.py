@@ -0,0 +1,199 @@
+"""Production entry point: CureBot at / and NeuroScan under NEUROSCAN_MOUNT, in one WSGI app.
+
+    gunicorn --workers 4 --threads 8 --preload --bind 0.0.0.0:8000 wsgi:application
+    python wsgi.py --workers 4 --threads 8 --preload        # same, configured here
+
+``python wsgi.py`` runs gunicorn (gthread workers) when it is installed and otherwise a
+small built-in pre-fork server. Importing the apps is cheap: neither starts threads, opens
+a Mongo connection or loads a model at import. With ``--preload`` the master also imports
+ReportLab, OpenCV, scikit-learn and the Ollama client and loads the NeuroScan model before
+forking, so workers share those pages copy-on-write and are ready as soon as they start;
+without it each worker loads the model in the background. Every worker starts its own
+background threads after the fork.
+
+Probes: /healthz (process is up) and /readyz for CureBot; /neuroscan/healthz and
+/neuroscan/readyz (503 until a model is live) for NeuroScan.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+from werkzeug.serving import BaseWSGIServer
+
+import app as curebot
+import server as neuroscan
+
+NEUROSCAN_MOUNT = os.environ.get("NEUROSCAN_MOUNT", "/neuroscan")
+application = DispatcherMiddleware(curebot.app, {NEUROSCAN_MOUNT: neuroscan.app})
+
+HOST = os.environ.get("HOST", "0.0.0.0")
+PORT = int(os.environ.get("PORT", 8000))
+WORKERS = int(os.environ.get("WEB_WORKERS", 2))
+THREADS = int(os.environ.get("WEB_THREADS", 8))
+PRELOAD = os.environ.get("WEB_PRELOAD", "0") == "1"
+TIMEOUT = int(os.environ.get("WEB_TIMEOUT", 120))  # seconds a gunicorn worker may stay silent
+
+
+def preload():
+    """Import the heavy modules and load the model once, in the master, before forking"""
+    started = time.perf_counter()
+    import cv2  # noqa: F401
+    import ollama  # noqa: F401
+    import reportlab.platypus  # noqa: F401
+    import sklearn.svm  # noqa: F401
+    neuroscan.preload()
+    print(f"Preloaded models and libraries in {time.perf_counter() - started:.2f}s")
+
+
+def post_fork():
+    curebot.start_background_work()
+    neuroscan.start_background_work()
+
+
+def on_exit():
+    curebot.stop_background_work()
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """werkzeug's server with requests handled on a bounded thread pool"""
+
+    multithread = True
+
+    def __init__(self, *args, threads=8, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def run_worker(sock, threads):
+    host, port = sock.getsockname()[:2]
+    server = PooledWSGIServer(host, port, application, threads=threads, fd=sock.fileno())
+    # serve_forever treats KeyboardInterrupt as "stop", so make SIGTERM raise it too
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    post_fork()
+    try:
+        server.serve_forever()
+    finally:
+        server.pool.shutdown(wait=True)
+        on_exit()
+
+
+def serve_builtin(host, port, workers, threads, preload_app):
+    sock = socket.create_server((host, port), backlog=2048)
+    sock.set_inheritable(True)
+    if preload_app:
+        preload()
+    print(f"Serving on http://{host}:{port} with {workers} worker(s) x {threads} threads")
+    if workers == 1 or not hasattr(os, "fork"):
+        if workers > 1:
+            print("os.fork is unavailable; running a single worker")
+        run_worker(sock, threads)
+        return 0
+
+    children = set()
+    stopping = False
+    exit_code = 0
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                run_worker(sock, threads)
+                code = 0
+            finally:
+                os._exit(code)  # never return into the master's loop
+        children.add(pid)
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if os.waitstatus_to_exitcode(status) == neuroscan.BOOT_ERROR_EXIT and not stopping:
+            print(f"Worker {pid} refused to start; shutting down")
+            stop()
+            exit_code = neuroscan.BOOT_ERROR_EXIT
+        if not stopping:
+            print(f"Worker {pid} exited ({status}); starting a replacement")
+            time.sleep(1)  # don't spin if workers die on startup
+            spawn()
+    return exit_code
+
+
+def serve_gunicorn(host, port, workers, threads, preload_app):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in {
+                "bind": f"{host}:{port}",
+                "workers": workers,
+                "threads": threads,
+                "worker_class": "gthread",
+                "preload_app": preload_app,
+                "timeout": TIMEOUT,
+                "on_starting": lambda arbiter: preload() if preload_app else None,
+                "post_fork": lambda arbiter, worker: post_fork(),
+                "worker_exit": lambda arbiter, worker: on_exit(),
+            }.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return application
+
+    Server().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="processes")
+    parser.add_argument("--threads", type=int, default=THREADS, help="request threads per process")
+    parser.add_argument("--preload", action="store_true", default=PRELOAD,
+                        help="load libraries and the model in the master and share them with workers")
+    parser.add_argument("--builtin", action="store_true", help="use the built-in server even if gunicorn is installed")
+    args = parser.parse_args()
+
+    try:
+        import gunicorn  # noqa: F401
+        use_gunicorn = not args.builtin
+    except ImportError:
+        use_gunicorn = False
+    serve = serve_gunicorn if use_gunicorn else serve_builtin
+    return serve(args.host, args.port, args.workers, args.threads, args.preload)
+
+
+if __name__ == "__main__":
+    sys.exit(main())